@@ -1,16 +1,21 @@
+import os
+import json
+import uuid
+from typing import List
 from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-import fitz  # PyMuPDF for PDF extraction
 
 # Corrected Agentic RAG
-from services.rag.api_adapter import run_agentic_rag
-from services.rag.ingest import ingest_text, ingest_pdf_text
-from services.rag.ingest_web import ingest_web
-from services.rag.ingest_youtube import ingest_youtube
+from services.rag.api_adapter import arun_agentic_rag, arun_agentic_rag_batch, astream_agentic_rag
+from services.rag.graph_agentic import RAG_BATCH_MAX_QUERIES
+from services.rag.ingest import ingest_text
+from services.rag.concurrency import run_blocking
+from services.rag.jobs import get_job_queue, RAG_JOBS_DIR
 from services.rag.vectorstore import get_vectorstore
+from services.rag.pdf_extract import PDF_SPOOL_CHUNK
 
 router = APIRouter()
-vs = get_vectorstore()
 
 
 # -------------------------------
@@ -18,6 +23,12 @@ vs = get_vectorstore()
 # -------------------------------
 class QueryRequest(BaseModel):
     query: str
+    timings: bool = False  # per-step latency breakdown in meta
+
+
+class BatchQueryRequest(BaseModel):
+    queries: List[str]
+    timings: bool = False
 
 
 class IngestURL(BaseModel):
@@ -34,7 +45,7 @@ class IngestYouTubeRequest(BaseModel):
 @router.post("/query")
 async def query_rag(req: QueryRequest):
     try:
-        result = run_agentic_rag(req.query)
+        result = await arun_agentic_rag(req.query, timings=req.timings)
         return {
             "query": req.query,
             "answer": result.get("response"),
@@ -46,70 +57,128 @@ async def query_rag(req: QueryRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# -------------------------------
+# Agentic RAG Query (batch)
+# -------------------------------
+@router.post("/query/batch")
+async def query_rag_batch(req: BatchQueryRequest):
+    if len(req.queries) > RAG_BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {RAG_BATCH_MAX_QUERIES} queries per batch")
+    try:
+        results = await arun_agentic_rag_batch(req.queries, timings=req.timings)
+        return {"results": [
+            {
+                "query": query,
+                "answer": result.get("response"),
+                "intent": result.get("intent"),
+                "new_ingestion_done": result.get("new_ingestion"),
+                "meta": result.get("meta", {})
+            }
+            for query, result in zip(req.queries, results)
+        ]}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# -------------------------------
+# Agentic RAG Query (Server-Sent Events)
+# -------------------------------
+@router.post("/query/stream")
+async def query_rag_stream(req: QueryRequest):
+    async def event_stream():
+        try:
+            async for event in astream_agentic_rag(req.query, timings=req.timings):
+                payload = json.dumps(event["data"], default=str)
+                yield f"event: {event['event']}\ndata: {payload}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 # -------------------------------
 # Manual Text Ingestion
 # -------------------------------
 @router.post("/ingest/text")
 async def ingest_text_route(text: str):
     try:
-        ingest_text(text, source_type="manual")
+        await run_blocking(ingest_text, text, source_type="manual")  # chunk, embed and upsert off the event loop
         return {"status": "success", "ingested": text[:80] + "..."}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 # -------------------------------
-# PDF Ingestion
+# PDF Ingestion (background job)
 # -------------------------------
 @router.post("/ingest/pdf")
 async def ingest_pdf(file: UploadFile = File(...)):
     try:
-        pdf_bytes = await file.read()
-        pdf_doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-
-        pages = [page.get_text() for page in pdf_doc]
-        ingest_pdf_text(pages, pdf_name=file.filename)
-
+        os.makedirs(RAG_JOBS_DIR, exist_ok=True)
+        path = os.path.join(RAG_JOBS_DIR, f"{uuid.uuid4().hex}.pdf")
+        size = 0
+        with open(path, "wb") as out:
+            while chunk := await file.read(PDF_SPOOL_CHUNK):
+                out.write(chunk)
+                size += len(chunk)
+
+        job_id = get_job_queue().submit("pdf", {"path": path, "pdf_name": file.filename})
         return {
-            "status": "success",
-            "pages": len(pages),
-            "filename": file.filename
+            "status": "queued",
+            "job_id": job_id,
+            "filename": file.filename,
+            "bytes": size
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 # -------------------------------
-# Web URL Ingestion
+# Web URL Ingestion (background job)
 # -------------------------------
 @router.post("/ingest/web")
 async def ingest_web_route(req: IngestURL):
     try:
-        ingest_web(req.url)
-        return {"status": "success", "source": req.url}
+        job_id = get_job_queue().submit("web", {"url": req.url})
+        return {"status": "queued", "job_id": job_id, "source": req.url}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 # -------------------------------
-# YouTube Ingestion
+# YouTube Ingestion (background job)
 # -------------------------------
 @router.post("/ingest/youtube")
 async def ingest_youtube_route(req: IngestYouTubeRequest):
     try:
-        ingest_youtube(req.video_id)
-        return {"status": "success", "video_id": req.video_id}
+        job_id = get_job_queue().submit("youtube", {"video_id": req.video_id})
+        return {"status": "queued", "job_id": job_id, "video_id": req.video_id}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# -------------------------------
+# Ingestion Job Status
+# -------------------------------
+@router.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    job = get_job_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
 # -------------------------------
 # Clear Vector Store by Source Type
 # -------------------------------
 @router.delete("/clear/{source_type}")
 async def clear_source(source_type: str):
     try:
-        vs.delete_by_source(source_type)
+        get_vectorstore().delete_by_source(source_type)
         return {"status": "cleared", "source_type": source_type}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,8 +1,23 @@
-from fastapi import FastAPI
+import os
+import logging
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from api.rag_routes import router as rag_router
+from services.rag.container import get_container
+from services.rag.metrics import render_latest
 
-app = FastAPI(title="Agentic RAG Backend")
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await get_container().startup()
+    yield
+    await get_container().shutdown()
+
+
+app = FastAPI(title="Agentic RAG Backend", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -16,3 +31,9 @@ app.include_router(rag_router, prefix="/rag")
 @app.get("/")
 def root():
     return {"message": "Agentic RAG backend running!"}
+
+
+@app.get("/metrics")
+def metrics():
+    body, content_type = render_latest()
+    return Response(content=body, media_type=content_type)
@@ -0,0 +1,141 @@
+# services/rag/answer_cache.py
+"""
+Semantic answer cache.
+Maps (query vector, intent, retrieved chunk ids) -> final answer.
+- A lookup hits when the intent and chunk set match and the query vector
+  is within ANSWER_CACHE_THRESHOLD cosine similarity of a cached query
+- Entries are dropped when a contributing chunk or source is re-ingested or deleted
+- TTL + LRU size bound
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+from services.rag.utils import source_keys
+from services.rag.container import get_container
+
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))  # cosine similarity
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))              # seconds
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1024"))              # max entries
+
+
+def _unit(vector) -> np.ndarray:
+    v = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(v)
+    return v / norm if norm else v
+
+
+class AnswerCache:
+    def __init__(self, threshold: float = None, ttl: float = None, max_entries: int = None):
+        self.threshold = ANSWER_CACHE_THRESHOLD if threshold is None else threshold
+        self.ttl = ANSWER_CACHE_TTL if ttl is None else ttl
+        self.max_entries = max_entries or ANSWER_CACHE_SIZE
+
+        self._entries: "OrderedDict[int, Dict]" = OrderedDict()
+        self._by_chunk: Dict[str, set] = {}
+        self._by_source: Dict[str, set] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, vector, intent: str, chunk_ids: Iterable[str]) -> Optional[str]:
+        query = _unit(vector)
+        chunk_ids = frozenset(chunk_ids)
+        now = time.time()
+
+        with self._lock:
+            best_id, best_sim = None, self.threshold
+            for entry_id, entry in list(self._entries.items()):
+                if self.ttl and now - entry["stored_at"] > self.ttl:
+                    self._remove(entry_id)
+                    continue
+                if entry["intent"] != intent or entry["chunk_ids"] != chunk_ids:
+                    continue
+                sim = float(np.dot(query, entry["vector"]))
+                if sim >= best_sim:
+                    best_id, best_sim = entry_id, sim
+
+            if best_id is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            return self._entries[best_id]["answer"]
+
+    def store(self, vector, intent: str, chunks: List[Dict], answer: str):
+        chunk_ids = frozenset(c["id"] for c in chunks if c.get("id"))
+        sources = set().union(*(source_keys(c) for c in chunks)) if chunks else set()
+
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = {
+                "vector": _unit(vector),
+                "intent": intent,
+                "chunk_ids": chunk_ids,
+                "sources": sources,
+                "answer": answer,
+                "stored_at": time.time(),
+            }
+            for cid in chunk_ids:
+                self._by_chunk.setdefault(cid, set()).add(entry_id)
+            for key in sources:
+                self._by_source.setdefault(key, set()).add(entry_id)
+
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, chunk_ids: Iterable[str] = (), sources: Iterable[str] = ()):
+        """
+        Vector store change listener: drop every answer built from these chunks/sources.
+        """
+        with self._lock:
+            stale = set()
+            for cid in chunk_ids or ():
+                stale |= self._by_chunk.get(cid, set())
+            for key in sources or ():
+                stale |= self._by_source.get(key, set())
+            for entry_id in stale:
+                self._remove(entry_id)
+
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        for cid in entry["chunk_ids"]:
+            ids = self._by_chunk.get(cid)
+            if ids is not None:
+                ids.discard(entry_id)
+                if not ids:
+                    del self._by_chunk[cid]
+        for key in entry["sources"]:
+            ids = self._by_source.get(key)
+            if ids is not None:
+                ids.discard(entry_id)
+                if not ids:
+                    del self._by_source[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_chunk.clear()
+            self._by_source.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+def get_answer_cache() -> AnswerCache:
+    return get_container().answer_cache
@@ -1,9 +1,20 @@
 # services/rag/api_adapter.py
 
-from services.rag.graph_agentic import AgenticRAGGraph
+from services.rag.container import get_container
+from services.rag.concurrency import run_blocking
 
-agent_graph = AgenticRAGGraph()
 
+def run_agentic_rag(query: str, timings: bool = False):
+    return get_container().graph.run(query, timings=timings)
 
-def run_agentic_rag(query: str):
-    return agent_graph.run(query)
+
+async def arun_agentic_rag(query: str, timings: bool = False):
+    return await get_container().graph.arun(query, timings=timings)
+
+
+async def arun_agentic_rag_batch(queries: list, timings: bool = False):
+    return await run_blocking(get_container().graph.run_batch, queries, timings=timings)
+
+
+def astream_agentic_rag(query: str, timings: bool = False):
+    return get_container().graph.astream(query, timings=timings)
@@ -0,0 +1,446 @@
+# services/rag/benchmark.py
+"""
+Offline benchmark harness.
+Runs the real retrieval / ingestion / sync code against deterministic fakes
+with configurable latency, so changes can be compared without network access:
+- hashed bag-of-words embedder, stub LLM
+- QdrantClient(":memory:") or the embedded FAISS backend (--backend faiss)
+- SQLite memory store, temporary HTTP cache
+- canned HTML pages and a generated PDF served from a loopback HTTP server
+- canned search results
+Workloads: query, ingest-web, ingest-pdf, sync. Reports per-step and
+end-to-end p50/p95/p99 latency, throughput and peak RSS as JSON.
+
+    python -m services.rag.benchmark [--workloads query,sync] [--iterations 50] [--concurrency 4] [--backend faiss] [--output bench.json]
+"""
+
+import os
+import re
+import json
+import time
+import random
+import shutil
+import argparse
+import resource
+import tempfile
+import threading
+import functools
+import http.server
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+import numpy as np
+import xxhash
+from qdrant_client import QdrantClient
+from services.rag.container import get_container
+
+WORKLOADS = ("query", "ingest-web", "ingest-pdf", "sync")
+
+_VOCAB = (
+    "energy cell protein orbit planet market price tensor network river climate "
+    "language grammar circuit voltage enzyme genome history empire treaty poem "
+    "algorithm graph vector matrix theorem proof ocean current storm carbon soil "
+    "engine turbine fuel bridge steel concrete virus vaccine neuron memory signal"
+).split()
+
+
+# ---------- Fakes ----------
+class FakeEmbeddings:
+    """
+    Deterministic hashed bag-of-words vectors: texts sharing words are similar.
+    """
+
+    def __init__(self, dimension: int = 384, latency: float = 0.0):
+        self.model = "bench-hashed"
+        self.dimension = dimension
+        self.latency = latency
+
+    def _vector(self, text: str) -> List[float]:
+        v = np.zeros(self.dimension, dtype=np.float32)
+        for token in re.findall(r"\w+", text.lower()):
+            h = xxhash.xxh64_intdigest(token)
+            v[h % self.dimension] += 1.0 if (h >> 32) & 1 else -1.0
+        norm = np.linalg.norm(v)
+        return (v / norm if norm else v).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self.latency)
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(self.latency)
+        return self._vector(text)
+
+
+class StubLLM:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+
+    def __call__(self, prompt: str, temperature: float = 0.2) -> str:
+        time.sleep(self.latency)
+        return f"Stub answer from {len(prompt)} prompt characters."
+
+
+def _topic(i: int) -> List[str]:
+    rng = random.Random(i)
+    return rng.sample(_VOCAB, 3)
+
+
+def _paragraphs(seed: int, count: int) -> List[str]:
+    rng = random.Random(seed)
+    return [
+        " ".join(
+            (" ".join(rng.choice(_VOCAB) for _ in range(rng.randint(8, 16))) + ".").capitalize()
+            for _ in range(rng.randint(3, 6))
+        )
+        for _ in range(count)
+    ]
+
+
+def write_fixtures(directory: str, pages: int, pdf_pages: int):
+    os.makedirs(directory, exist_ok=True)
+    for i in range(pages):
+        title = " ".join(_topic(i))
+        body = "".join(f"<p>{title}. {p}</p>" for p in _paragraphs(i, 12))
+        with open(os.path.join(directory, f"page{i}.html"), "w") as f:
+            f.write(f"<html><head><title>{title}</title></head><body><h1>{title}</h1>{body}</body></html>")
+
+    import fitz  # PyMuPDF
+    with fitz.open() as doc:
+        for n in range(pdf_pages):
+            page = doc.new_page()
+            page.insert_textbox(page.rect + (36, 36, -36, -36), "\n\n".join(_paragraphs(10_000 + n, 4)), fontsize=9)
+        doc.save(os.path.join(directory, "doc.pdf"))
+
+
+class _FixtureHandler(http.server.SimpleHTTPRequestHandler):
+    latency = 0.0
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        super().do_GET()
+
+    def log_message(self, *args):
+        pass
+
+
+class FixtureServer:
+    """
+    Loopback HTTP server for the canned fixtures (honours If-Modified-Since).
+    """
+
+    def __init__(self, directory: str, latency: float = 0.0):
+        handler = type("Handler", (_FixtureHandler,), {"latency": latency})
+        self.httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(handler, directory=directory))
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="bench-http", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class SerializedClient:
+    """
+    Local-mode QdrantClient is not safe for concurrent writers; serialize calls
+    so the benchmark can drive it from many threads (a server handles this itself).
+    """
+
+    def __init__(self, client):
+        self._client = client
+        self._lock = threading.RLock()
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr):
+            return attr
+
+        def locked(*args, **kwargs):
+            with self._lock:
+                return attr(*args, **kwargs)
+        return locked
+
+
+# ---------- Measurement ----------
+class Recorder:
+    def __init__(self):
+        self.steps: Dict[str, List[float]] = defaultdict(list)
+
+    def record(self, name: str, seconds: float):
+        self.steps[name].append(seconds * 1000)
+
+    def wrap(self, obj, method: str, name: str = None):
+        """
+        Time every call of obj.method (instance attribute, so only this object is affected).
+        """
+        fn = getattr(obj, method)
+        name = name or method
+
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.record(name, time.perf_counter() - started)
+
+        setattr(obj, method, timed)
+
+
+def summarize(samples_ms: List[float]) -> Dict:
+    if not samples_ms:
+        return {"count": 0}
+    a = np.asarray(samples_ms)
+    return {
+        "count": len(samples_ms),
+        "p50": round(float(np.percentile(a, 50)), 3),
+        "p95": round(float(np.percentile(a, 95)), 3),
+        "p99": round(float(np.percentile(a, 99)), 3),
+        "mean": round(float(a.mean()), 3),
+        "max": round(float(a.max()), 3),
+    }
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux: the process high-water mark so far
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def _run_timed(fn, items: List, concurrency: int, recorder: Recorder) -> Dict:
+    def one(item):
+        started = time.perf_counter()
+        try:
+            return fn(item)
+        finally:
+            recorder.record("end_to_end", time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        results = list(pool.map(one, items))
+    wall = time.perf_counter() - started
+
+    end_to_end = recorder.steps.pop("end_to_end", [])
+    return {
+        "iterations": len(items),
+        "concurrency": concurrency,
+        "wall_s": round(wall, 3),
+        "throughput_per_s": round(len(items) / wall, 2) if wall else None,
+        "latency_ms": summarize(end_to_end),
+        "steps_ms": {name: summarize(v) for name, v in sorted(recorder.steps.items())},
+        "peak_rss_mb": peak_rss_mb(),
+    }, results
+
+
+# ---------- Harness ----------
+class Harness:
+    def __init__(self, args):
+        self.args = args
+        self.tmp = tempfile.mkdtemp(prefix="rag-bench-")
+        self.www = os.path.join(self.tmp, "www")
+        write_fixtures(self.www, args.pages, args.pdf_pages)
+        self.builds = 0
+        self.memory = None
+        self.vectorstore = None
+        self.http_cache = None
+
+    def _build(self, base_url: str):
+        from services.rag.vectorstore import VectorStore, add_change_listener
+        from services.rag.vector_backends import QdrantBackend, FaissBackend
+        from services.rag.embedding_cache import EmbeddingCache
+        from services.rag.memory import MemoryManager, SQLiteMemoryStore
+        from services.rag.answer_cache import AnswerCache
+        from services.rag.http_cache import HTTPCache
+        from services.rag.search_cache import SearchCache
+        from services.rag.ingest_orchestrator import IngestOrchestrator
+        from services.rag.graph_agentic import AgenticRAGGraph
+
+        args = self.args
+        self._release()
+        self.builds += 1
+        run_dir = os.path.join(self.tmp, f"run{self.builds}")
+
+        embedder = FakeEmbeddings(dimension=args.dimension, latency=args.embed_latency)
+        if args.backend == "faiss":
+            backend = FaissBackend("bench", directory=os.path.join(run_dir, "vector_index"))
+        else:
+            backend = QdrantBackend("bench", SerializedClient(QdrantClient(":memory:")))  # collection created by VectorStore
+
+        self.vectorstore = VectorStore(backend=backend, embedder=embedder, collection_name="bench")
+        self.vectorstore.query_cache = EmbeddingCache()  # memory only
+        self.memory = MemoryManager(store=SQLiteMemoryStore(os.path.join(run_dir, "memory.sqlite3")))
+        self.http_cache = HTTPCache(directory=os.path.join(run_dir, "http_cache"))
+        answer_cache = AnswerCache()
+        add_change_listener(answer_cache.invalidate)
+
+        container = get_container()
+        container.override("vectorstore", self.vectorstore)
+        container.override("memory", self.memory)
+        container.override("answer_cache", answer_cache)
+        container.override("http_cache", self.http_cache)
+        container.override("search_cache", SearchCache())
+
+        pages, search_latency = args.pages, args.search_latency
+
+        class BenchIngestor(IngestOrchestrator):
+            # Canned search results pointing at the fixture pages; ingestion itself is real
+            def _search_providers(self, query: str) -> Dict:
+                def search():
+                    time.sleep(search_latency)
+                    first = xxhash.xxh64_intdigest(query) % pages
+                    return [{"title": f"page {(first + j) % pages}", "url": f"{base_url}/page{(first + j) % pages}.html"}
+                            for j in range(3)]
+                return {"web": search}
+
+        self.ingestor = BenchIngestor(memory=self.memory)
+        self.graph = AgenticRAGGraph(
+            vector_db=self.vectorstore,
+            ingestor=self.ingestor,
+            memory=self.memory,
+            answer_cache=answer_cache,
+            llm=StubLLM(args.llm_latency),
+        )
+        container.override("ingestor", self.ingestor)
+        container.override("graph", self.graph)
+
+    def _instrument(self, recorder: Recorder):
+        for method in ("embed_query", "embed_documents", "query", "existing_ids", "upsert_vectors", "sparse_query"):
+            recorder.wrap(self.vectorstore, method, f"vectorstore.{method}")
+        for method in ("discover_candidates", "ingest_candidates", "_ingest_source"):
+            recorder.wrap(self.ingestor, method, f"ingestor.{method.lstrip('_')}")
+        for method in ("step_check_and_ingest", "step_reretrieve_if_needed", "step_lookup_cached_answer",
+                       "step_generate_answer", "step_update_memory"):
+            recorder.wrap(self.graph, method, f"graph.{method}")
+
+    def run(self) -> Dict:
+        report = {"config": vars(self.args), "workloads": {}}
+        try:
+            with FixtureServer(self.www, latency=self.args.http_latency) as server:
+                self.base_url = server.base_url
+                for name in self.args.workloads:
+                    self._build(server.base_url)  # fresh stores so workloads do not affect each other
+                    recorder = Recorder()
+                    self._instrument(recorder)
+                    report["workloads"][name] = getattr(self, "_" + name.replace("-", "_"))(recorder)
+        finally:
+            self.close()
+        return report
+
+    # ---------- Workloads ----------
+    def _query(self, recorder: Recorder) -> Dict:
+        # Half the topics are pre-ingested (warm), the rest trigger discovery + ingestion (cold)
+        from services.rag.ingest_web import ingest_web
+        for i in range(0, self.args.pages, 2):
+            ingest_web(f"{self.base_url}/page{i}.html")
+        recorder.steps.clear()
+
+        queries = [f"explain {' '.join(_topic(i % self.args.pages))}" for i in range(self.args.iterations)]
+        result, answers = _run_timed(self.graph.run, queries, self.args.concurrency, recorder)
+        result["ingested"] = sum(1 for a in answers if a["new_ingestion"])
+        result["cached_answers"] = sum(1 for a in answers if a["cached"])
+        return result
+
+    def _ingest_web(self, recorder: Recorder) -> Dict:
+        from services.rag.ingest_web import ingest_web
+        urls = [f"{self.base_url}/page{i % self.args.pages}.html?run={i}" for i in range(self.args.iterations)]
+        result, stats = _run_timed(ingest_web, urls, self.args.concurrency, recorder)
+        result["chunks"] = sum(s.get("chunks", 0) for s in stats)
+        return result
+
+    def _ingest_pdf(self, recorder: Recorder) -> Dict:
+        from services.rag.ingest import ingest_pdf_text
+        from services.rag.pdf_extract import iter_pdf_pages
+
+        path = os.path.join(self.www, "doc.pdf")
+
+        def timed_pages(pages):
+            # Time spent waiting on the extractor, as seen by the chunker
+            it = iter(pages)
+            while True:
+                started = time.perf_counter()
+                try:
+                    page = next(it)
+                except StopIteration:
+                    return
+                finally:
+                    recorder.record("pdf.next_page", time.perf_counter() - started)
+                yield page
+
+        def ingest(run: int):
+            return ingest_pdf_text(timed_pages(iter_pdf_pages(path)), pdf_name=f"doc-{run}.pdf")
+
+        result, stats = _run_timed(ingest, list(range(self.args.pdf_runs)), 1, recorder)
+        result["pages"] = sum(s["pages_ingested"] for s in stats)
+        result["chunks"] = sum(s["chunks"] for s in stats)
+        return result
+
+    def _sync(self, recorder: Recorder) -> Dict:
+        from services.rag.sync_memory_to_qdrant import SyncState, sync_source
+
+        urls = [f"{self.base_url}/page{i}.html" for i in range(self.args.pages)]
+        for url in urls:
+            self.memory.register_source(url, "web", "bench")
+        state = SyncState(os.path.join(self.tmp, f"run{self.builds}", "sync.sqlite3"))
+
+        passes = {}
+        for label in ("cold", "warm"):  # warm pass: every source answers 304
+            run_id = state.start_run(resume=False)
+            result, outcomes = _run_timed(lambda u: sync_source(u, state, run_id), urls, self.args.concurrency, recorder)
+            state.finish_run(run_id)
+            result["statuses"] = {s: sum(1 for o in outcomes if o["status"] == s) for s in ("changed", "unchanged")}
+            passes[label] = result
+            recorder.steps.clear()
+        return passes
+
+    def _release(self):
+        if self.memory is not None:
+            self.memory.close()
+        if self.http_cache is not None:
+            self.http_cache.close()
+        if self.vectorstore is not None:
+            self.vectorstore.backend.close()
+
+    def close(self):
+        from services.rag.pdf_extract import shutdown_pool
+        self._release()
+        shutdown_pool()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(description="Offline benchmark of the RAG pipeline against deterministic fakes")
+    parser.add_argument("--workloads", default=",".join(WORKLOADS), help=f"comma separated subset of {', '.join(WORKLOADS)}")
+    parser.add_argument("--iterations", type=int, default=40, help="queries / web ingests per workload")
+    parser.add_argument("--concurrency", type=int, default=4, help="requests in flight")
+    parser.add_argument("--pages", type=int, default=20, help="canned HTML pages")
+    parser.add_argument("--pdf-pages", type=int, default=100, help="pages in the generated PDF")
+    parser.add_argument("--pdf-runs", type=int, default=3, help="times the PDF is ingested")
+    parser.add_argument("--backend", choices=("qdrant", "faiss"), default="qdrant", help="vector index backend")
+    parser.add_argument("--dimension", type=int, default=384, help="fake embedding size")
+    parser.add_argument("--embed-latency", type=float, default=0.005, help="seconds per embedding call")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="seconds per LLM call")
+    parser.add_argument("--search-latency", type=float, default=0.02, help="seconds per search call")
+    parser.add_argument("--http-latency", type=float, default=0.005, help="seconds per fixture HTTP request")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    args.workloads = [w.strip() for w in args.workloads.split(",") if w.strip()]
+    unknown = set(args.workloads) - set(WORKLOADS)
+    if unknown:
+        parser.error(f"unknown workloads: {', '.join(sorted(unknown))}")
+
+    report = Harness(args).run()
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# services/rag/chunker.py
+"""
+Structure-aware streaming chunker shared by every ingest path.
+- Input is a stream of segments (page, transcript line, text block), each
+  optionally carrying metadata such as a page number or timestamp
+- Chunks close on sentence boundaries at CHUNK_SIZE characters and repeat
+  up to CHUNK_OVERLAP characters of trailing sentences in the next chunk
+- Markdown-style heading lines ("# Title") start a new chunk without overlap
+- Only the chunk being built is held in memory
+"""
+
+import os
+import re
+from typing import Dict, Iterable, Iterator, List, Tuple, Union
+
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "800"))        # max characters per chunk
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "100"))  # characters repeated from the previous chunk
+
+Segment = Union[str, Tuple[str, Dict]]
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?。])\s+")
+_HEADING_RE = re.compile(r"^#{1,6}\s+\S")
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s for s in _SENTENCE_RE.split(text) if s.strip()]
+
+
+def _hard_split(text: str, size: int) -> Iterator[str]:
+    # Sentence longer than a chunk: cut at the last whitespace before the limit
+    while len(text) > size:
+        cut = text.rfind(" ", 0, size)
+        if cut <= 0:
+            cut = size
+        yield text[:cut].strip()
+        text = text[cut:].strip()
+    if text:
+        yield text
+
+
+def iter_chunks(segments: Iterable[Segment], size: int = None, overlap: int = None) -> Iterator[Tuple[str, Dict]]:
+    """
+    Yields (chunk text, metadata of the segment the chunk starts in).
+    """
+    size = size or CHUNK_SIZE
+    overlap = min(CHUNK_OVERLAP if overlap is None else overlap, size // 2)  # also for a small custom size
+
+    units: List[Tuple[str, Dict]] = []  # sentences in the current chunk
+    length = 0
+    fresh = False  # units holds more than the overlap carried from the last chunk
+
+    def emit():
+        return " ".join(u for u, _ in units), units[0][1]
+
+    def carry_over():
+        # Trailing sentences that fit in the overlap, never the whole chunk
+        kept, total = [], 0
+        for unit in reversed(units[1:]):
+            if total + len(unit[0]) + 1 > overlap:
+                break
+            kept.insert(0, unit)
+            total += len(unit[0]) + 1
+        return kept, total
+
+    for segment in segments:
+        text, meta = (segment, {}) if isinstance(segment, str) else segment
+        for line in (text or "").splitlines():
+            line = line.strip()
+            if not line:
+                continue
+
+            if _HEADING_RE.match(line) and units:
+                if fresh:
+                    yield emit()
+                units, length, fresh = [], 0, False
+
+            for sentence in split_sentences(line):
+                for piece in _hard_split(sentence.strip(), size):
+                    if units and length + len(piece) + 1 > size:
+                        yield emit()
+                        units, length = carry_over()
+                        if length + len(piece) + 1 > size:
+                            units, length = [], 0
+                    units.append((piece, meta))
+                    length += len(piece) + 1
+                    fresh = True
+
+    if fresh:
+        yield emit()
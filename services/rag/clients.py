@@ -0,0 +1,138 @@
+# services/rag/clients.py
+"""
+Central registry of long-lived network clients.
+- get_http_session(): requests.Session with keep-alive pool + retry/backoff
+- get_groq() / get_async_groq(): Groq clients on pooled httpx transports
+- get_supabase(): Supabase client on a pooled httpx.Client
+Each client is built once on first use and reused by every caller.
+"""
+
+import os
+import logging
+import threading
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from services.rag.metrics import external_call, observe_payload
+
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "15"))                # seconds
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "20"))  # distinct hosts kept alive
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "50"))          # connections per host
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "2"))
+HTTP_BACKOFF = float(os.getenv("HTTP_BACKOFF", "0.3"))                 # urllib3 backoff_factor
+HTTP_USER_AGENT = os.getenv("HTTP_USER_AGENT", "Mozilla/5.0 (compatible; AgenticRAG/1.0)")
+
+GROQ_TIMEOUT = float(os.getenv("GROQ_TIMEOUT", "60"))
+GROQ_MAX_RETRIES = int(os.getenv("GROQ_MAX_RETRIES", "2"))
+
+_clients = {}
+_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+
+def _get_or_create(name: str, factory):
+    client = _clients.get(name)
+    if client is None:
+        with _lock:
+            client = _clients.get(name)
+            if client is None:
+                client = factory()
+                _clients[name] = client
+    return client
+
+
+def _httpx_limits() -> httpx.Limits:
+    return httpx.Limits(max_connections=HTTP_POOL_MAXSIZE, max_keepalive_connections=HTTP_POOL_CONNECTIONS)
+
+
+# ---------- Plain HTTP ----------
+def _build_http_session() -> requests.Session:
+    retry = Retry(
+        total=HTTP_RETRIES,
+        backoff_factor=HTTP_BACKOFF,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=("GET", "HEAD"),
+        respect_retry_after_header=True,
+    )
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({"User-Agent": HTTP_USER_AGENT})
+    return session
+
+
+def get_http_session() -> requests.Session:
+    return _get_or_create("http", _build_http_session)
+
+
+def http_get(url: str, timeout: float = None, **kwargs) -> requests.Response:
+    with external_call("http", "get"):
+        resp = get_http_session().get(url, timeout=timeout or HTTP_TIMEOUT, **kwargs)
+    if not kwargs.get("stream"):
+        observe_payload("http", "get", len(resp.content))
+    elif resp.headers.get("Content-Length", "").isdigit():
+        observe_payload("http", "get", int(resp.headers["Content-Length"]))
+    return resp
+
+
+# ---------- Groq ----------
+def _groq_key() -> str:
+    key = os.getenv("GROQ_API_KEY")
+    if not key:
+        raise ValueError("GROQ_API_KEY missing")
+    return key
+
+
+def get_groq():
+    from groq import Groq
+    return _get_or_create("groq", lambda: Groq(
+        api_key=_groq_key(),
+        max_retries=GROQ_MAX_RETRIES,
+        http_client=httpx.Client(timeout=GROQ_TIMEOUT, limits=_httpx_limits()),
+    ))
+
+
+def get_async_groq():
+    from groq import AsyncGroq
+    return _get_or_create("async_groq", lambda: AsyncGroq(
+        api_key=_groq_key(),
+        max_retries=GROQ_MAX_RETRIES,
+        http_client=httpx.AsyncClient(timeout=GROQ_TIMEOUT, limits=_httpx_limits()),
+    ))
+
+
+# ---------- Supabase ----------
+def get_supabase():
+    from supabase import create_client, ClientOptions
+
+    def build():
+        url = os.getenv("SUPABASE_URL")
+        key = os.getenv("SUPABASE_KEY")
+        if not url or not key:
+            raise ValueError("SUPABASE_URL / SUPABASE_KEY missing")
+        options = ClientOptions(httpx_client=httpx.Client(timeout=HTTP_TIMEOUT, limits=_httpx_limits()))
+        return create_client(url, key, options=options)
+
+    return _get_or_create("supabase", build)
+
+
+# ---------- Lifecycle ----------
+async def aclose_clients():
+    """
+    Close every pooled client that has been created so far.
+    """
+    with _lock:
+        clients = dict(_clients)
+        _clients.clear()
+
+    for name, client in clients.items():
+        try:
+            if name == "async_groq":
+                await client.close()
+            elif hasattr(client, "close"):
+                client.close()
+        except Exception as e:
+            logger.warning("Closing client %s failed: %s", name, e)
@@ -0,0 +1,27 @@
+# services/rag/concurrency.py
+"""
+Bounded thread pool for work that has no async client yet
+(ingestion, Supabase memory writes, pdf parsing).
+Keeps blocking calls off the event loop without spawning unbounded threads.
+"""
+
+import os
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+RAG_BLOCKING_WORKERS = int(os.getenv("RAG_BLOCKING_WORKERS", "16"))
+
+_executor = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=RAG_BLOCKING_WORKERS, thread_name_prefix="rag-blocking")
+    return _executor
+
+
+async def run_blocking(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), functools.partial(fn, *args, **kwargs))
@@ -0,0 +1,144 @@
+# services/rag/container.py
+"""
+Lazy dependency container.
+Each shared resource (vector store, memory, orchestrator, graph, job queue,
+answer cache, HTTP and search caches) is built once on first use and reused by every module, so a
+process holds one Qdrant client, one embedder and one memory index.
+Nothing is constructed at import time; FastAPI calls startup()/shutdown()
+from its lifespan, and startup() warms the BM25 index in the background.
+"""
+
+import os
+import asyncio
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+RAG_EAGER_INIT = os.getenv("RAG_EAGER_INIT", "false").lower() in ("1", "true", "yes")  # warm up on startup
+
+
+class Container:
+    def __init__(self):
+        self._instances = {}
+        self._lock = threading.RLock()
+        self._warmup = None
+
+    def _get(self, name: str, factory):
+        instance = self._instances.get(name)
+        if instance is None:
+            with self._lock:
+                instance = self._instances.get(name)
+                if instance is None:
+                    instance = factory()
+                    self._instances[name] = instance
+        return instance
+
+    def override(self, name: str, instance):
+        """
+        Replace a resource (tests, benchmarks) before anything else asks for it.
+        """
+        with self._lock:
+            self._instances[name] = instance
+
+    # ---------- Resources ----------
+    @property
+    def vectorstore(self):
+        from services.rag.vectorstore import VectorStore
+        return self._get("vectorstore", VectorStore)
+
+    @property
+    def memory(self):
+        from services.rag.memory import MemoryManager
+        return self._get("memory", MemoryManager)
+
+    @property
+    def answer_cache(self):
+        def build():
+            from services.rag.answer_cache import AnswerCache
+            from services.rag.vectorstore import add_change_listener
+            cache = AnswerCache()
+            add_change_listener(cache.invalidate)
+            return cache
+        return self._get("answer_cache", build)
+
+    @property
+    def ingestor(self):
+        from services.rag.ingest_orchestrator import IngestOrchestrator
+        return self._get("ingestor", lambda: IngestOrchestrator(memory=self.memory))
+
+    @property
+    def graph(self):
+        from services.rag.graph_agentic import AgenticRAGGraph
+        return self._get("graph", lambda: AgenticRAGGraph(
+            vector_db=self.vectorstore,
+            ingestor=self.ingestor,
+            memory=self.memory,
+            answer_cache=self.answer_cache,
+        ))
+
+    @property
+    def http_cache(self):
+        from services.rag.http_cache import HTTPCache
+        return self._get("http_cache", HTTPCache)
+
+    @property
+    def search_cache(self):
+        from services.rag.search_cache import SearchCache
+        return self._get("search_cache", SearchCache)
+
+    @property
+    def job_queue(self):
+        from services.rag.jobs import build_job_queue
+        return self._get("job_queue", build_job_queue)
+
+    # ---------- Lifecycle ----------
+    async def startup(self):
+        self.job_queue.start()  # resume jobs left over from a previous run
+        if RAG_EAGER_INIT:
+            self.graph
+        self._warmup = asyncio.create_task(self._warm_sparse())  # in the background: startup does not wait on the scroll
+
+    async def _warm_sparse(self):
+        from services.rag.concurrency import run_blocking
+        from services.rag.vectorstore import RAG_HYBRID
+        if not RAG_HYBRID:
+            return
+        try:
+            vectorstore = await run_blocking(lambda: self.vectorstore)
+            await run_blocking(vectorstore.warm_sparse)
+        except Exception as e:
+            logger.warning("BM25 index warm-up failed, building it on first query instead: %s", e)
+
+    async def shutdown(self):
+        from services.rag.clients import aclose_clients
+        from services.rag.pdf_extract import shutdown_pool
+
+        if self._warmup is not None:
+            self._warmup.cancel()
+        with self._lock:
+            instances, self._instances = dict(self._instances), {}
+
+        if "job_queue" in instances:
+            instances["job_queue"].shutdown()
+        if "memory" in instances:
+            instances["memory"].close()  # flush buffered writes
+        if "http_cache" in instances:
+            instances["http_cache"].close()
+        if "vectorstore" in instances:
+            await instances["vectorstore"].aclose()
+        await aclose_clients()
+        shutdown_pool()
+
+
+_container = None
+_container_lock = threading.Lock()
+
+
+def get_container() -> Container:
+    global _container
+    if _container is None:
+        with _container_lock:
+            if _container is None:
+                _container = Container()
+    return _container
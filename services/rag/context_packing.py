@@ -0,0 +1,144 @@
+# services/rag/context_packing.py
+"""
+Token-aware context packing for LLM prompts.
+- Tokens are counted with a real tokenizer: tokenizer.json from CONTEXT_TOKENIZER_PATH
+  or LOCAL_EMBEDDINGS_PATH, else the CONTEXT_TOKENIZER_MODEL BPE from the Hugging Face
+  hub (fetched once, then cached); a word/punctuation count is only the last resort
+- Near-identical chunks are dropped (word-shingle Jaccard similarity)
+- Chunks are taken best-first until the per-intent token budget is used;
+  the last one that does not fit is truncated
+"""
+
+import os
+import re
+import logging
+import threading
+from typing import Dict, List, Tuple
+
+CONTEXT_TOKENIZER_PATH = os.getenv("CONTEXT_TOKENIZER_PATH") or os.getenv("LOCAL_EMBEDDINGS_PATH")
+CONTEXT_TOKENIZER_MODEL = os.getenv("CONTEXT_TOKENIZER_MODEL", "openai-community/gpt2")  # hub id; GPT-style BPE
+CONTEXT_TOKEN_BUDGETS = os.getenv("CONTEXT_TOKEN_BUDGETS", "answer=1500,summarize=3000,flashcards=3000,quiz=3000")
+CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.85"))  # shingle Jaccard similarity
+CONTEXT_MIN_TAIL_TOKENS = int(os.getenv("CONTEXT_MIN_TAIL_TOKENS", "64"))      # smallest truncated chunk worth sending
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+_tokenizer = None
+_tokenizer_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+
+def token_budgets() -> Dict[str, int]:
+    budgets = {}
+    for part in CONTEXT_TOKEN_BUDGETS.split(","):
+        if "=" in part:
+            intent, budget = part.split("=", 1)
+            budgets[intent.strip()] = int(budget)
+    return budgets
+
+
+def budget_for(intent: str) -> int:
+    budgets = token_budgets()
+    return budgets.get(intent or "answer", budgets.get("answer", 1500))
+
+
+def _get_tokenizer():
+    global _tokenizer
+    if _tokenizer is None:
+        with _tokenizer_lock:
+            if _tokenizer is None:
+                _tokenizer = _load_tokenizer() or False  # False: use the regex estimate
+    return _tokenizer or None
+
+
+def _load_tokenizer():
+    from tokenizers import Tokenizer
+
+    path = os.path.join(CONTEXT_TOKENIZER_PATH, "tokenizer.json") if CONTEXT_TOKENIZER_PATH else None
+    try:
+        if path and os.path.exists(path):
+            tok = Tokenizer.from_file(path)
+        elif CONTEXT_TOKENIZER_MODEL:
+            tok = Tokenizer.from_pretrained(CONTEXT_TOKENIZER_MODEL)
+        else:
+            return None
+    except Exception as e:
+        logger.warning("No tokenizer for context packing (%s), estimating tokens from words: %s",
+                       path or CONTEXT_TOKENIZER_MODEL, e)
+        return None
+    tok.no_truncation()
+    tok.no_padding()
+    return tok
+
+
+def _token_spans(text: str) -> List[Tuple[int, int]]:
+    tok = _get_tokenizer()
+    if tok is not None:
+        return [span for span in tok.encode(text, add_special_tokens=False).offsets]
+    return [m.span() for m in _TOKEN_RE.finditer(text)]
+
+
+def count_tokens(text: str) -> int:
+    return len(_token_spans(text or ""))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    spans = _token_spans(text)
+    if len(spans) <= max_tokens:
+        return text
+    return text[:spans[max_tokens - 1][1]] if max_tokens > 0 else ""
+
+
+def _shingles(text: str, n: int = 3) -> set:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) <= n:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + n]) for i in range(len(words) - n + 1)}
+
+
+def _rank(chunk: Dict) -> float:
+    # Fused rank when hybrid retrieval produced one, dense similarity otherwise
+    return chunk.get("rrf", chunk.get("score") or 0.0)
+
+
+def pack_context(chunks: List[Dict], budget: int) -> Tuple[List[Dict], Dict]:
+    """
+    Returns (packed chunks, stats). Packed chunks are copies; a truncated
+    one has its "text" cut to the remaining budget.
+    """
+    ordered = sorted(chunks, key=_rank, reverse=True)
+    packed, kept_shingles = [], []
+    used = duplicates = truncated = 0
+
+    for chunk in ordered:
+        text = (chunk.get("text") or "").strip()
+        if not text:
+            continue
+
+        shingles = _shingles(text)
+        if any(len(shingles & s) / len(shingles | s) >= CONTEXT_DEDUP_THRESHOLD for s in kept_shingles):
+            duplicates += 1
+            continue
+
+        remaining = budget - used
+        tokens = count_tokens(text)
+        if tokens > remaining:
+            if remaining < CONTEXT_MIN_TAIL_TOKENS:
+                break
+            text, tokens = truncate_tokens(text, remaining), remaining
+            truncated += 1
+
+        packed.append({**chunk, "text": text})
+        kept_shingles.append(shingles)
+        used += tokens
+        if used >= budget:
+            break
+
+    return packed, {
+        "context_tokens": used,
+        "budget": budget,
+        "chunks_in": len(chunks),
+        "chunks_used": len(packed),
+        "duplicates": duplicates,
+        "truncated": truncated,
+    }
@@ -0,0 +1,129 @@
+# services/rag/embedding_cache.py
+"""
+LRU + TTL cache for query embeddings.
+- Keyed on (model name, normalized text)
+- Bounded by entry count and approximate memory
+- Optional JSON persistence so popular queries survive restarts
+- Exposes hit/miss counters via stats()
+"""
+
+import os
+import json
+import time
+import atexit
+import logging
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "4096"))                     # max entries
+EMBED_CACHE_MAX_BYTES = int(os.getenv("EMBED_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+EMBED_CACHE_TTL = float(os.getenv("EMBED_CACHE_TTL", "86400"))                      # seconds, 0 = never expire
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH")                                    # unset = memory only
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    return " ".join((text or "").lower().split())
+
+
+class EmbeddingCache:
+    def __init__(self, max_entries: int = None, max_bytes: int = None,
+                 ttl: float = None, path: Optional[str] = None):
+        self.max_entries = max_entries or EMBED_CACHE_SIZE
+        self.max_bytes = max_bytes or EMBED_CACHE_MAX_BYTES
+        self.ttl = EMBED_CACHE_TTL if ttl is None else ttl
+        self.path = path
+
+        self._data: "OrderedDict[Tuple[str, str], Tuple[float, List[float]]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+        if self.path:
+            self._load()
+            atexit.register(self.save)
+
+    @staticmethod
+    def _size(key: Tuple[str, str], vector: List[float]) -> int:
+        # rough: 8 bytes per float + key text
+        return len(vector) * 8 + len(key[0]) + len(key[1])
+
+    def _expired(self, stored_at: float) -> bool:
+        return bool(self.ttl) and (time.time() - stored_at) > self.ttl
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        key = (model, normalize_text(text))
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or self._expired(entry[0]):
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, model: str, text: str, vector: List[float], stored_at: float = None):
+        key = (model, normalize_text(text))
+        vector = list(vector)
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (stored_at or time.time(), vector)
+            self._bytes += self._size(key, vector)
+            while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+
+    def _remove(self, key):
+        _, vector = self._data.pop(key)
+        self._bytes -= self._size(key, vector)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
+
+    # ---------- Persistence ----------
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                rows = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logger.warning("Embedding cache load failed: %s", e)
+            return
+
+        for model, text, stored_at, vector in rows:
+            if not self._expired(stored_at):
+                self.put(model, text, vector, stored_at=stored_at)
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            rows = [[k[0], k[1], ts, vec] for k, (ts, vec) in self._data.items()]
+        tmp = f"{self.path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(rows, f)
+            os.replace(tmp, self.path)
+        except Exception as e:
+            logger.warning("Embedding cache save failed: %s", e)
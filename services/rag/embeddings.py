@@ -1,18 +1,209 @@
 # services/rag/embeddings.py
+"""
+Pluggable embedding backends, selected with EMBEDDINGS_BACKEND:
+- "hf" (default): HuggingFace Inference endpoint, needs HF_API_KEY
+- "local": in-process CPU embeddings
+    * ONNX Runtime + tokenizers when LOCAL_EMBEDDINGS_PATH holds model.onnx / tokenizer.json
+    * sentence-transformers otherwise (downloads/caches the model once)
+  onnxruntime / sentence-transformers are optional installs, only needed for this backend.
+"""
+
 import os
+from typing import List
 from dotenv import load_dotenv
-from langchain_huggingface import HuggingFaceEndpointEmbeddings
 
 # Load .env file
-load_dotenv()  
+load_dotenv()
 
-hf_key = os.getenv("HF_API_KEY")
-if not hf_key:
-    raise ValueError("HF_API_KEY not set!")
+EMBEDDINGS_BACKEND = os.getenv("EMBEDDINGS_BACKEND", "hf").lower()
+EMBEDDINGS_MODEL = os.getenv("EMBEDDINGS_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+LOCAL_EMBEDDINGS_PATH = os.getenv("LOCAL_EMBEDDINGS_PATH")                      # dir with model.onnx + tokenizer.json
+EMBEDDINGS_MAX_TOKENS = int(os.getenv("EMBEDDINGS_MAX_TOKENS", "256"))          # truncate longer inputs
+EMBEDDINGS_BATCH_TOKENS = int(os.getenv("EMBEDDINGS_BATCH_TOKENS", "8192"))     # padded tokens per forward pass
+EMBEDDINGS_PRECISION = os.getenv("EMBEDDINGS_PRECISION", "fp32").lower()        # fp32 | fp16 | int8
 
-os.environ["HUGGINGFACEHUB_API_TOKEN"] = hf_key
 
 def get_embeddings():
-    return HuggingFaceEndpointEmbeddings(
-        model="sentence-transformers/all-MiniLM-L6-v2"
-    )
+    if EMBEDDINGS_BACKEND == "local":
+        return LocalEmbeddings()
+    if EMBEDDINGS_BACKEND == "hf":
+        return _hf_embeddings()
+    raise ValueError(f"Unknown EMBEDDINGS_BACKEND '{EMBEDDINGS_BACKEND}'")
+
+
+def embedding_dimension(embedder) -> int:
+    """
+    Vector size of an embedder; LangChain embedders do not expose one, so probe them.
+    """
+    dimension = getattr(embedder, "dimension", None)
+    return dimension or len(embedder.embed_query("dimension probe"))
+
+
+def _hf_embeddings():
+    from langchain_huggingface import HuggingFaceEndpointEmbeddings
+
+    hf_key = os.getenv("HF_API_KEY")
+    if not hf_key:
+        raise ValueError("HF_API_KEY not set!")
+
+    os.environ["HUGGINGFACEHUB_API_TOKEN"] = hf_key
+    return HuggingFaceEndpointEmbeddings(model=EMBEDDINGS_MODEL)
+
+
+class LocalEmbeddings:
+    """
+    CPU embeddings with the same embed_documents / embed_query interface as
+    the LangChain embedders. Inputs are length-sorted and packed into
+    batches of at most EMBEDDINGS_BATCH_TOKENS padded tokens.
+    """
+
+    def __init__(self, model: str = None, path: str = None, max_tokens: int = None,
+                 batch_tokens: int = None, precision: str = None):
+        self.model = model or EMBEDDINGS_MODEL
+        self.path = path or LOCAL_EMBEDDINGS_PATH
+        self.max_tokens = max_tokens or EMBEDDINGS_MAX_TOKENS
+        self.batch_tokens = batch_tokens or EMBEDDINGS_BATCH_TOKENS
+        self.precision = precision or EMBEDDINGS_PRECISION
+        if self.precision not in ("fp32", "fp16", "int8"):
+            raise ValueError(f"Unknown EMBEDDINGS_PRECISION '{self.precision}'")
+
+        if self.path and os.path.exists(os.path.join(self.path, "model.onnx")):
+            self._init_onnx()
+        else:
+            self._init_sentence_transformers()
+
+        self.dimension = len(self.embed_query("dimension probe"))
+
+    # ---------- ONNX Runtime ----------
+    def _init_onnx(self):
+        try:
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise ImportError("Local ONNX embeddings need `onnxruntime` and `tokenizers` installed") from e
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(self.path, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=self.max_tokens)
+        self.tokenizer.no_padding()
+
+        model_file = self._onnx_model_file()
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_file, opts, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self._encode = self._encode_onnx
+
+    def _onnx_model_file(self) -> str:
+        base = os.path.join(self.path, "model.onnx")
+        if self.precision == "fp32":
+            return base
+
+        target = os.path.join(self.path, f"model_{self.precision}.onnx")
+        if os.path.exists(target):
+            return target
+
+        # Convert once and keep next to the original model
+        if self.precision == "int8":
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+            quantize_dynamic(base, target, weight_type=QuantType.QInt8)
+        else:
+            try:
+                import onnx
+                from onnxruntime.transformers.float16 import convert_float_to_float16
+            except ImportError as e:
+                raise ImportError("fp16 conversion needs the `onnx` package installed") from e
+            onnx.save(convert_float_to_float16(onnx.load(base), keep_io_types=True), target)
+        return target
+
+    def _encode_onnx(self, texts: List[str], encodings: list = None):
+        import numpy as np
+
+        if encodings is None:
+            encodings = self.tokenizer.encode_batch(texts)
+        max_len = max(len(e.ids) for e in encodings)
+        input_ids = np.zeros((len(texts), max_len), dtype=np.int64)
+        attention = np.zeros((len(texts), max_len), dtype=np.int64)
+        for row, enc in enumerate(encodings):
+            input_ids[row, :len(enc.ids)] = enc.ids
+            attention[row, :len(enc.ids)] = 1
+
+        feeds = {"input_ids": input_ids, "attention_mask": attention}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+
+        hidden = self.session.run(None, feeds)[0].astype(np.float32)  # (batch, seq, dim)
+
+        # Mean pooling over real tokens, then L2 normalise (sentence-transformers default)
+        mask = attention[..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.tolist()
+
+    def _tokenize(self, texts: List[str]):
+        """
+        (token lengths, encodings). ONNX encodings are reused by _encode_onnx;
+        sentence-transformers tokenizes itself, so its lengths are estimated.
+        """
+        if hasattr(self, "tokenizer"):
+            encodings = self.tokenizer.encode_batch(texts)
+            return [len(e.ids) for e in encodings], encodings
+        return [min(len(t.split()) * 2 + 2, self.max_tokens) for t in texts], None
+
+    # ---------- sentence-transformers ----------
+    def _init_sentence_transformers(self):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError(
+                "Local embeddings need either LOCAL_EMBEDDINGS_PATH with an ONNX export "
+                "or `sentence-transformers` installed"
+            ) from e
+
+        st_model = SentenceTransformer(self.path or self.model, device="cpu")
+        st_model.max_seq_length = self.max_tokens
+        if self.precision == "fp16":
+            st_model = st_model.half()
+        elif self.precision == "int8":
+            import torch
+            st_model = torch.quantization.quantize_dynamic(st_model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.st_model = st_model
+        self._encode = self._encode_sentence_transformers
+
+    def _encode_sentence_transformers(self, texts: List[str]):
+        vectors = self.st_model.encode(texts, batch_size=len(texts), normalize_embeddings=True,
+                                       convert_to_numpy=True, show_progress_bar=False)
+        return vectors.astype("float32").tolist()
+
+    # ---------- Public API ----------
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+
+        # Dynamic batching: sort by length so padding is minimal, then cut
+        # batches when padded size would exceed the token budget.
+        lengths, encodings = self._tokenize(texts)
+        order = sorted(range(len(texts)), key=lambda i: lengths[i])
+        results: List[List[float]] = [None] * len(texts)
+
+        batch: List[int] = []
+        for idx in order:
+            longest = max([lengths[i] for i in batch] + [lengths[idx]])
+            if batch and longest * (len(batch) + 1) > self.batch_tokens:
+                self._run_batch(texts, batch, results, encodings)
+                batch = []
+            batch.append(idx)
+        if batch:
+            self._run_batch(texts, batch, results, encodings)
+
+        return results
+
+    def _run_batch(self, texts: List[str], batch: List[int], results: List, encodings: list = None):
+        if encodings is not None:
+            vectors = self._encode_onnx([texts[i] for i in batch], [encodings[i] for i in batch])
+        else:
+            vectors = self._encode([texts[i] for i in batch])
+        for i, vec in zip(batch, vectors):
+            results[i] = vec
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0]
@@ -1,17 +1,14 @@
 from fastapi import HTTPException
 from services.rag.vectorstore import get_vectorstore
 from services.rag.utils import build_prompt
-from services.rag.llm import LLM
+from services.rag.llm import groq_llm
 from services.rag.ingest_web import ingest_web
 from services.rag.ingest_youtube import ingest_youtube
 
-vs = get_vectorstore()
-llm = LLM()
-
 
 def retrieve_node(state):
     query = state["query"]
-    docs = vs.query(query, k=4)
+    docs = get_vectorstore().query(query, k=4)
     state["retrieved_docs"] = docs
     return state
 
@@ -35,7 +32,7 @@ def search_web_node(state):
 
 def generate_answer_node(state):
     prompt = build_prompt(state["query"], state.get("retrieved_docs", []))
-    state["answer"] = llm.generate(prompt)
+    state["answer"] = groq_llm(prompt)
     return state
 
 
@@ -5,31 +5,84 @@ Agentic RAG Graph:
 - Automatic ingestion for missing knowledge
 - Intent-based generation: answer, summary, flashcards, quiz
 - Chunking, error handling, memory-aware
+- Async variant (arun) for the FastAPI event loop
+- Streaming variant (astream) yielding progress events and answer tokens
+- Semantic answer cache: near-identical questions over the same chunks skip the LLM
+- Token-aware context packing: chunks are de-duplicated, ordered by score and
+  cut to a per-intent token budget; prompt token counts are reported in meta
+- Per-request deadline: intent and retrieval (and, with RAG_SPECULATIVE_DISCOVERY,
+  source discovery) run concurrently; steps that would overrun are skipped and
+  the answer uses the context gathered so far
+- Every step is timed into the rag_step_seconds histogram; timings=True also
+  returns the per-request breakdown (ms) in meta
+- Batch variant (run_batch): one embedding call and one index round trip for all
+  queries, one ingestion per group of low-context queries on the same topic, and
+  answers generated RAG_BATCH_CONCURRENCY at a time
 """
 
-from typing import Dict, Any, List
-from services.rag.vectorstore import VectorStore
-from services.rag.llm import groq_llm
+import os
+import time
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Dict, Any, List, AsyncIterator
+import numpy as np
+from services.rag.llm import groq_llm, agroq_llm, agroq_llm_stream
+from services.rag.concurrency import run_blocking
 from services.rag.validators import is_low_context, detect_user_intent
-from services.rag.ingest_orchestrator import IngestOrchestrator
-from services.rag.memory import MemoryManager
+from services.rag.context_packing import pack_context, budget_for, count_tokens
+from services.rag.container import get_container
+from services.rag.ingest_orchestrator import SEARCH_TIMEOUT_SECONDS
+from services.rag.metrics import step_timer, count_query
 
-CHUNK_SIZE = 800  # characters per chunk for ingestion
+logger = logging.getLogger(__name__)
+
+NO_CONTEXT_ANSWER = "I could not find relevant information. Consider uploading a PDF, link, or checking online."
+
+RAG_DEADLINE_SECONDS = float(os.getenv("RAG_DEADLINE_SECONDS", "25"))                    # whole request
+RAG_GENERATION_RESERVE_SECONDS = float(os.getenv("RAG_GENERATION_RESERVE_SECONDS", "8"))  # kept back for the LLM
+# Off by default: search providers (SerpAPI is billed) would be queried for well-covered questions too
+RAG_SPECULATIVE_DISCOVERY = os.getenv("RAG_SPECULATIVE_DISCOVERY", "false").lower() in ("1", "true", "yes")
+RAG_STEP_WORKERS = int(os.getenv("RAG_STEP_WORKERS", "32"))
+RAG_BATCH_CONCURRENCY = int(os.getenv("RAG_BATCH_CONCURRENCY", "4"))                     # LLM calls in flight per batch
+RAG_BATCH_TOPIC_SIMILARITY = float(os.getenv("RAG_BATCH_TOPIC_SIMILARITY", "0.8"))       # queries sharing one ingestion
+RAG_BATCH_MAX_QUERIES = int(os.getenv("RAG_BATCH_MAX_QUERIES", "64"))                    # per /query/batch request
+
+_step_pool = ThreadPoolExecutor(max_workers=RAG_STEP_WORKERS, thread_name_prefix="rag-step")
+# Own pool: ingestion steps block on speculative discovery and must not wait on work queued behind them
+_speculation_pool = ThreadPoolExecutor(max_workers=RAG_STEP_WORKERS, thread_name_prefix="rag-speculate")
 
 class AgenticRAGState:
-    def __init__(self, user_message: str):
+    def __init__(self, user_message: str, deadline_seconds: float = None):
         self.query = user_message
+        self.deadline = time.monotonic() + (RAG_DEADLINE_SECONDS if deadline_seconds is None else deadline_seconds)
+        self.degraded: List[str] = []  # steps skipped or cut short by the deadline
+        self.discovery_cancel = threading.Event()
         self.intent = None
         self.retrieved_chunks: List[Dict] = []
         self.final_answer: str = ""
         self.new_ingestion_done = False
         self.extra_ingest_info: Dict = {}
+        self.query_vector: List[float] = None
+        self.answer_cached = False
+        self.prompt_stats: Dict = {}
+        self.timings: Dict[str, float] = {}  # step -> ms
+        self.report_timings = False
+
+    def remaining(self) -> float:
+        return self.deadline - time.monotonic()
 
 class AgenticRAGGraph:
-    def __init__(self):
-        self.vector_db = VectorStore()
-        self.ingestor = IngestOrchestrator()
-        self.memory = MemoryManager()
+    def __init__(self, vector_db=None, ingestor=None, memory=None, answer_cache=None, llm=None):
+        # Defaults come from the shared container so every graph reuses the same clients
+        container = get_container()
+        self.vector_db = vector_db or container.vectorstore
+        self.ingestor = ingestor or container.ingestor
+        self.memory = memory or container.memory
+        self.answer_cache = answer_cache or container.answer_cache
+        self.llm = llm or groq_llm  # fn(prompt) -> str; a replacement is also used by the async paths
 
     # ---------- STEP 1: Detect Intent ----------
     def step_detect_intent(self, state: AgenticRAGState):
@@ -42,57 +95,132 @@ class AgenticRAGGraph:
         state.retrieved_chunks = [c for c in chunks if c.get("text", "").strip()]
         return state
 
+    # ---------- Speculative discovery ----------
+    def start_discovery(self, state: AgenticRAGState):
+        """
+        Start searching for sources while retrieval is still in flight, so a
+        low-context result can go straight to ingestion. Returns a Future or None.
+        """
+        if not RAG_SPECULATIVE_DISCOVERY or self.ingestor.find_url_in_message(state.query):
+            return None
+        return _speculation_pool.submit(self.ingestor.discover_candidates, state.query, cancel=state.discovery_cancel)
+
+    @staticmethod
+    def _cancel_discovery(state: AgenticRAGState, discovery):
+        # Future.cancel() is a no-op once discovery runs; the event stops provider calls not yet made
+        if discovery is not None:
+            discovery.cancel()
+            state.discovery_cancel.set()
+
     # ---------- STEP 3: Decide on Ingestion ----------
-    def step_check_and_ingest(self, state: AgenticRAGState):
+    def step_check_and_ingest(self, state: AgenticRAGState, discovery=None):
         if not is_low_context(state.retrieved_chunks):
+            self._cancel_discovery(state, discovery)
             return state  # sufficient context
 
+        budget = state.remaining() - RAG_GENERATION_RESERVE_SECONDS
+        if budget <= 0:
+            state.degraded.append("ingestion")
+            return state
+
         try:
-            ingest_result = self.ingestor.auto_ingest_if_needed(state.query)
+            future = _step_pool.submit(self._ingest, state.query, discovery, budget)
+            ingest_result = future.result(timeout=budget)
             if ingest_result:
                 state.new_ingestion_done = True
                 state.extra_ingest_info = ingest_result
+        except FutureTimeout:
+            state.degraded.append("ingestion")  # keeps running in the background
         except Exception as e:
-            print("Ingestion failed:", e)
+            logger.warning("Ingestion failed: %s", e)
 
         return state
 
+    def _ingest(self, query: str, discovery, budget: float):
+        if discovery is None:
+            return self.ingestor.auto_ingest_if_needed(query)
+        started = time.monotonic()
+        if discovery.cancel():
+            # Still queued: search here rather than wait for a speculation worker
+            candidates = self.ingestor.discover_candidates(query, timeout=min(SEARCH_TIMEOUT_SECONDS, budget))
+        else:
+            candidates = discovery.result(timeout=budget)
+        ingested = self.ingestor.ingest_candidates(candidates, budget=budget - (time.monotonic() - started))
+        return self.ingestor.combine_ingested(ingested)
+
     # ---------- STEP 4: Re-retrieve if needed ----------
     def step_reretrieve_if_needed(self, state: AgenticRAGState):
         if state.new_ingestion_done:
+            if state.remaining() <= 0:
+                state.degraded.append("reretrieve")
+                return state
             chunks = self.vector_db.query(state.query, k=5)
             state.retrieved_chunks = [c for c in chunks if c.get("text", "").strip()]
         return state
 
-    # ---------- STEP 5: Generate Answer ----------
-    def step_generate_answer(self, state: AgenticRAGState):
-        context_text = "\n\n".join([c.get("text", "") for c in state.retrieved_chunks])
+    # ---------- STEP 5: Cached Answer Lookup ----------
+    def step_lookup_cached_answer(self, state: AgenticRAGState):
+        if not state.retrieved_chunks:
+            return state
+        state.query_vector = self.vector_db.embed_query(state.query)  # served from the embedding cache
+        return self._apply_cached_answer(state)
+
+    def _apply_cached_answer(self, state: AgenticRAGState):
+        chunk_ids = [c.get("id") for c in state.retrieved_chunks]
+        cached = self.answer_cache.lookup(state.query_vector, state.intent, chunk_ids)
+        if cached is not None:
+            state.final_answer = cached
+            state.answer_cached = True
+        return state
+
+    def _remember_answer(self, state: AgenticRAGState):
+        if state.query_vector is not None:
+            self.answer_cache.store(state.query_vector, state.intent, state.retrieved_chunks, state.final_answer)
+
+    # ---------- STEP 6: Generate Answer ----------
+    def build_answer_prompt(self, state: AgenticRAGState):
+        packed, stats = pack_context(state.retrieved_chunks, budget_for(state.intent))
+        context_text = "\n\n".join([c["text"] for c in packed])
 
         if not context_text.strip():
-            state.final_answer = "I could not find relevant information. Consider uploading a PDF, link, or checking online."
-            return state
+            return None
+
+        prompt = self._intent_prompt(state, context_text)
+        state.prompt_stats = {**stats, "prompt_tokens": count_tokens(prompt)}
+        return prompt
 
+    @staticmethod
+    def _intent_prompt(state: AgenticRAGState, context_text: str) -> str:
         if state.intent == "summarize":
-            prompt = f"Summarize the following information clearly:\n\n{context_text}"
+            return f"Summarize the following information clearly:\n\n{context_text}"
         elif state.intent == "flashcards":
-            prompt = f"Generate 10 study flashcards in Q&A format:\n\n{context_text}"
+            return f"Generate 10 study flashcards in Q&A format:\n\n{context_text}"
         elif state.intent == "quiz":
-            prompt = f"Generate a 10-question multiple-choice quiz (4 options each) from this content:\n\n{context_text}"
-        else:
-            prompt = (
-                f"You are an expert assistant. Use the context below to answer the question.\n\n"
-                f"Context:\n{context_text}\n\n"
-                f"Question: {state.query}\nAnswer clearly:"
-            )
+            return f"Generate a 10-question multiple-choice quiz (4 options each) from this content:\n\n{context_text}"
+        return (
+            f"You are an expert assistant. Use the context below to answer the question.\n\n"
+            f"Context:\n{context_text}\n\n"
+            f"Question: {state.query}\nAnswer clearly:"
+        )
+
+    def step_generate_answer(self, state: AgenticRAGState):
+        if state.answer_cached:
+            return state
+
+        prompt = self.build_answer_prompt(state)
+        if prompt is None:
+            state.final_answer = NO_CONTEXT_ANSWER
+            return state
 
         try:
-            state.final_answer = groq_llm(prompt)
+            state.final_answer = self.llm(prompt)
+            self._remember_answer(state)
         except Exception as e:
             state.final_answer = f"LLM generation failed: {e}"
 
         return state
 
-    # ---------- STEP 6: Update Memory ----------
+    # ---------- STEP 7: Update Memory ----------
     def step_update_memory(self, state: AgenticRAGState):
         if state.extra_ingest_info:
             topic = state.query.lower().strip()[:60]
@@ -100,20 +228,294 @@ class AgenticRAGGraph:
         return state
 
     # ---------- FULL EXECUTION ----------
-    def run(self, user_message: str) -> Dict[str, Any]:
-        state = AgenticRAGState(user_message)
+    def _timed(self, state: AgenticRAGState, step: str):
+        return step_timer(step, state.timings)
+
+    def run(self, user_message: str, deadline_seconds: float = None, timings: bool = False) -> Dict[str, Any]:
+        state = AgenticRAGState(user_message, deadline_seconds)
+        state.report_timings = timings
+
+        def timed(step, fn, *args):
+            with self._timed(state, step):
+                return fn(*args)
+
+        # Intent, retrieval and speculative discovery are independent: run them together
+        intent = _step_pool.submit(timed, "intent", detect_user_intent, state.query)
+        retrieval = _step_pool.submit(timed, "retrieve", self.vector_db.query, state.query, 5)
+        discovery = self.start_discovery(state)
+
+        state.intent = intent.result()
+        try:
+            chunks = retrieval.result(timeout=max(state.remaining(), 0))
+            state.retrieved_chunks = [c for c in chunks if c.get("text", "").strip()]
+        except FutureTimeout:
+            state.degraded.append("retrieve")
+
+        with self._timed(state, "ingestion"):
+            state = self.step_check_and_ingest(state, discovery)
+        with self._timed(state, "reretrieve"):
+            state = self.step_reretrieve_if_needed(state)
+        with self._timed(state, "answer_cache"):
+            state = self.step_lookup_cached_answer(state)
+        with self._timed(state, "generate"):
+            state = self.step_generate_answer(state)
+        with self._timed(state, "memory"):
+            state = self.step_update_memory(state)
 
-        state = self.step_detect_intent(state)
-        state = self.step_retrieve(state)
-        state = self.step_check_and_ingest(state)
-        state = self.step_reretrieve_if_needed(state)
-        state = self.step_generate_answer(state)
-        state = self.step_update_memory(state)
+        return self._result(state)
 
+    def _meta(self, state: AgenticRAGState) -> Dict:
+        meta = dict(state.extra_ingest_info)
+        if state.degraded:
+            meta["degraded"] = state.degraded
+        if state.prompt_stats:
+            meta["prompt"] = state.prompt_stats
+        if state.report_timings:
+            meta["timings"] = state.timings
+        return meta
+
+    def _count(self, state: AgenticRAGState):
+        count_query(state.intent, state.answer_cached, state.new_ingestion_done, bool(state.degraded))
+
+    def _result(self, state: AgenticRAGState) -> Dict[str, Any]:
+        self._count(state)
         return {
             "response": state.final_answer,
             "intent": state.intent,
             "new_ingestion": state.new_ingestion_done,
-            "meta": state.extra_ingest_info,
-            "retrieved_chunks": state.retrieved_chunks  # Only non-empty chunks
+            "meta": self._meta(state),
+            "retrieved_chunks": state.retrieved_chunks,  # Only non-empty chunks
+            "cached": state.answer_cached
         }
+
+    # ---------- ASYNC STEPS ----------
+    # Qdrant, embeddings and Groq use native async clients; ingestion and
+    # Supabase memory writes stay blocking and run on the bounded pool.
+    async def astep_retrieve(self, state: AgenticRAGState, step: str = "retrieve"):
+        try:
+            chunks = await asyncio.wait_for(self.vector_db.aquery(state.query, k=5), timeout=max(state.remaining(), 0))
+            state.retrieved_chunks = [c for c in chunks if c.get("text", "").strip()]
+        except asyncio.TimeoutError:
+            state.degraded.append(step)
+        return state
+
+    async def astep_check_and_ingest(self, state: AgenticRAGState, discovery=None):
+        return await run_blocking(self.step_check_and_ingest, state, discovery)
+
+    async def astep_reretrieve_if_needed(self, state: AgenticRAGState):
+        if state.new_ingestion_done:
+            state = await self.astep_retrieve(state, step="reretrieve")
+        return state
+
+    async def astep_lookup_cached_answer(self, state: AgenticRAGState):
+        if not state.retrieved_chunks:
+            return state
+        state.query_vector = await self.vector_db.aembed_query(state.query)
+        return self._apply_cached_answer(state)
+
+    async def astep_generate_answer(self, state: AgenticRAGState):
+        if state.answer_cached:
+            return state
+
+        prompt = self.build_answer_prompt(state)
+        if prompt is None:
+            state.final_answer = NO_CONTEXT_ANSWER
+            return state
+
+        try:
+            state.final_answer = await self._acomplete(prompt)
+            self._remember_answer(state)
+        except Exception as e:
+            state.final_answer = f"LLM generation failed: {e}"
+
+        return state
+
+    async def _acomplete(self, prompt: str) -> str:
+        if self.llm is groq_llm:
+            return await agroq_llm(prompt)
+        return await run_blocking(self.llm, prompt)
+
+    async def _astream_completion(self, prompt: str) -> AsyncIterator[str]:
+        if self.llm is groq_llm:
+            async for delta in agroq_llm_stream(prompt):
+                yield delta
+        else:
+            yield await run_blocking(self.llm, prompt)
+
+    async def astep_update_memory(self, state: AgenticRAGState):
+        return await run_blocking(self.step_update_memory, state)
+
+    # ---------- BATCH EXECUTION ----------
+    def run_batch(self, user_messages: List[str], deadline_seconds: float = None, timings: bool = False) -> List[Dict[str, Any]]:
+        """
+        run() for many queries at once; results come back in input order.
+        """
+        states = [AgenticRAGState(message, deadline_seconds) for message in user_messages]
+        if not states:
+            return []
+        for state in states:
+            state.report_timings = timings
+            with self._timed(state, "intent"):
+                self.step_detect_intent(state)
+
+        with self._timed_batch(states, "retrieve"):
+            self._retrieve_batch(states)
+
+        low = [state for state in states if is_low_context(state.retrieved_chunks)]
+        if low:
+            with self._timed_batch(low, "ingestion"):
+                self._ingest_batch(low)
+            ingested = [state for state in low if state.new_ingestion_done]
+            if ingested:
+                with self._timed_batch(ingested, "reretrieve"):
+                    self._retrieve_batch(ingested)
+
+        with ThreadPoolExecutor(max_workers=RAG_BATCH_CONCURRENCY, thread_name_prefix="rag-batch") as pool:
+            return list(pool.map(self._finish, states))
+
+    @contextmanager
+    def _timed_batch(self, states: List[AgenticRAGState], step: str):
+        # One histogram sample for the shared call; every query is charged its full duration
+        elapsed: Dict[str, float] = {}
+        with step_timer(step, elapsed):
+            yield
+        for state in states:
+            state.timings[step] = round(state.timings.get(step, 0.0) + elapsed[step], 2)
+
+    def _retrieve_batch(self, states: List[AgenticRAGState]):
+        results = self.vector_db.query_batch([state.query for state in states], k=5)
+        for state, chunks in zip(states, results):
+            state.retrieved_chunks = [c for c in chunks if c.get("text", "").strip()]
+
+    def _ingest_batch(self, states: List[AgenticRAGState]):
+        groups = self._topic_groups(states)
+        with ThreadPoolExecutor(max_workers=min(len(groups), RAG_BATCH_CONCURRENCY), thread_name_prefix="rag-batch-ingest") as pool:
+            list(pool.map(lambda group: self.step_check_and_ingest(group[0]), groups))
+        for lead, *members in groups:
+            for state in members:
+                state.new_ingestion_done = lead.new_ingestion_done
+                state.extra_ingest_info = dict(lead.extra_ingest_info)
+                state.degraded.extend(lead.degraded)
+
+    def _topic_groups(self, states: List[AgenticRAGState]) -> List[List[AgenticRAGState]]:
+        """
+        Group queries that would ingest the same sources: the same URL, or query
+        embeddings at least RAG_BATCH_TOPIC_SIMILARITY alike. The first query of
+        a group leads its ingestion.
+        """
+        groups = []  # (url, unit query vector, states)
+        for state in states:
+            url = self.ingestor.find_url_in_message(state.query)
+            vector = None
+            if url is None:
+                vector = np.asarray(self.vector_db.embed_query(state.query), dtype=np.float32)  # cached by the batch
+                vector /= np.linalg.norm(vector) or 1.0
+            for group_url, group_vector, members in groups:
+                if url is not None or group_url is not None:
+                    same_topic = url == group_url
+                else:
+                    same_topic = float(vector @ group_vector) >= RAG_BATCH_TOPIC_SIMILARITY
+                if same_topic:
+                    members.append(state)
+                    break
+            else:
+                groups.append((url, vector, [state]))
+        return [members for _, _, members in groups]
+
+    def _finish(self, state: AgenticRAGState) -> Dict[str, Any]:
+        with self._timed(state, "answer_cache"):
+            state = self.step_lookup_cached_answer(state)
+        with self._timed(state, "generate"):
+            state = self.step_generate_answer(state)
+        with self._timed(state, "memory"):
+            state = self.step_update_memory(state)
+        return self._result(state)
+
+    async def arun(self, user_message: str, deadline_seconds: float = None, timings: bool = False) -> Dict[str, Any]:
+        state = AgenticRAGState(user_message, deadline_seconds)
+        state.report_timings = timings
+
+        discovery = self.start_discovery(state)
+        with self._timed(state, "intent"):
+            state = self.step_detect_intent(state)
+        with self._timed(state, "retrieve"):
+            state = await self.astep_retrieve(state)
+        with self._timed(state, "ingestion"):
+            state = await self.astep_check_and_ingest(state, discovery)
+        with self._timed(state, "reretrieve"):
+            state = await self.astep_reretrieve_if_needed(state)
+        with self._timed(state, "answer_cache"):
+            state = await self.astep_lookup_cached_answer(state)
+        with self._timed(state, "generate"):
+            state = await self.astep_generate_answer(state)
+        with self._timed(state, "memory"):
+            state = await self.astep_update_memory(state)
+
+        return self._result(state)
+
+    async def astream(self, user_message: str, timings: bool = False) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Same steps as arun, but yields {"event": ..., "data": ...} dicts:
+        intent, retrieval, ingestion progress, answer tokens, then a final
+        "done" event carrying the fields of the JSON /query response.
+        """
+        state = AgenticRAGState(user_message)
+        state.report_timings = timings
+
+        discovery = self.start_discovery(state)
+        with self._timed(state, "intent"):
+            state = self.step_detect_intent(state)
+        yield {"event": "intent", "data": {"intent": state.intent}}
+
+        with self._timed(state, "retrieve"):
+            state = await self.astep_retrieve(state)
+        yield {"event": "retrieval", "data": {"chunks": len(state.retrieved_chunks)}}
+
+        if not is_low_context(state.retrieved_chunks):
+            self._cancel_discovery(state, discovery)
+        else:
+            yield {"event": "ingestion", "data": {"status": "started"}}
+            with self._timed(state, "ingestion"):
+                state = await self.astep_check_and_ingest(state, discovery)
+            yield {"event": "ingestion", "data": {
+                "status": "done",
+                "new_ingestion_done": state.new_ingestion_done,
+                "url": state.extra_ingest_info.get("url"),
+            }}
+            if state.new_ingestion_done:
+                with self._timed(state, "reretrieve"):
+                    state = await self.astep_reretrieve_if_needed(state)
+                yield {"event": "retrieval", "data": {"chunks": len(state.retrieved_chunks)}}
+
+        with self._timed(state, "answer_cache"):
+            state = await self.astep_lookup_cached_answer(state)
+        prompt = None if state.answer_cached else self.build_answer_prompt(state)
+        if state.answer_cached:
+            yield {"event": "token", "data": {"text": state.final_answer}}
+        elif prompt is None:
+            state.final_answer = NO_CONTEXT_ANSWER
+            yield {"event": "token", "data": {"text": state.final_answer}}
+        else:
+            parts = []
+            try:
+                with self._timed(state, "generate"):  # time to the last token
+                    async for delta in self._astream_completion(prompt):
+                        parts.append(delta)
+                        yield {"event": "token", "data": {"text": delta}}
+                state.final_answer = "".join(parts)
+                self._remember_answer(state)
+            except Exception as e:
+                state.final_answer = f"LLM generation failed: {e}"
+                yield {"event": "error", "data": {"detail": state.final_answer}}
+
+        with self._timed(state, "memory"):
+            state = await self.astep_update_memory(state)
+        self._count(state)
+
+        yield {"event": "done", "data": {
+            "query": state.query,
+            "answer": state.final_answer,
+            "intent": state.intent,
+            "new_ingestion_done": state.new_ingestion_done,
+            "meta": self._meta(state),
+        }}
@@ -0,0 +1,401 @@
+# services/rag/http_cache.py
+"""
+On-disk HTTP response cache for GET requests.
+- Bodies stored zstandard-compressed under HTTP_CACHE_DIR, indexed in SQLite
+- Freshness from Cache-Control (no-store, no-cache, max-age, s-maxage), Expires,
+  or a Last-Modified heuristic; stale entries are revalidated with
+  If-None-Match / If-Modified-Since and reused on 304
+- Total size bounded by HTTP_CACHE_MAX_BYTES with least-recently-used eviction
+- Streamed bodies are compressed into the cache while the caller reads them; bodies
+  over HTTP_CACHE_MAX_ENTRY_BYTES (by Content-Length, or once they grow past it)
+  just pass through, so nothing is downloaded twice
+- A stale entry is served if the origin cannot be reached
+- HTTP_CACHE_OFFLINE=1 never touches the network: hits are served regardless
+  of age and misses raise (offline tests/benchmarks with a pre-seeded cache dir)
+"""
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+import requests
+import xxhash
+import zstandard
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from services.rag.clients import http_get
+from services.rag.container import get_container
+
+HTTP_CACHE_ENABLED = os.getenv("HTTP_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+HTTP_CACHE_DIR = os.getenv("HTTP_CACHE_DIR", "data/http_cache")
+HTTP_CACHE_MAX_BYTES = int(os.getenv("HTTP_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))        # compressed, all entries
+HTTP_CACHE_MAX_ENTRY_BYTES = int(os.getenv("HTTP_CACHE_MAX_ENTRY_BYTES", str(64 * 1024 * 1024)))  # compressed, one entry
+HTTP_CACHE_DEFAULT_TTL = float(os.getenv("HTTP_CACHE_DEFAULT_TTL", "300"))     # no freshness info at all
+HTTP_CACHE_HEURISTIC_MAX = float(os.getenv("HTTP_CACHE_HEURISTIC_MAX", "86400"))  # cap for Last-Modified heuristic
+HTTP_CACHE_OFFLINE = os.getenv("HTTP_CACHE_OFFLINE", "false").lower() in ("1", "true", "yes")
+HTTP_CACHE_LEVEL = int(os.getenv("HTTP_CACHE_LEVEL", "3"))                     # zstd compression level
+
+STREAM_CHUNK = 1024 * 1024
+
+# Describe the stored (decoded) body, or only make sense on the original connection
+_DROP_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection", "keep-alive"}
+
+
+def _parse_cache_control(value: str) -> Dict[str, Optional[str]]:
+    directives = {}
+    for part in (value or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, arg = part.partition("=")
+        directives[name.strip().lower()] = arg.strip().strip('"') or None
+    return directives
+
+
+def _http_date(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def freshness(headers, now: float) -> Tuple[bool, float]:
+    """
+    (storable, expires_at) for a 200 response with these headers.
+    """
+    cc = _parse_cache_control(headers.get("Cache-Control"))
+    if "no-store" in cc:
+        return False, now
+    if "no-cache" in cc:
+        return True, now  # store, but revalidate before every use
+
+    for directive in ("s-maxage", "max-age"):
+        if cc.get(directive) is not None:
+            try:
+                return True, now + max(0, int(cc[directive]))
+            except ValueError:
+                pass
+
+    date = _http_date(headers.get("Date")) or now
+    if headers.get("Expires") is not None:
+        expires = _http_date(headers.get("Expires"))
+        # An unparseable Expires (e.g. "0") means already expired
+        return True, now + max(0.0, expires - date) if expires else now
+
+    last_modified = _http_date(headers.get("Last-Modified"))
+    if last_modified:
+        return True, now + min(max(0.0, date - last_modified) * 0.1, HTTP_CACHE_HEURISTIC_MAX)
+
+    return True, now + HTTP_CACHE_DEFAULT_TTL
+
+
+class _BodyWriter:
+    """
+    zstd-compresses a body into a temporary file next to its cache path. Gives
+    up (too_big) as soon as the compressed size passes HTTP_CACHE_MAX_ENTRY_BYTES.
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        self.too_big = False
+        self._file = open(self.tmp, "wb")
+        self._writer = zstandard.ZstdCompressor(level=HTTP_CACHE_LEVEL).stream_writer(self._file, closefd=False)
+
+    def write(self, chunk: bytes):
+        if self.too_big:
+            return
+        self._writer.write(chunk)
+        if self._file.tell() > HTTP_CACHE_MAX_ENTRY_BYTES:
+            self.abort()
+            self.too_big = True
+
+    def commit(self) -> int:
+        """
+        Move the body into place; returns its size, or -1 if it was too big.
+        """
+        if self.too_big:
+            return -1
+        self._writer.close()
+        self._file.close()
+        size = os.path.getsize(self.tmp)
+        if size > HTTP_CACHE_MAX_ENTRY_BYTES:
+            os.remove(self.tmp)
+            return -1
+        os.replace(self.tmp, self.path)  # readers never see a half-written body
+        return size
+
+    def abort(self):
+        if self._file.closed:
+            return
+        self._file.close()
+        if os.path.exists(self.tmp):
+            os.remove(self.tmp)
+
+
+class _TeeBody:
+    """
+    Stand-in for Response.raw: hands the origin's decoded body to the caller
+    while writing a compressed copy. The copy is indexed once the body is read
+    to the end, and dropped if the caller stops early or it grows too big.
+    """
+
+    def __init__(self, origin, writer: _BodyWriter, on_complete):
+        self._origin = origin
+        self._chunks = origin.stream(STREAM_CHUNK, decode_content=True)
+        self._writer = writer
+        self._on_complete = on_complete
+        self._buffer = bytearray()
+        self._done = False
+
+    def read(self, amt: int = None, **kwargs) -> bytes:
+        while not self._done and (amt is None or amt < 0 or len(self._buffer) < amt):
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                self._finish()
+                break
+            self._buffer += chunk
+            self._writer.write(chunk)
+        if amt is None or amt < 0:
+            amt = len(self._buffer)
+        data = bytes(self._buffer[:amt])
+        del self._buffer[:amt]
+        return data
+
+    def _finish(self):
+        self._done = True
+        size = self._writer.commit()
+        if size >= 0:
+            self._on_complete(size)
+
+    def close(self):
+        if not self._done:
+            self._done = True
+            self._writer.abort()
+        self._origin.close()
+
+    def release_conn(self):
+        self._origin.release_conn()
+
+
+class HTTPCache:
+    def __init__(self, directory: str = None, max_bytes: int = None, offline: bool = None):
+        self.directory = directory or HTTP_CACHE_DIR
+        self.max_bytes = max_bytes or HTTP_CACHE_MAX_BYTES
+        self.offline = HTTP_CACHE_OFFLINE if offline is None else offline
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._db = sqlite3.connect(os.path.join(self.directory, "index.sqlite3"), check_same_thread=False)
+        self._lock = threading.Lock()
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                status INTEGER NOT NULL,
+                headers TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                expires_at REAL NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._db.commit()
+
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.stale_served = 0
+        self.evictions = 0
+
+    # ---------- Index ----------
+    @staticmethod
+    def cache_key(url: str, params=None) -> Tuple[str, str]:
+        full_url = requests.Request("GET", url, params=params).prepare().url
+        return xxhash.xxh3_128_hexdigest(full_url), full_url
+
+    def _body_path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.zst")
+
+    def _lookup(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT url, status, headers, etag, last_modified, expires_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+        if not row or not os.path.exists(self._body_path(key)):
+            return None
+        return {"url": row[0], "status": row[1], "headers": json.loads(row[2]),
+                "etag": row[3], "last_modified": row[4], "expires_at": row[5]}
+
+    def _touch(self, key: str, expires_at: float = None, headers: Dict = None):
+        with self._lock:
+            if expires_at is None:
+                self._db.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+            else:
+                self._db.execute(
+                    "UPDATE entries SET last_access = ?, expires_at = ?, headers = ? WHERE key = ?",
+                    (time.time(), expires_at, json.dumps(headers), key),
+                )
+            self._db.commit()
+
+    def _index(self, key: str, url: str, resp_headers, expires_at: float, size: int):
+        headers = {k: v for k, v in resp_headers.items() if k.lower() not in _DROP_HEADERS}
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                """
+                INSERT OR REPLACE INTO entries (key, url, status, headers, etag, last_modified, expires_at, size, last_access)
+                VALUES (?, ?, 200, ?, ?, ?, ?, ?, ?)
+                """,
+                (key, url, json.dumps(headers), resp_headers.get("ETag"), resp_headers.get("Last-Modified"), expires_at, size, now),
+            )
+            self._db.commit()
+        self._evict()
+
+    def _evict(self):
+        with self._lock:
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            doomed = []
+            for key, size in self._db.execute("SELECT key, size FROM entries ORDER BY last_access"):
+                if total <= self.max_bytes:
+                    break
+                doomed.append(key)
+                total -= size
+            self._db.executemany("DELETE FROM entries WHERE key = ?", [(k,) for k in doomed])
+            self._db.commit()
+            self.evictions += len(doomed)
+        for key in doomed:
+            try:
+                os.remove(self._body_path(key))
+            except FileNotFoundError:
+                pass
+
+    # ---------- Bodies ----------
+    def _write_body(self, key: str, chunks) -> int:
+        writer = _BodyWriter(self._body_path(key))
+        try:
+            for chunk in chunks:
+                writer.write(chunk)
+            return writer.commit()
+        except BaseException:
+            writer.abort()
+            raise
+
+    def _cached_response(self, key: str, entry: Dict, stream: bool) -> requests.Response:
+        resp = requests.Response()
+        resp.status_code = entry["status"]
+        resp.reason = "OK"
+        resp.url = entry["url"]
+        resp.headers = CaseInsensitiveDict(entry["headers"])
+        resp.encoding = get_encoding_from_headers(resp.headers)
+        resp.from_cache = True
+
+        reader = zstandard.ZstdDecompressor().stream_reader(open(self._body_path(key), "rb"), closefd=True)
+        if stream:
+            resp.raw = reader  # iter_content() reads and decompresses lazily
+        else:
+            with reader:
+                resp._content = reader.readall()
+        return resp
+
+    # ---------- Public API ----------
+    def get(self, url: str, params=None, headers: Dict = None, timeout: float = None, stream: bool = False, **kwargs) -> requests.Response:
+        """
+        Drop-in for clients.http_get. Returned responses carry `from_cache`.
+        """
+        key, full_url = self.cache_key(url, params)
+        entry = self._lookup(key)
+        now = time.time()
+
+        if entry is not None and (self.offline or now < entry["expires_at"]):
+            self.hits += 1
+            self._touch(key)
+            return self._cached_response(key, entry, stream)
+        if self.offline:
+            self.misses += 1
+            raise requests.ConnectionError(f"HTTP cache is offline and has no entry for {full_url}")
+
+        request_headers = dict(headers or {})
+        if entry is not None:
+            if entry["etag"]:
+                request_headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                request_headers["If-Modified-Since"] = entry["last_modified"]
+
+        try:
+            resp = http_get(full_url, timeout=timeout, headers=request_headers, stream=True, **kwargs)
+        except requests.RequestException:
+            if entry is None:
+                raise
+            self.stale_served += 1  # origin unreachable: stale beats nothing
+            return self._cached_response(key, entry, stream)
+
+        if resp.status_code == 304 and entry is not None:
+            resp.close()
+            self.revalidated += 1
+            merged = {**entry["headers"], **{k: v for k, v in resp.headers.items() if k.lower() not in _DROP_HEADERS}}
+            _, expires_at = freshness(CaseInsensitiveDict(merged), now)
+            self._touch(key, expires_at, merged)
+            return self._cached_response(key, entry, stream)
+
+        self.misses += 1
+        resp.from_cache = False
+        storable, expires_at = freshness(resp.headers, now)
+        declared = resp.headers.get("Content-Length")
+        too_big = declared is not None and declared.isdigit() and int(declared) > HTTP_CACHE_MAX_ENTRY_BYTES
+        if resp.status_code != 200 or not storable or too_big:
+            return resp if stream else self._consume(resp)
+
+        if not stream:
+            self._consume(resp)
+            size = self._write_body(key, [resp.content])
+            if size >= 0:
+                self._index(key, full_url, resp.headers, expires_at, size)
+            return resp
+
+        # Streaming: the caller reads from the origin while a copy goes to disk
+        resp.raw = _TeeBody(resp.raw, _BodyWriter(self._body_path(key)),
+                            lambda size: self._index(key, full_url, resp.headers, expires_at, size))
+        return resp
+
+    @staticmethod
+    def _consume(resp: requests.Response) -> requests.Response:
+        resp.content  # read the body before the connection goes back to the pool
+        return resp
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        lookups = self.hits + self.misses + self.revalidated + self.stale_served
+        return {
+            "entries": entries,
+            "bytes": size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidated": self.revalidated,
+            "stale_served": self.stale_served,
+            "evictions": self.evictions,
+            "hit_ratio": round((lookups - self.misses) / lookups, 4) if lookups else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def cached_get(url: str, timeout: float = None, **kwargs) -> requests.Response:
+    """
+    GET through the shared on-disk cache (plain http_get when HTTP_CACHE_ENABLED is off).
+    """
+    if not HTTP_CACHE_ENABLED:
+        return http_get(url, timeout=timeout, **kwargs)
+    return get_container().http_cache.get(url, timeout=timeout, **kwargs)
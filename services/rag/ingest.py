@@ -1,35 +1,42 @@
 # services/rag/ingest.py
 
-import uuid
-from services.rag.vectorstore import get_vectorstore
-
-vs = get_vectorstore()
+from typing import Iterable
+from services.rag.pipeline import IngestPipeline
+from services.rag.chunker import iter_chunks
 
 
 def ingest_text(text: str, source_type="manual", metadata=None):
     """
     Ingest a single text document into the vector store.
     Always includes the text in the payload to avoid empty retrievals.
+    Long texts are split by the shared chunker.
+    Point ids are content hashes, so re-ingesting the same text is a no-op.
     """
     meta = metadata or {}
     meta["source_type"] = source_type
-    meta["text"] = text  # ✅ Store the actual text
-    vs.add_documents(
-        docs=[text],
-        ids=[str(uuid.uuid4())],
-        payloads=[meta]
-    )
+    with IngestPipeline() as pipe:
+        for chunk, _ in iter_chunks([text]):
+            pipe.add(chunk, meta)  # pipeline stores the actual text in the payload
     return True
 
 
-def ingest_pdf_text(pages: list[str], pdf_name: str):
+def ingest_pdf_text(pages: Iterable[str], pdf_name: str, progress=None, pipeline=None):
     """
-    Ingest multiple PDF pages into the vector store.
-    Each page is stored as a separate document with metadata.
+    Ingest PDF pages into the vector store.
+    Pages may be a lazy iterable; they are chunked as they arrive, each chunk
+    tagged with the page it starts on, and embedded/upserted in batches.
     """
-    for page in pages:
-        ingest_text(page, source_type="pdf", metadata={"pdf_name": pdf_name})
-    return {"status": "success", "pages_ingested": len(pages)}
+    counted = {"pages": 0}
+
+    def segments():
+        for number, page in enumerate(pages, 1):
+            counted["pages"] = number
+            yield page, {"page": number}
+
+    with (pipeline or IngestPipeline(progress=progress)) as pipe:
+        for chunk, meta in iter_chunks(segments()):
+            pipe.add(chunk, {"source_type": "pdf", "pdf_name": pdf_name, "page": meta["page"]})
+    return {"status": "success", "pages_ingested": counted["pages"], **pipe.stats()}
 
 
 def ingest_youtube(text: str, video_name: str = None):
@@ -1,18 +1,41 @@
 # services/rag/ingest_orchestrator.py
 
+import os
 import re
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from typing import Optional, Dict, List
-from services.rag.tools import fetch_pdf_text, web_search, choose_best_source, SERPAPI_KEY
-from services.rag.memory import MemoryManager
+from services.rag.tools import fetch_pdf_pages, web_search, youtube_search, rank_sources
 from services.rag.ingest import ingest_pdf_text
 from services.rag.ingest_web import ingest_web
 from services.rag.ingest_youtube import ingest_youtube
+from services.rag.utils import youtube_video_id
+from services.rag.container import get_container
 
 URL_REGEX = r"(https?://[^\s]+)"
+NO_SOURCE_TEXT = "I could not find relevant information. Consider uploading a PDF, link, or checking online."
+
+INGEST_TOP_N = int(os.getenv("INGEST_TOP_N", "3"))                              # candidate urls ingested in parallel
+INGEST_BUDGET_SECONDS = float(os.getenv("INGEST_BUDGET_SECONDS", "20"))         # whole discover + ingest step
+SEARCH_TIMEOUT_SECONDS = float(os.getenv("SEARCH_TIMEOUT_SECONDS", "6"))        # per search provider
+INGEST_TASK_TIMEOUT_SECONDS = float(os.getenv("INGEST_TASK_TIMEOUT_SECONDS", "15"))  # per candidate url
+INGEST_DISCOVERY_WORKERS = int(os.getenv("INGEST_DISCOVERY_WORKERS", "16"))
+
+logger = logging.getLogger(__name__)
+
+# Own pool: discovery can itself run inside the shared blocking pool (async path)
+_discovery_pool = ThreadPoolExecutor(max_workers=INGEST_DISCOVERY_WORKERS, thread_name_prefix="rag-discovery")
+
+
+def _ingested(result) -> bool:
+    return bool(result) and not (isinstance(result, dict) and result.get("status") == "failed")
+
 
 class IngestOrchestrator:
-    def __init__(self):
-        self.memory = MemoryManager()
+    def __init__(self, memory=None):
+        self.memory = memory or get_container().memory
 
     def find_url_in_message(self, text: str) -> Optional[str]:
         m = re.search(URL_REGEX, text)
@@ -27,97 +50,135 @@ class IngestOrchestrator:
     def _handle_url(self, url: str) -> Optional[Dict]:
         if self.memory.has_source(url):
             return None
+        info = self._ingest_source(url, None)
+        return info if info["type"] != "none" else None
 
-        # PDF
-        if url.lower().endswith(".pdf"):
-            txt = fetch_pdf_text(url)
-            if txt:
-                ingest_pdf_text([txt], pdf_name=url)
-                self.memory.register_source(url, "pdf", "PDF Document")
-                return {"url": url, "type": "pdf", "text": txt}
-
-        # YouTube
-        if "youtube.com" in url or "youtu.be" in url:
-            txt = ingest_youtube(url)
-            if txt:
-                self.memory.register_source(url, "youtube", "YouTube Video")
-                return {"url": url, "type": "youtube", "text": str(txt)}
-
-        # Web page
-        txt = ingest_web(url)
-        if txt:
-            self.memory.register_source(url, "web", "Web Page")
-            return {"url": url, "type": "web", "text": str(txt)}
+    # ---------- Discovery: fan out across search providers ----------
+    def _search_providers(self, query: str) -> Dict:
+        # web_search already goes through SerpAPI Google when SERPAPI_KEY is set
+        return {
+            "web": lambda: web_search(query),
+            "youtube": lambda: youtube_search(query),
+        }
 
-        return None
+    def discover_candidates(self, query: str, timeout: float = None, cancel: threading.Event = None) -> List[Dict]:
+        """
+        Query every search provider at once and merge whatever returns within
+        `timeout` into one ranked, de-duplicated list of unseen sources.
+        Providers not yet called when `cancel` is set are skipped.
+        """
+        timeout = SEARCH_TIMEOUT_SECONDS if timeout is None else timeout
+        providers = self._search_providers(query)
+
+        def call(fn):
+            return [] if cancel is not None and cancel.is_set() else fn()
+
+        futures = {_discovery_pool.submit(call, fn): name for name, fn in providers.items()}
+        done, not_done = wait(futures, timeout=max(timeout, 0))
+        for f in not_done:
+            f.cancel()
+
+        # Merge in provider order so ranking stays deterministic
+        by_provider = {futures[f]: f.result() for f in done if f.exception() is None}
+        merged, seen = [], set()
+        for name in providers:
+            for r in by_provider.get(name) or []:
+                url = r.get("url")
+                if url and url not in seen and not self.memory.has_source(url):
+                    seen.add(url)
+                    merged.append(r)
+        return rank_sources(merged)
+
+    def ingest_candidates(self, candidates: List[Dict], budget: float = None) -> List[Dict]:
+        """
+        Ingest the top INGEST_TOP_N candidates in parallel. Returns the sources
+        that finished within `budget` seconds, each also capped at
+        INGEST_TASK_TIMEOUT_SECONDS from submission; stragglers are cancelled
+        if not started yet, otherwise left to finish in the background.
+        """
+        budget = INGEST_BUDGET_SECONDS if budget is None else budget
+        deadline = time.monotonic() + max(budget, 0)
+        futures, expires = {}, {}
+        for c in candidates[:INGEST_TOP_N]:
+            f = _discovery_pool.submit(self._ingest_url, c)
+            futures[f] = c
+            expires[f] = min(time.monotonic() + INGEST_TASK_TIMEOUT_SECONDS, deadline)
+
+        ingested = []
+        pending = set(futures)
+        while pending:
+            now = time.monotonic()
+            for f in [f for f in pending if expires[f] <= now]:
+                pending.discard(f)
+                f.cancel()  # not started yet; a running one finishes in the background
+            if not pending:
+                break
+            done, pending = wait(pending, timeout=min(expires[f] for f in pending) - now, return_when=FIRST_COMPLETED)
+            for f in done:
+                try:
+                    info = f.result()
+                except Exception as e:
+                    logger.warning("Candidate ingestion failed: %s %s", futures[f].get("url"), e)
+                    continue
+                if info and info.get("type") != "none":
+                    ingested.append(info)
+
+        return ingested
 
     def _discover_and_ingest(self, query: str) -> Optional[Dict]:
-        results = web_search(query)
-        best = choose_best_source(results)
-
-        # If no best source or already ingested, try Google fallback
-        if not best or self.memory.has_source(best["url"]):
-            results = self._google_search_fallback(query)
-            best = choose_best_source(results)
-
-            if not best:
-                return {
-                    "url": None,
-                    "type": "none",
-                    "text": "I could not find relevant information. Consider uploading a PDF, link, or checking online."
-                }
-
-        return self._ingest_url(best)
+        started = time.monotonic()
+        candidates = self.discover_candidates(query, timeout=min(SEARCH_TIMEOUT_SECONDS, INGEST_BUDGET_SECONDS))
+        if not candidates:
+            return {"url": None, "type": "none", "text": NO_SOURCE_TEXT}
+
+        ingested = self.ingest_candidates(candidates, budget=INGEST_BUDGET_SECONDS - (time.monotonic() - started))
+        return self.combine_ingested(ingested)
+
+    @staticmethod
+    def combine_ingested(ingested: List[Dict]) -> Dict:
+        if not ingested:
+            return {"url": None, "type": "none", "text": NO_SOURCE_TEXT}
+        first = ingested[0]
+        return {
+            "url": first["url"],
+            "type": first["type"],
+            "text": first["text"],
+            "sources": [{"url": i["url"], "type": i["type"]} for i in ingested],
+        }
 
+    # ---------- Ingestion of one source ----------
     def _ingest_url(self, best: Dict) -> Optional[Dict]:
         url = best["url"]
-        title = best.get("title", "Source")
         if self.memory.has_source(url):
             return None
+        return self._ingest_source(url, best.get("title", "Source"))
 
+    def _ingest_source(self, url: str, title: Optional[str]) -> Dict:
         # PDF
         if url.lower().endswith(".pdf"):
-            txt = fetch_pdf_text(url)
-            if txt:
-                ingest_pdf_text([txt], pdf_name=url)
-                self.memory.register_source(url, "pdf", title)
-                return {"url": url, "type": "pdf", "text": txt}
+            pages = fetch_pdf_pages(url)
+            if pages is not None:
+                # Pages stream from the extractor straight into the chunker/embedder
+                try:
+                    txt = ingest_pdf_text(pages, pdf_name=url)
+                except Exception as e:  # corrupt or truncated PDF: try it as a web page below
+                    logger.warning("PDF extraction failed for %s: %s", url, e)
+                    txt = {}
+                if txt.get("pages_ingested"):
+                    self.memory.register_source(url, "pdf", title or "PDF Document")
+                    return {"url": url, "type": "pdf", "text": str(txt)}
 
         # YouTube
         if "youtube.com" in url or "youtu.be" in url:
-            txt = ingest_youtube(url)
-            if txt:
-                self.memory.register_source(url, "youtube", title)
+            txt = ingest_youtube(youtube_video_id(url))
+            if _ingested(txt):
+                self.memory.register_source(url, "youtube", title or "YouTube Video")
                 return {"url": url, "type": "youtube", "text": str(txt)}
 
         # Web page
         txt = ingest_web(url)
-        if txt:
-            self.memory.register_source(url, "web", title)
+        if _ingested(txt):
+            self.memory.register_source(url, "web", title or "Web Page")
             return {"url": url, "type": "web", "text": str(txt)}
 
-        return {
-            "url": url,
-            "type": "none",
-            "text": "I could not find relevant information. Consider uploading a PDF, link, or checking online."
-        }
-
-    def _google_search_fallback(self, query: str) -> List[Dict]:
-        if not SERPAPI_KEY:
-            return []
-        try:
-            from serpapi import GoogleSearch
-            params = {"q": query, "engine": "google", "num": 5, "api_key": SERPAPI_KEY}
-            search = GoogleSearch(params)
-            resp = search.get_dict()
-            results = []
-            for item in resp.get("organic_results", []):
-                results.append({
-                    "title": item.get("title"),
-                    "snippet": item.get("snippet", ""),
-                    "url": item.get("link")
-                })
-            return results
-        except Exception as e:
-            print("[ERROR] Google fallback search failed:", e)
-            return []
+        return {"url": url, "type": "none", "text": NO_SOURCE_TEXT}
@@ -1,49 +1,41 @@
-import uuid
-import requests
 from bs4 import BeautifulSoup
-from services.rag.vectorstore import get_vectorstore
+from services.rag.pipeline import IngestPipeline
+from services.rag.http_cache import cached_get
+from services.rag.chunker import iter_chunks
 
-vs = get_vectorstore()
-CHUNK_SIZE = 800  # max characters per chunk
+_HEADINGS = ["h1", "h2", "h3", "h4", "h5", "h6"]
 
-def ingest_web(url: str):
+
+def page_text(html: str) -> str:
     """
-    Ingest a web page into the vector store in character-based chunks.
-    Keeps each chunk around CHUNK_SIZE characters for embedding purposes.
+    Visible text of a page, one block per line; headings are marked with "#"
+    so the chunker starts a new chunk at each section.
     """
-    try:
-        html = requests.get(url, timeout=15).text
-    except Exception as e:
-        return {"status": "failed", "reason": str(e)}
-
     soup = BeautifulSoup(html, "html.parser")
-    text = soup.get_text(separator="\n")
-    lines = [line.strip() for line in text.split("\n") if len(line.strip()) >= 50]
-
-    buffer = ""
-    chunks_count = 0
-
-    for line in lines:
-        # Add line to buffer
-        if len(buffer) + len(line) + 1 <= CHUNK_SIZE:
-            buffer += " " + line
-        else:
-            # If buffer is full, add to vector store
-            vs.add_documents(
-                docs=[buffer.strip()],
-                ids=[str(uuid.uuid4())],
-                payloads=[{"source_type": "web", "url": url}]
-            )
-            chunks_count += 1
-            buffer = line  # start new buffer with current line
-
-    # Add any leftover text as final chunk
-    if buffer.strip():
-        vs.add_documents(
-            docs=[buffer.strip()],
-            ids=[str(uuid.uuid4())],
-            payloads=[{"source_type": "web", "url": url}]
-        )
-        chunks_count += 1
-
-    return {"status": "success", "chunks": chunks_count}
+    for tag in soup(["script", "style", "noscript"]):
+        tag.decompose()
+    for heading in soup.find_all(_HEADINGS):
+        marker = "#" * int(heading.name[1])
+        heading.replace_with(f"\n{marker} {heading.get_text(' ', strip=True)}\n")
+    return soup.get_text(separator="\n")
+
+
+def ingest_web(url: str, progress=None, html: str = None, pipeline=None):
+    """
+    Ingest a web page into the vector store using the shared chunker.
+    Chunks are embedded and upserted in batches by the shared IngestPipeline.
+    Pass `html` when the page has already been fetched (e.g. by the sync job).
+    """
+    if html is None:
+        try:
+            html = cached_get(url, timeout=15).text
+        except Exception as e:
+            return {"status": "failed", "reason": str(e)}
+
+    payload = {"source_type": "web", "url": url}
+
+    with (pipeline or IngestPipeline(progress=progress)) as pipe:
+        for chunk, _ in iter_chunks([page_text(html)]):
+            pipe.add(chunk, payload)
+
+    return {"status": "success", **pipe.stats()}
@@ -1,45 +1,36 @@
-import uuid
-from services.rag.vectorstore import get_vectorstore
+from services.rag.pipeline import IngestPipeline
+from services.rag.chunker import iter_chunks
 from youtube_transcript_api import YouTubeTranscriptApi, TranscriptsDisabled
 
-vs = get_vectorstore()
 
-def ingest_youtube(video_id: str, chunk_size: int = 800):
-    try:
-        transcript = YouTubeTranscriptApi.get_transcript(video_id)
-    except TranscriptsDisabled:
-        return {"status": "failed", "reason": "Transcripts disabled for this video"}
-    except Exception as e:
-        return {"status": "failed", "reason": str(e)}
+def fetch_transcript(video_id: str) -> list[dict]:
+    """
+    Transcript as [{"text", "start", "duration"}, ...].
+    youtube-transcript-api >= 1.0 replaced the static get_transcript with fetch().
+    """
+    if hasattr(YouTubeTranscriptApi, "get_transcript"):
+        return YouTubeTranscriptApi.get_transcript(video_id)
+    return YouTubeTranscriptApi().fetch(video_id).to_raw_data()
 
-    buffer = ""
-    chunks_count = 0
 
-    for line in transcript:
-        buffer += " " + line["text"]
-        if len(buffer) >= chunk_size:
-            vs.add_documents(
-                docs=[buffer.strip()],
-                ids=[str(uuid.uuid4())],
-                payloads=[{
-                    "source_type": "youtube",
-                    "video_id": video_id,
-                    "timestamp": line["start"]
-                }]
-            )
-            chunks_count += 1
-            buffer = ""
+def ingest_youtube(video_id: str, chunk_size: int = None, progress=None, transcript=None, pipeline=None):
+    if transcript is None:
+        try:
+            transcript = fetch_transcript(video_id)
+        except TranscriptsDisabled:
+            return {"status": "failed", "reason": "Transcripts disabled for this video"}
+        except Exception as e:
+            return {"status": "failed", "reason": str(e)}
 
-    if buffer.strip():  # leftover text
-        vs.add_documents(
-            docs=[buffer.strip()],
-            ids=[str(uuid.uuid4())],
-            payloads=[{
+    # Each chunk is stamped with the start time of its first transcript line
+    segments = ((line["text"], {"timestamp": line["start"]}) for line in transcript)
+
+    with (pipeline or IngestPipeline(progress=progress)) as pipe:
+        for chunk, meta in iter_chunks(segments, size=chunk_size):
+            pipe.add(chunk, {
                 "source_type": "youtube",
                 "video_id": video_id,
-                "timestamp": transcript[-1]["start"]
-            }]
-        )
-        chunks_count += 1
+                "timestamp": meta["timestamp"]
+            })
 
-    return {"status": "success", "chunks": chunks_count}
+    return {"status": "success", **pipe.stats()}
@@ -0,0 +1,219 @@
+# services/rag/jobs.py
+"""
+Background ingestion job queue.
+- Jobs persisted in SQLite so queued/running work survives restarts
+- Bounded worker pool plus per-source-type concurrency limits
+- Progress (chunks embedded, bytes processed) and errors recorded per job
+"""
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+from services.rag.container import get_container
+
+RAG_JOBS_DB = os.getenv("RAG_JOBS_DB", "data/rag_jobs.sqlite3")
+RAG_JOBS_DIR = os.getenv("RAG_JOBS_DIR", "data/jobs")  # spooled uploads waiting for a worker
+RAG_JOB_WORKERS = int(os.getenv("RAG_JOB_WORKERS", "4"))
+RAG_JOB_LIMITS = os.getenv("RAG_JOB_LIMITS", "pdf=1,web=4,youtube=2")  # per source type
+
+
+def _parse_limits(spec: str) -> Dict[str, int]:
+    limits = {}
+    for part in (spec or "").split(","):
+        if "=" in part:
+            name, value = part.split("=", 1)
+            limits[name.strip()] = int(value)
+    return limits
+
+
+class JobQueue:
+    def __init__(self, db_path: str = None, workers: int = None, limits: Dict[str, int] = None):
+        self.db_path = db_path or RAG_JOBS_DB
+        self.workers = workers or RAG_JOB_WORKERS
+        self.limits = limits if limits is not None else _parse_limits(RAG_JOB_LIMITS)
+        self.handlers: Dict[str, Callable] = {}
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                source_type TEXT NOT NULL,
+                params TEXT NOT NULL,
+                status TEXT NOT NULL,
+                chunks_embedded INTEGER DEFAULT 0,
+                bytes_processed INTEGER DEFAULT 0,
+                result TEXT,
+                error TEXT,
+                created_at REAL,
+                updated_at REAL
+            )
+        """)
+        self._db.commit()
+
+        self._lock = threading.RLock()
+        self._pending: Dict[str, deque] = {}
+        self._running: Dict[str, int] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    # ---------- Setup ----------
+    def register_handler(self, source_type: str, handler: Callable):
+        """
+        handler(params: dict, progress: callable(chunks, bytes)) -> dict
+        """
+        self.handlers[source_type] = handler
+
+    def start(self):
+        """
+        Start workers and re-queue anything left queued/running by a previous process.
+        """
+        with self._lock:
+            if self._executor is not None:
+                return
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="rag-job")
+            rows = self._db.execute(
+                "SELECT id, source_type FROM jobs WHERE status IN ('queued', 'running') ORDER BY created_at"
+            ).fetchall()
+            for job_id, source_type in rows:
+                self._update(job_id, status="queued")
+                self._pending.setdefault(source_type, deque()).append(job_id)
+            self._dispatch()
+
+    def shutdown(self, wait: bool = False):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+    # ---------- Public API ----------
+    def submit(self, source_type: str, params: Dict) -> str:
+        if source_type not in self.handlers:
+            raise ValueError(f"No ingestion handler for source type '{source_type}'")
+
+        self.start()  # recover older jobs first so this one is not queued twice
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, source_type, params, status, created_at, updated_at) VALUES (?, ?, ?, 'queued', ?, ?)",
+                (job_id, source_type, json.dumps(params), now, now),
+            )
+            self._db.commit()
+            self._pending.setdefault(source_type, deque()).append(job_id)
+            self._dispatch()
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, source_type, params, status, chunks_embedded, bytes_processed, result, error, created_at, updated_at "
+                "FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if not row:
+            return None
+        return {
+            "id": row[0],
+            "source_type": row[1],
+            "params": json.loads(row[2]),
+            "status": row[3],
+            "chunks_embedded": row[4],
+            "bytes_processed": row[5],
+            "result": json.loads(row[6]) if row[6] else None,
+            "error": row[7],
+            "created_at": row[8],
+            "updated_at": row[9],
+        }
+
+    # ---------- Internals ----------
+    def _update(self, job_id: str, **fields):
+        fields["updated_at"] = time.time()
+        cols = ", ".join(f"{k} = ?" for k in fields)
+        with self._lock:
+            self._db.execute(f"UPDATE jobs SET {cols} WHERE id = ?", (*fields.values(), job_id))
+            self._db.commit()
+
+    def _add_progress(self, job_id: str, chunks: int, nbytes: int):
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET chunks_embedded = chunks_embedded + ?, bytes_processed = bytes_processed + ?, updated_at = ? WHERE id = ?",
+                (chunks, nbytes, time.time(), job_id),
+            )
+            self._db.commit()
+
+    def _dispatch(self):
+        # Caller holds self._lock
+        if self._executor is None:
+            return
+        while sum(self._running.values()) < self.workers:
+            started = False
+            for source_type, queue in self._pending.items():
+                limit = self.limits.get(source_type, self.workers)
+                if queue and self._running.get(source_type, 0) < limit:
+                    job_id = queue.popleft()
+                    self._running[source_type] = self._running.get(source_type, 0) + 1
+                    self._executor.submit(self._run, job_id, source_type)
+                    started = True
+                    break
+            if not started:
+                return
+
+    def _run(self, job_id: str, source_type: str):
+        try:
+            job = self.get(job_id)
+            self._update(job_id, status="running", chunks_embedded=0, bytes_processed=0, error=None)
+            progress = lambda chunks, nbytes: self._add_progress(job_id, chunks, nbytes)
+            result = self.handlers[source_type](job["params"], progress) or {}
+            if result.get("status") == "failed":
+                self._update(job_id, status="failed", error=result.get("reason", "ingestion failed"))
+            else:
+                self._update(job_id, status="done", result=json.dumps(result, default=str))
+        except Exception as e:
+            self._update(job_id, status="failed", error=str(e))
+        finally:
+            with self._lock:
+                self._running[source_type] -= 1
+                self._dispatch()
+
+
+# ---------- Default ingestion handlers ----------
+def _handle_web(params: Dict, progress) -> Dict:
+    from services.rag.ingest_web import ingest_web
+    return ingest_web(params["url"], progress=progress)
+
+
+def _handle_youtube(params: Dict, progress) -> Dict:
+    from services.rag.ingest_youtube import ingest_youtube
+    return ingest_youtube(params["video_id"], progress=progress)
+
+
+def _handle_pdf(params: Dict, progress) -> Dict:
+    from services.rag.pdf_extract import iter_pdf_pages
+    from services.rag.ingest import ingest_pdf_text
+
+    path = params["path"]
+    try:
+        # Pages are extracted in parallel and streamed into the pipeline
+        return ingest_pdf_text(iter_pdf_pages(path), pdf_name=params["pdf_name"], progress=progress)
+    finally:
+        # Spooled upload is only needed until the job finishes
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def build_job_queue() -> JobQueue:
+    queue = JobQueue()
+    queue.register_handler("web", _handle_web)
+    queue.register_handler("youtube", _handle_youtube)
+    queue.register_handler("pdf", _handle_pdf)
+    return queue
+
+
+def get_job_queue() -> JobQueue:
+    return get_container().job_queue
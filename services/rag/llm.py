@@ -1,20 +1,67 @@
-import os
-from groq import Groq
+from services.rag.clients import get_groq, get_async_groq
+from services.rag.metrics import external_call, observe_payload
+
+GROQ_MODEL = "groq/compound"  # ensure this is valid
+
 
 def groq_llm(prompt: str, temperature: float = 0.1):
-    key = os.getenv("GROQ_API_KEY")
-    if not key:
-        raise ValueError("GROQ_API_KEY missing")
-    
-    client = Groq(api_key=key)
-    model_name = "groq/compound"  # ensure this is valid
+    client = get_groq()
+
+    try:
+        with external_call("groq", "completion", len(prompt.encode("utf-8"))):
+            resp = client.chat.completions.create(
+                model=GROQ_MODEL,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=temperature,
+            )
+        return _content(resp)
+    except Exception as e:
+        raise RuntimeError(f"Groq API call failed: {e}")
+
+
+def _content(resp) -> str:
+    content = resp.choices[0].message.content
+    observe_payload("groq", "response", len((content or "").encode("utf-8")))
+    return content
+
+
+async def agroq_llm(prompt: str, temperature: float = 0.1):
+    client = get_async_groq()
+
+    try:
+        with external_call("groq", "completion", len(prompt.encode("utf-8"))):
+            resp = await client.chat.completions.create(
+                model=GROQ_MODEL,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=temperature,
+            )
+        return _content(resp)
+    except Exception as e:
+        raise RuntimeError(f"Groq API call failed: {e}")
+
+
+async def agroq_llm_stream(prompt: str, temperature: float = 0.1):
+    """
+    Yields completion text deltas as Groq produces them.
+    """
+    client = get_async_groq()
 
     try:
-        resp = client.chat.completions.create(
-            model=model_name,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=temperature,
-        )
-        return resp.choices[0].message.content
+        size = 0
+        with external_call("groq", "stream", len(prompt.encode("utf-8"))):
+            stream = await client.chat.completions.create(
+                model=GROQ_MODEL,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=temperature,
+                stream=True,
+            )
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    size += len(delta.encode("utf-8"))
+                    yield delta
+        observe_payload("groq", "response", size)
     except Exception as e:
         raise RuntimeError(f"Groq API call failed: {e}")
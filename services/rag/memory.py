@@ -1,51 +1,318 @@
 # services/rag/memory.py
+"""
+Agent memory: known sources, topic -> source urls, and summaries.
+- One row per (kind, key) instead of a single JSON blob
+- Reads served from a local index loaded once at startup
+- Writes buffered and coalesced, flushed in the background every MEMORY_FLUSH_INTERVAL seconds
+- Optimistic concurrency: each row carries a version; conflicting writers re-read and merge
+- Storage is Supabase by default, or SQLite (MEMORY_BACKEND=sqlite) for tests/local runs
+"""
+
 import os
-from typing import List, Optional, Dict
-from supabase import create_client, Client
+import json
+import atexit
+import logging
+import sqlite3
+import threading
+from typing import List, Optional, Dict, Tuple
+from services.rag.clients import get_supabase
+from services.rag.metrics import instrumented
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+MEMORY_BACKEND = os.getenv("MEMORY_BACKEND", "supabase").lower()
+MEMORY_SQLITE_PATH = os.getenv("MEMORY_SQLITE_PATH", "data/memory.sqlite3")
+MEMORY_FLUSH_INTERVAL = float(os.getenv("MEMORY_FLUSH_INTERVAL", "2"))  # seconds
 
-TABLE_NAME = "memory_state"  # your Supabase table with jsonb column
+TABLE_NAME = "memory_state"  # legacy Supabase table with a single jsonb blob (migrated on first load)
+ITEMS_TABLE = os.getenv("MEMORY_ITEMS_TABLE", "memory_items")  # kind text, key text, value jsonb, version int
 
-class MemoryManager:
-    def __init__(self):
-        self.data: Dict = self._load()
+KIND_SOURCE = "source"
+KIND_TOPIC = "topic"
+KIND_SUMMARY = "summary"
+_BLOB_SECTIONS = {KIND_SOURCE: "sources", KIND_TOPIC: "topics", KIND_SUMMARY: "summaries"}
+
+MAX_CONFLICT_RETRIES = 5
+
+logger = logging.getLogger(__name__)
+
+
+# ---------- Storage backends ----------
+class SupabaseMemoryStore:
+    """
+    Expects: create table memory_items (kind text, key text, value jsonb, version int,
+             primary key (kind, key));
+    """
+
+    def __init__(self, table: str = None):
+        self.table = table or ITEMS_TABLE
+
+    @instrumented("supabase", "load_all")
+    def load_all(self) -> List[Tuple[str, str, object, int]]:
+        rows, start, page = [], 0, 1000
+        while True:
+            res = get_supabase().table(self.table).select("kind,key,value,version").range(start, start + page - 1).execute()
+            batch = res.data or []
+            rows.extend((r["kind"], r["key"], r["value"], r["version"]) for r in batch)
+            if len(batch) < page:
+                return rows
+            start += page
+
+    @instrumented("supabase", "get")
+    def get(self, kind: str, key: str) -> Optional[Tuple[object, int]]:
+        res = get_supabase().table(self.table).select("value,version").eq("kind", kind).eq("key", key).execute()
+        if not res.data:
+            return None
+        return res.data[0]["value"], res.data[0]["version"]
+
+    @instrumented("supabase", "insert")
+    def insert(self, kind: str, key: str, value) -> bool:
+        try:
+            get_supabase().table(self.table).insert({"kind": kind, "key": key, "value": value, "version": 1}).execute()
+            return True
+        except Exception as e:
+            if "duplicate" in str(e).lower() or "23505" in str(e):
+                return False  # someone else created it first
+            raise
+
+    @instrumented("supabase", "update")
+    def update(self, kind: str, key: str, value, expected_version: int) -> bool:
+        res = (
+            get_supabase().table(self.table)
+            .update({"value": value, "version": expected_version + 1})
+            .eq("kind", kind).eq("key", key).eq("version", expected_version)
+            .execute()
+        )
+        return bool(res.data)
 
-    def _load(self) -> Dict:
-        res = supabase.table(TABLE_NAME).select("data").execute()
+    @instrumented("supabase", "load_legacy")
+    def load_legacy(self) -> Optional[Dict]:
+        res = get_supabase().table(TABLE_NAME).select("data").execute()
         if res.data and len(res.data) > 0:
             return res.data[0]["data"]
-        else:
-            # Initialize if empty
-            return {"sources": {}, "topics": {}, "summaries": {}}
+        return None
+
+
+class SQLiteMemoryStore:
+    """
+    Local stand-in with the same row layout as the Supabase store.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or MEMORY_SQLITE_PATH
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS memory_items (
+                kind TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                PRIMARY KEY (kind, key)
+            )
+        """)
+        self._db.commit()
+
+    def load_all(self):
+        with self._lock:
+            rows = self._db.execute("SELECT kind, key, value, version FROM memory_items").fetchall()
+        return [(k, key, json.loads(v), ver) for k, key, v, ver in rows]
+
+    def get(self, kind: str, key: str):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value, version FROM memory_items WHERE kind = ? AND key = ?", (kind, key)
+            ).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def insert(self, kind: str, key: str, value) -> bool:
+        with self._lock:
+            cur = self._db.execute(
+                "INSERT OR IGNORE INTO memory_items (kind, key, value, version) VALUES (?, ?, ?, 1)",
+                (kind, key, json.dumps(value)),
+            )
+            self._db.commit()
+            return cur.rowcount == 1
+
+    def update(self, kind: str, key: str, value, expected_version: int) -> bool:
+        with self._lock:
+            cur = self._db.execute(
+                "UPDATE memory_items SET value = ?, version = ? WHERE kind = ? AND key = ? AND version = ?",
+                (json.dumps(value), expected_version + 1, kind, key, expected_version),
+            )
+            self._db.commit()
+            return cur.rowcount == 1
+
+    def load_legacy(self):
+        return None
+
+
+def get_memory_store():
+    if MEMORY_BACKEND == "sqlite":
+        return SQLiteMemoryStore()
+    if MEMORY_BACKEND == "supabase":
+        return SupabaseMemoryStore()
+    raise ValueError(f"Unknown MEMORY_BACKEND '{MEMORY_BACKEND}'")
+
+
+# ---------- Manager ----------
+class MemoryManager:
+    def __init__(self, store=None, flush_interval: float = None):
+        self.store = store or get_memory_store()
+        self.flush_interval = MEMORY_FLUSH_INTERVAL if flush_interval is None else flush_interval
+
+        self._lock = threading.RLock()
+        self._index: Dict[str, Dict[str, object]] = {kind: {} for kind in _BLOB_SECTIONS}
+        self._versions: Dict[Tuple[str, str], int] = {}
+        # (kind, key) -> ("set", value) | ("add", [urls]); later writes to the same key coalesce
+        self._pending: Dict[Tuple[str, str], Tuple[str, object]] = {}
+        self._flusher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+        self._load()
+        atexit.register(self.close)
+
+    def _load(self):
+        rows = self.store.load_all()
+        if not rows:
+            legacy = self.store.load_legacy()
+            if legacy:
+                self._import_legacy(legacy)
+                return
+
+        for kind, key, value, version in rows:
+            if kind in self._index:
+                self._index[kind][key] = value
+                self._versions[(kind, key)] = version
+
+    def _import_legacy(self, blob: Dict):
+        # One-time migration from the old single-row memory_state document
+        for kind, section in _BLOB_SECTIONS.items():
+            for key, value in (blob.get(section) or {}).items():
+                self._index[kind][key] = value
+                self._pending[(kind, key)] = ("set", value)
+        self.flush()
+
+    # ---------- Compatibility view ----------
+    @property
+    def data(self) -> Dict:
+        with self._lock:
+            return {section: dict(self._index[kind]) for kind, section in _BLOB_SECTIONS.items()}
 
     def save(self):
-        # Upsert the single row (id=1)
-        supabase.table(TABLE_NAME).upsert({"id": 1, "data": self.data}).execute()
+        self.flush()
 
+    # ---------- Sources ----------
     def has_source(self, url: str) -> bool:
-        return url in self.data.get("sources", {})
+        return url in self._index[KIND_SOURCE]
 
     def register_source(self, url: str, source_type: str, title: Optional[str]):
-        if url not in self.data["sources"]:
-            self.data["sources"][url] = {"type": source_type, "title": title or ""}
-            self.save()
+        with self._lock:
+            if url in self._index[KIND_SOURCE]:
+                return
+            value = {"type": source_type, "title": title or ""}
+            self._index[KIND_SOURCE][url] = value
+            self._enqueue(KIND_SOURCE, url, "set", value)
 
+    # ---------- Topics ----------
     def add_topic_source(self, topic: str, url: str):
-        if topic not in self.data["topics"]:
-            self.data["topics"][topic] = []
-        if url not in self.data["topics"][topic]:
-            self.data["topics"][topic].append(url)
-            self.save()
+        with self._lock:
+            urls = self._index[KIND_TOPIC].setdefault(topic, [])
+            if url in urls:
+                return
+            urls.append(url)
+            op = self._pending.get((KIND_TOPIC, topic))
+            added = (op[1] if op and op[0] == "add" else []) + [url]
+            self._enqueue(KIND_TOPIC, topic, "add", added)
 
     def get_topic_sources(self, topic: str) -> List[str]:
-        return self.data.get("topics", {}).get(topic, [])
+        return list(self._index[KIND_TOPIC].get(topic, []))
 
+    # ---------- Summaries ----------
     def save_summary(self, url: str, summary: str):
-        self.data["summaries"][url] = summary
-        self.save()
+        with self._lock:
+            self._index[KIND_SUMMARY][url] = summary
+            self._enqueue(KIND_SUMMARY, url, "set", summary)
 
     def get_summary(self, url: str) -> Optional[str]:
-        return self.data.get("summaries", {}).get(url)
+        return self._index[KIND_SUMMARY].get(url)
+
+    # ---------- Write-behind ----------
+    def _enqueue(self, kind: str, key: str, op: str, value):
+        self._pending[(kind, key)] = (op, value)
+        if self.flush_interval <= 0 or self._stop.is_set():
+            self.flush()  # no background flusher (disabled, or stopped by close())
+        elif self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_loop, name="memory-flush", daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning("Memory flush failed: %s", e)
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        failed = {}
+        for (kind, key), (op, value) in pending.items():
+            try:
+                self._write(kind, key, op, value)
+            except Exception as e:
+                logger.warning("Memory write for %s:%s failed: %s", kind, key, e)
+                failed[(kind, key)] = (op, value)
+
+        if failed:
+            with self._lock:
+                # Keep failed writes for the next flush unless newer ones replaced them
+                for k, v in failed.items():
+                    self._pending.setdefault(k, v)
+
+    def _write(self, kind: str, key: str, op: str, value):
+        version = self._versions.get((kind, key))
+        current = None
+
+        for _ in range(MAX_CONFLICT_RETRIES):
+            if version is None:
+                merged = list(value) if op == "add" else value
+                if self.store.insert(kind, key, merged):
+                    self._commit(kind, key, merged, 1)
+                    return
+            else:
+                merged = self._merge(op, current if current is not None else self._index[kind].get(key), value)
+                if self.store.update(kind, key, merged, version):
+                    self._commit(kind, key, merged, version + 1)
+                    return
+
+            # Lost a race with another writer: re-read the row and merge on top of it
+            row = self.store.get(kind, key)
+            current, version = row if row else (None, None)
+
+        raise RuntimeError(f"too many write conflicts on {kind}:{key}")
+
+    @staticmethod
+    def _merge(op: str, current, value):
+        if op == "add":
+            merged = list(current or [])
+            merged.extend(u for u in value if u not in merged)
+            return merged
+        return value
+
+    def _commit(self, kind: str, key: str, value, version: int):
+        with self._lock:
+            self._versions[(kind, key)] = version
+            if kind == KIND_TOPIC:
+                # Keep urls added locally since this write was queued
+                local = self._index[kind].get(key, [])
+                value = value + [u for u in local if u not in value]
+            self._index[kind][key] = value
+
+    def close(self):
+        self._stop.set()
+        try:
+            self.flush()
+        except Exception as e:
+            logger.warning("Memory flush on shutdown failed: %s", e)
@@ -0,0 +1,136 @@
+# services/rag/metrics.py
+"""
+Prometheus instrumentation.
+- rag_step_seconds{step}: every AgenticRAGGraph step
+- rag_external_call_seconds{service,operation}: embedding, Qdrant, Groq, Supabase,
+  SerpAPI and page fetches; failures counted in rag_external_call_errors_total
+- rag_payload_bytes{service,operation}: request/response sizes of those calls
+- rag_cache_*{cache}: hit/miss counters and hit ratio of the live caches, read at scrape time
+- rag_queries_total{intent,cached,ingested,degraded}
+Exposed by main.py at GET /metrics.
+"""
+
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, Optional
+from prometheus_client import Counter, Histogram, CONTENT_TYPE_LATEST, REGISTRY, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40)
+_SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+STEP_SECONDS = Histogram(
+    "rag_step_seconds", "Duration of agentic RAG graph steps", ["step"], buckets=_LATENCY_BUCKETS,
+)
+EXTERNAL_SECONDS = Histogram(
+    "rag_external_call_seconds", "Duration of calls to external services", ["service", "operation"],
+    buckets=_LATENCY_BUCKETS,
+)
+EXTERNAL_ERRORS = Counter(
+    "rag_external_call_errors_total", "Failed calls to external services", ["service", "operation"],
+)
+PAYLOAD_BYTES = Histogram(
+    "rag_payload_bytes", "Payload sizes sent to / received from external services", ["service", "operation"],
+    buckets=_SIZE_BUCKETS,
+)
+QUERIES = Counter(
+    "rag_queries_total", "Answered queries", ["intent", "cached", "ingested", "degraded"],
+)
+
+
+@contextmanager
+def external_call(service: str, operation: str, payload_bytes: Optional[int] = None):
+    """
+    with external_call("qdrant", "search"): ...
+    """
+    if payload_bytes is not None:
+        PAYLOAD_BYTES.labels(service, operation).observe(payload_bytes)
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        EXTERNAL_ERRORS.labels(service, operation).inc()
+        raise
+    finally:
+        EXTERNAL_SECONDS.labels(service, operation).observe(time.perf_counter() - started)
+
+
+def instrumented(service: str, operation: str):
+    """
+    Decorator form of external_call for plain functions.
+    """
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with external_call(service, operation):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def observe_payload(service: str, operation: str, size: int):
+    PAYLOAD_BYTES.labels(service, operation).observe(size)
+
+
+@contextmanager
+def step_timer(step: str, timings: Optional[Dict[str, float]] = None):
+    """
+    Records the step histogram and, when given, adds milliseconds to `timings`
+    (the per-request breakdown returned in meta).
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STEP_SECONDS.labels(step).observe(elapsed)
+        if timings is not None:
+            timings[step] = round(timings.get(step, 0.0) + elapsed * 1000, 2)
+
+
+def count_query(intent: str, cached: bool, ingested: bool, degraded: bool):
+    QUERIES.labels(intent or "unknown", str(bool(cached)).lower(), str(bool(ingested)).lower(),
+                   str(bool(degraded)).lower()).inc()
+
+
+class CacheCollector:
+    """
+    Reads stats() of the caches the container has built; nothing is created at scrape time.
+    """
+
+    def collect(self):
+        from services.rag.container import get_container
+
+        instances = get_container()._instances
+        caches = {}
+        if "vectorstore" in instances:
+            caches["embedding"] = instances["vectorstore"].query_cache
+        for name in ("answer_cache", "http_cache", "search_cache"):
+            if name in instances:
+                caches[name.replace("_cache", "")] = instances[name]
+
+        hits = CounterMetricFamily("rag_cache_hits", "Cache hits", labels=["cache"])
+        misses = CounterMetricFamily("rag_cache_misses", "Cache misses", labels=["cache"])
+        ratio = GaugeMetricFamily("rag_cache_hit_ratio", "Cache hit ratio since start", labels=["cache"])
+        entries = GaugeMetricFamily("rag_cache_entries", "Entries held by the cache", labels=["cache"])
+        for name, cache in caches.items():
+            try:
+                stats = cache.stats()
+            except Exception:
+                continue
+            hits.add_metric([name], stats.get("hits", 0))
+            misses.add_metric([name], stats.get("misses", 0))
+            ratio.add_metric([name], stats.get("hit_ratio", 0.0))
+            entries.add_metric([name], stats.get("entries", 0))
+        yield from (hits, misses, ratio, entries)
+
+
+REGISTRY.register(CacheCollector())
+
+
+def render_latest():
+    """
+    (body, content type) for the /metrics endpoint.
+    """
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
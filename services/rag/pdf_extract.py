@@ -0,0 +1,150 @@
+# services/rag/pdf_extract.py
+"""
+Streaming, parallel PDF text extraction.
+- Uploads and downloads are spooled to disk in PDF_SPOOL_CHUNK pieces, never held in memory
+- Workers memory-map the spooled file and extract page ranges in a process pool
+- Pages are yielded in order as ranges finish, with a bounded number of ranges in flight,
+  so the chunker/embedder start before the last page is extracted
+- Spooled files are deleted once extraction finishes (or fails)
+"""
+
+import os
+import mmap
+import multiprocessing
+import uuid
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, List, Optional
+from services.rag.http_cache import cached_get
+
+PDF_SPOOL_DIR = os.getenv("PDF_SPOOL_DIR", "data/spool")
+PDF_SPOOL_CHUNK = int(os.getenv("PDF_SPOOL_CHUNK", str(1024 * 1024)))        # bytes per read/write
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(os.cpu_count() or 2)))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "16"))              # pages per worker task
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # Not fork: the server process is full of threads and locks a forked child could inherit held
+                _pool = ProcessPoolExecutor(max_workers=PDF_EXTRACT_WORKERS, mp_context=multiprocessing.get_context("forkserver"))
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+# ---------- Spooling ----------
+def spool(chunks: Iterable[bytes], directory: str = None, suffix: str = ".pdf") -> str:
+    """
+    Write a byte stream to a new file in the spool directory and return its path.
+    """
+    directory = directory or PDF_SPOOL_DIR
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{uuid.uuid4().hex}{suffix}")
+    try:
+        with open(path, "wb") as out:
+            for chunk in chunks:
+                out.write(chunk)
+    except BaseException:
+        _remove(path)
+        raise
+    return path
+
+
+def download_pdf(url: str, timeout: int = 15) -> Optional[str]:
+    """
+    Stream a remote PDF into the spool directory. Returns None if the
+    response is not a PDF.
+    """
+    with cached_get(url, timeout=timeout, stream=True) as resp:
+        resp.raise_for_status()
+        content_type = resp.headers.get("Content-Type", "")
+        if "pdf" not in content_type and not url.lower().endswith(".pdf"):
+            return None
+        return spool(resp.iter_content(chunk_size=PDF_SPOOL_CHUNK))
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+# ---------- Extraction ----------
+def _extract_range(path: str, start: int, stop: int) -> List[str]:
+    # Runs in a worker process: map the file instead of reading it into memory
+    import fitz  # PyMuPDF
+
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        view = memoryview(mm)
+        try:
+            with fitz.open(stream=view, filetype="pdf") as doc:
+                return [doc[i].get_text() for i in range(start, min(stop, doc.page_count))]
+        finally:
+            view.release()
+
+
+def page_count(path: str) -> int:
+    import fitz
+
+    with fitz.open(path) as doc:
+        return doc.page_count
+
+
+def iter_pdf_pages(path: str, workers: int = None, pages_per_task: int = None, cleanup: bool = False) -> Iterator[str]:
+    """
+    Yield the text of every page of the PDF at `path`, in page order.
+    Small documents are extracted inline; larger ones are split into page
+    ranges processed in parallel. With cleanup=True the file is deleted at the end.
+    """
+    workers = workers or PDF_EXTRACT_WORKERS
+    pages_per_task = pages_per_task or PDF_PAGES_PER_TASK
+    in_flight = []
+    try:
+        total = page_count(path)
+        if total <= pages_per_task or workers <= 1:
+            for start in range(0, total, pages_per_task):
+                yield from _extract_range(path, start, start + pages_per_task)
+            return
+
+        pool = _get_pool()
+        ranges = iter(range(0, total, pages_per_task))
+        # Keep at most 2x workers ranges pending so memory stays bounded
+        for start in ranges:
+            in_flight.append(pool.submit(_extract_range, path, start, start + pages_per_task))
+            if len(in_flight) >= workers * 2:
+                break
+        while in_flight:
+            pages = in_flight.pop(0).result()
+            start = next(ranges, None)
+            if start is not None:
+                in_flight.append(pool.submit(_extract_range, path, start, start + pages_per_task))
+            yield from pages
+    finally:
+        for future in in_flight:
+            future.cancel()  # consumer stopped early
+        if cleanup:
+            _remove(path)
+
+
+def iter_remote_pdf_pages(url: str, timeout: int = 15) -> Optional[Iterator[str]]:
+    """
+    Download a PDF to the spool and stream its pages; the file is removed
+    when iteration finishes. Returns None if the url is not a PDF.
+    """
+    path = download_pdf(url, timeout=timeout)
+    if path is None:
+        return None
+    return iter_pdf_pages(path, cleanup=True)
@@ -0,0 +1,138 @@
+# services/rag/pipeline.py
+"""
+Shared ingestion pipeline.
+- Collects chunks from any source (web, youtube, pdf, manual text)
+- Groups them into batches bounded by chunk count and byte size
+- One embed_documents call + one bulk upsert per batch
+- Deterministic content-hash chunk ids; chunks already stored are skipped before embedding
+- Records per-batch timings
+"""
+
+import os
+import time
+import uuid
+import xxhash
+from typing import Dict, List, Optional
+from services.rag.vectorstore import get_vectorstore
+from services.rag.utils import source_keys
+
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "64"))          # max chunks per batch
+INGEST_BATCH_BYTES = int(os.getenv("INGEST_BATCH_BYTES", str(256 * 1024)))  # max utf-8 bytes per batch
+INGEST_WAIT = os.getenv("INGEST_WAIT", "true").lower() in ("1", "true", "yes")
+
+
+def chunk_id(text: str, payload: Optional[Dict] = None) -> str:
+    """
+    Stable point id for a chunk: xxh3-128 of the source identity + whitespace-normalized text.
+    The same chunk from the same source always maps to the same Qdrant point.
+    """
+    identity = "|".join(sorted(source_keys(payload)))
+    normalized = " ".join((text or "").split())
+    digest = xxhash.xxh3_128_digest(f"{identity}\x00{normalized}".encode("utf-8"))
+    return str(uuid.UUID(bytes=digest))
+
+
+class IngestPipeline:
+    """
+    Usage:
+        with IngestPipeline() as pipe:
+            for chunk in chunks:
+                pipe.add(chunk, {"source_type": "web", "url": url})
+        pipe.stats()
+    """
+
+    def __init__(self, batch_size: int = None, batch_bytes: int = None,
+                 wait: bool = None, vectorstore=None, progress=None):
+        self.batch_size = batch_size or INGEST_BATCH_SIZE
+        self.batch_bytes = batch_bytes or INGEST_BATCH_BYTES
+        self.wait = INGEST_WAIT if wait is None else wait
+        self.vs = vectorstore or get_vectorstore()
+        self.progress = progress  # optional callback(chunks, bytes) after each batch
+
+        self._docs: List[str] = []
+        self._ids: List[str] = []
+        self._payloads: List[Dict] = []
+        self._bytes = 0
+
+        self.chunks = 0
+        self.bytes = 0
+        self.skipped = 0
+        self.ids: List[str] = []  # every chunk id seen, stored or skipped
+        self.batch_timings: List[Dict] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Only flush on a clean exit; a failed source should not leave half a batch behind
+        if exc_type is None:
+            self.flush()
+
+    def add(self, text: str, payload: Optional[Dict] = None, point_id: Optional[str] = None):
+        text = (text or "").strip()
+        if not text:
+            return
+
+        size = len(text.encode("utf-8"))
+        if self._docs and (len(self._docs) >= self.batch_size or self._bytes + size > self.batch_bytes):
+            self.flush()
+
+        meta = dict(payload or {})
+        meta["text"] = text  # always store the text so retrieval never returns empty payloads
+        point_id = point_id or chunk_id(text, meta)
+
+        self.ids.append(point_id)
+        if point_id in self._ids:
+            self.skipped += 1  # duplicate within the current batch
+            return
+
+        self._docs.append(text)
+        self._ids.append(point_id)
+        self._payloads.append(meta)
+        self._bytes += size
+
+    def flush(self):
+        if not self._docs:
+            return
+
+        start = time.perf_counter()
+        existing = self.vs.existing_ids(self._ids)
+        rows = [(d, i, p) for d, i, p in zip(self._docs, self._ids, self._payloads) if i not in existing]
+        checked = time.perf_counter()
+
+        docs = [r[0] for r in rows]
+        nbytes = sum(len(d.encode("utf-8")) for d in docs)
+        if rows:
+            vectors = self.vs.embed_documents(docs)
+            embedded = time.perf_counter()
+            self.vs.upsert_vectors([r[1] for r in rows], vectors, [r[2] for r in rows], wait=self.wait)
+        else:
+            embedded = checked
+        done = time.perf_counter()
+
+        self.batch_timings.append({
+            "chunks": len(rows),
+            "skipped": len(self._docs) - len(rows),
+            "bytes": nbytes,
+            "dedup_ms": round((checked - start) * 1000, 2),
+            "embed_ms": round((embedded - checked) * 1000, 2),
+            "upsert_ms": round((done - embedded) * 1000, 2),
+            "total_ms": round((done - start) * 1000, 2),
+        })
+        self.chunks += len(rows)
+        self.skipped += len(self._docs) - len(rows)
+        self.bytes += nbytes
+        if self.progress and rows:
+            self.progress(len(rows), nbytes)
+
+        self._docs, self._ids, self._payloads = [], [], []
+        self._bytes = 0
+
+    def stats(self) -> Dict:
+        return {
+            "chunks": self.chunks,
+            "skipped": self.skipped,
+            "bytes": self.bytes,
+            "batches": len(self.batch_timings),
+            "batch_timings": self.batch_timings,
+        }
@@ -0,0 +1,105 @@
+# services/rag/search_cache.py
+"""
+Search result cache for the search tools (web_search, youtube_search).
+- Keyed by provider, normalized query and limit
+- TTL + LRU size bound
+- Concurrent lookups of the same key share one in-flight provider call
+- Empty results and provider-outage placeholders ("placeholder": True) are not cached
+- Hit / miss / coalesced counters for metrics
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from functools import wraps
+from typing import Callable, Dict, List, Tuple
+from services.rag.container import get_container
+
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "3600"))  # seconds
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "2048"))  # max entries
+
+
+def normalize_query(query: str) -> str:
+    return " ".join((query or "").lower().split())
+
+
+class SearchCache:
+    def __init__(self, ttl: float = None, max_entries: int = None):
+        self.ttl = SEARCH_CACHE_TTL if ttl is None else ttl
+        self.max_entries = max_entries or SEARCH_CACHE_SIZE
+
+        self._entries: "OrderedDict[Tuple, Tuple[float, List[Dict]]]" = OrderedDict()
+        self._in_flight: Dict[Tuple, Future] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get_or_search(self, provider: str, query: str, limit: int, search: Callable[[], List[Dict]]) -> List[Dict]:
+        key = (provider, normalize_query(query), limit)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (not self.ttl or time.time() - entry[0] <= self.ttl):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return list(entry[1])
+
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                self.misses += 1
+                future = self._in_flight[key] = Future()
+            else:
+                self.coalesced += 1
+
+        if not owner:
+            return list(future.result())  # someone else is already asking the provider
+
+        try:
+            results = search()
+        except BaseException as e:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._in_flight.pop(key, None)
+            if results and not any(r.get("placeholder") for r in results):  # provider hiccup, not an answer
+                self._entries[key] = (time.time(), list(results))
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        future.set_result(results)
+        return list(results)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_ratio": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+        }
+
+
+def cached_search(provider: str):
+    """
+    Decorator for fn(query, limit=...) -> list of results.
+    """
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(query: str, limit: int = 5):
+            return get_container().search_cache.get_or_search(provider, query, limit, lambda: fn(query, limit=limit))
+        wrapper.uncached = fn
+        return wrapper
+    return decorate
@@ -0,0 +1,136 @@
+# services/rag/sparse_index.py
+"""
+In-process BM25 index over chunk text, used for hybrid retrieval.
+- Built from the Qdrant collection (payload scroll, no vectors), warmed at startup
+- Holds term statistics and the filter fields only; hit text and payloads come
+  from the dense hits or a batched retrieve
+- Kept in sync by VectorStore on upsert / delete
+- Dense and sparse rankings are merged with reciprocal rank fusion
+"""
+
+import os
+import re
+import math
+import threading
+from collections import Counter
+from typing import Dict, List, Tuple
+
+BM25_K1 = float(os.getenv("BM25_K1", "1.5"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+FILTER_FIELDS = ("source_type", "url", "pdf_name", "video_id")  # payload fields kept for metadata filters
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall((text or "").lower()) if len(t) > 1]
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = None) -> Dict[str, float]:
+    """
+    rankings: lists of ids, best first. Returns id -> sum(1 / (k + rank)).
+    """
+    k = RRF_K if k is None else k
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return fused
+
+
+def _matches(fields: Dict, metadata_filter: Dict = None) -> bool:
+    return not metadata_filter or all(fields.get(k) == v for k, v in metadata_filter.items())
+
+
+class SparseIndex:
+    def __init__(self, k1: float = None, b: float = None):
+        self.k1 = BM25_K1 if k1 is None else k1
+        self.b = BM25_B if b is None else b
+
+        self._postings: Dict[str, Dict[str, int]] = {}  # term -> {doc id: term frequency}
+        self._lengths: Dict[str, int] = {}
+        self._terms: Dict[str, List[str]] = {}          # doc id -> distinct terms (for removal)
+        self._fields: Dict[str, Dict] = {}             # doc id -> FILTER_FIELDS present in its payload
+        self._total_length = 0
+        self._lock = threading.RLock()
+        self.loaded = False
+
+    def __len__(self):
+        return len(self._lengths)
+
+    # ---------- Maintenance ----------
+    def load(self, scroll_pages):
+        """
+        scroll_pages: iterable of [(id, payload), ...] pages covering the collection.
+        """
+        with self._lock:
+            if self.loaded:
+                return
+            for page in scroll_pages:
+                for doc_id, payload in page:
+                    self._add(str(doc_id), payload)
+            self.loaded = True
+
+    def add(self, ids: List, payloads: List[Dict]):
+        with self._lock:
+            for doc_id, payload in zip(ids, payloads):
+                self._add(str(doc_id), payload)
+
+    def _add(self, doc_id: str, payload: Dict):
+        if doc_id in self._lengths:
+            self._remove(doc_id)
+        counts = Counter(tokenize((payload or {}).get("text", "")))
+        for term, tf in counts.items():
+            self._postings.setdefault(term, {})[doc_id] = tf
+        length = sum(counts.values())
+        self._lengths[doc_id] = length
+        self._terms[doc_id] = list(counts)
+        self._fields[doc_id] = {f: payload[f] for f in FILTER_FIELDS if f in (payload or {})}
+        self._total_length += length
+
+    def _remove(self, doc_id: str):
+        for term in self._terms.pop(doc_id, []):
+            docs = self._postings.get(term)
+            if docs is not None:
+                docs.pop(doc_id, None)
+                if not docs:
+                    del self._postings[term]
+        self._total_length -= self._lengths.pop(doc_id, 0)
+        self._fields.pop(doc_id, None)
+
+    def delete_where(self, metadata_filter: Dict, keep_ids: List = None):
+        keep = {str(i) for i in keep_ids or []}
+        with self._lock:
+            doomed = [d for d, f in self._fields.items() if d not in keep and _matches(f, metadata_filter)]
+            for doc_id in doomed:
+                self._remove(doc_id)
+
+    # ---------- Search ----------
+    def search(self, text: str, k: int = 5, metadata_filter: Dict = None) -> List[Tuple[str, float]]:
+        terms = set(tokenize(text))
+        with self._lock:
+            n = len(self._lengths)
+            if not n or not terms:
+                return []
+            avg_len = self._total_length / n
+
+            scores: Dict[str, float] = {}
+            for term in terms:
+                docs = self._postings.get(term)
+                if not docs:
+                    continue
+                idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+                for doc_id, tf in docs.items():
+                    norm = tf + self.k1 * (1 - self.b + self.b * self._lengths[doc_id] / avg_len)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+
+            ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
+            hits = []
+            for doc_id, score in ranked:
+                if _matches(self._fields[doc_id], metadata_filter):
+                    hits.append((doc_id, score))
+                    if len(hits) >= k:
+                        break
+            return hits
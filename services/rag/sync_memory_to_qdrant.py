@@ -1,48 +1,296 @@
 # services/rag/sync_memory_to_qdrant.py
+"""
+Incremental sync of the Supabase memory store into Qdrant.
+- Per-source fingerprints (ETag, Last-Modified, content hash, chunk count) in SQLite
+- Conditional GETs skip unchanged web/PDF sources; unchanged transcripts are skipped by hash
+- PDFs are spooled to disk (hashed while streaming) and extracted page by page like
+  the ingest paths, so their chunk ids match and unchanged pages are not re-embedded
+- Changed sources are re-ingested with bounded parallelism and their stale chunks deleted
+- Every run that completes is closed, even when sources failed; failures are recorded
+  per source and the next run re-checks everything
+- A crashed run is resumed: only sources it had not finished (or that failed) are processed,
+  and a run older than SYNC_RESUME_MAX_AGE_HOURS or resumed SYNC_RESUME_MAX_ATTEMPTS
+  times is abandoned for a fresh one
+
+    python -m services.rag.sync_memory_to_qdrant [--dry-run] [--concurrency N] [--no-resume]
+"""
 
 import os
-from services.rag.memory import MemoryManager
-from services.rag.vectorstore import get_vectorstore
-from services.rag.tools import fetch_pdf_text, web_search, youtube_search
-from services.rag.ingest import ingest_pdf_text
+import time
+import uuid
+import sqlite3
+import argparse
+import threading
+import xxhash
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Optional
 from urllib.parse import urlparse
 from dotenv import load_dotenv
+from services.rag.container import get_container
+from services.rag.vectorstore import get_vectorstore
+from services.rag.clients import http_get
+from services.rag.pdf_extract import PDF_SPOOL_CHUNK, iter_pdf_pages, spool
+from services.rag.pipeline import IngestPipeline
+from services.rag.utils import youtube_video_id
 
 load_dotenv()
 
-def ingest_source(url: str):
+SYNC_STATE_DB = os.getenv("SYNC_STATE_DB", "data/sync_state.sqlite3")
+SYNC_CONCURRENCY = int(os.getenv("SYNC_CONCURRENCY", "4"))
+SYNC_RESUME_MAX_AGE_HOURS = float(os.getenv("SYNC_RESUME_MAX_AGE_HOURS", "24"))  # older crashed runs start over
+SYNC_RESUME_MAX_ATTEMPTS = int(os.getenv("SYNC_RESUME_MAX_ATTEMPTS", "3"))       # resumes before starting over
+
+
+class SyncState:
     """
-    Determine source type and ingest into Qdrant.
+    SQLite record of source fingerprints and sync runs.
     """
+
+    def __init__(self, path: str = None):
+        self.path = path or SYNC_STATE_DB
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS sources (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                content_hash TEXT,
+                chunk_count INTEGER,
+                synced_at REAL,
+                run_id TEXT,
+                failures INTEGER DEFAULT 0,
+                last_error TEXT
+            );
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id TEXT PRIMARY KEY,
+                started_at REAL,
+                finished_at REAL,
+                attempts INTEGER DEFAULT 1
+            );
+        """)
+        # State files from before per-source failures and resume caps
+        for table, column in (("sources", "failures INTEGER DEFAULT 0"), ("sources", "last_error TEXT"),
+                              ("runs", "attempts INTEGER DEFAULT 1")):
+            try:
+                self._db.execute(f"ALTER TABLE {table} ADD COLUMN {column}")
+            except sqlite3.OperationalError:
+                pass  # already there
+        self._db.commit()
+
+    def get(self, url: str) -> Dict:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT etag, last_modified, content_hash, chunk_count, run_id, failures, last_error FROM sources WHERE url = ?",
+                (url,),
+            ).fetchone()
+        if not row:
+            return {}
+        return {"etag": row[0], "last_modified": row[1], "content_hash": row[2], "chunk_count": row[3], "run_id": row[4],
+                "failures": row[5] or 0, "last_error": row[6]}
+
+    def put(self, url: str, run_id: str, etag=None, last_modified=None, content_hash=None, chunk_count=None):
+        with self._lock:
+            self._db.execute(
+                """
+                INSERT INTO sources (url, etag, last_modified, content_hash, chunk_count, synced_at, run_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    etag = excluded.etag,
+                    last_modified = excluded.last_modified,
+                    content_hash = excluded.content_hash,
+                    chunk_count = COALESCE(excluded.chunk_count, sources.chunk_count),
+                    synced_at = excluded.synced_at,
+                    run_id = excluded.run_id,
+                    failures = 0,
+                    last_error = NULL
+                """,
+                (url, etag, last_modified, content_hash, chunk_count, time.time(), run_id),
+            )
+            self._db.commit()
+
+    def fail(self, url: str, error: str):
+        """
+        Record a failed attempt. The source keeps its old fingerprint and run stamp,
+        so a resumed run retries it and the next run re-checks it.
+        """
+        with self._lock:
+            self._db.execute(
+                """
+                INSERT INTO sources (url, failures, last_error) VALUES (?, 1, ?)
+                ON CONFLICT(url) DO UPDATE SET failures = sources.failures + 1, last_error = excluded.last_error
+                """,
+                (url, error),
+            )
+            self._db.commit()
+
+    def start_run(self, resume: bool = True) -> str:
+        """
+        Resume the newest unfinished (crashed) run if it is recent enough and has
+        not been resumed too often; otherwise close it and start a fresh run.
+        """
+        with self._lock:
+            if resume:
+                row = self._db.execute(
+                    "SELECT run_id, started_at, attempts FROM runs WHERE finished_at IS NULL ORDER BY started_at DESC LIMIT 1"
+                ).fetchone()
+                if row:
+                    run_id, started_at, attempts = row
+                    if time.time() - started_at < SYNC_RESUME_MAX_AGE_HOURS * 3600 and (attempts or 1) < SYNC_RESUME_MAX_ATTEMPTS:
+                        self._db.execute("UPDATE runs SET attempts = ? WHERE run_id = ?", ((attempts or 1) + 1, run_id))
+                        self._db.commit()
+                        return run_id
+            self._db.execute("UPDATE runs SET finished_at = ? WHERE finished_at IS NULL", (time.time(),))
+            run_id = uuid.uuid4().hex
+            self._db.execute("INSERT INTO runs (run_id, started_at) VALUES (?, ?)", (run_id, time.time()))
+            self._db.commit()
+            return run_id
+
+    def finish_run(self, run_id: str):
+        with self._lock:
+            self._db.execute("UPDATE runs SET finished_at = ? WHERE run_id = ?", (time.time(), run_id))
+            self._db.commit()
+
+
+def _content_hash(data) -> str:
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return xxhash.xxh3_128_hexdigest(data)
+
+
+def sync_source(url: str, state: SyncState, run_id: str, dry_run: bool = False) -> Dict:
+    """
+    Sync one source. Returns {"url", "status": unchanged|changed|failed, ...}.
+    """
+    previous = state.get(url)
     parsed = urlparse(url)
+
+    # ---------- YouTube: no HTTP validators, compare transcript hash ----------
     if "youtube.com" in parsed.netloc or "youtu.be" in parsed.netloc:
-        from services.rag.ingest_youtube import ingest_youtube
-        video_id = url.split("v=")[-1].split("&")[0]  # crude extraction
-        ingest_youtube(video_id)
-    elif url.lower().endswith(".pdf"):
-        pdf_text = fetch_pdf_text(url)
-        if pdf_text:
-            ingest_pdf_text([pdf_text], pdf_name=url)
+        from services.rag.ingest_youtube import fetch_transcript, ingest_youtube
+        video_id = youtube_video_id(url)
+        transcript = fetch_transcript(video_id)
+        digest = _content_hash(" ".join(line["text"] for line in transcript))
+        if digest == previous.get("content_hash"):
+            if not dry_run:
+                state.put(url, run_id, content_hash=digest)
+            return {"url": url, "status": "unchanged"}
+        if dry_run:
+            return {"url": url, "status": "changed"}
+
+        pipe = IngestPipeline()
+        ingest_youtube(video_id, transcript=transcript, pipeline=pipe)
+        return _finish_changed(url, state, run_id, pipe, {"video_id": video_id}, content_hash=digest)
+
+    # ---------- Web / PDF: conditional GET ----------
+    headers = {}
+    if previous.get("etag"):
+        headers["If-None-Match"] = previous["etag"]
+    if previous.get("last_modified"):
+        headers["If-Modified-Since"] = previous["last_modified"]
+
+    path = None
+    with http_get(url, headers=headers, stream=True) as resp:
+        if resp.status_code == 304:
+            if not dry_run:
+                state.put(url, run_id, etag=previous.get("etag"), last_modified=previous.get("last_modified"),
+                          content_hash=previous.get("content_hash"))
+            return {"url": url, "status": "unchanged", "reason": "304"}
+        resp.raise_for_status()
+
+        etag = resp.headers.get("ETag")
+        last_modified = resp.headers.get("Last-Modified")
+        is_pdf = url.lower().endswith(".pdf") or "pdf" in resp.headers.get("Content-Type", "")
+        if is_pdf:
+            hasher = xxhash.xxh3_128()
+
+            def hashed(chunks):
+                for chunk in chunks:
+                    hasher.update(chunk)
+                    yield chunk
+
+            path = spool(hashed(resp.iter_content(chunk_size=PDF_SPOOL_CHUNK)))
+            digest = hasher.hexdigest()
+        else:
+            digest = _content_hash(resp.content)
+            html = resp.text
+
+    if digest == previous.get("content_hash"):
+        if path:
+            os.remove(path)
+        if not dry_run:
+            state.put(url, run_id, etag=etag, last_modified=last_modified, content_hash=digest)
+        return {"url": url, "status": "unchanged", "reason": "hash"}
+    if dry_run:
+        if path:
+            os.remove(path)
+        return {"url": url, "status": "changed"}
+
+    pipe = IngestPipeline()
+    if is_pdf:
+        from services.rag.ingest import ingest_pdf_text
+        ingest_pdf_text(iter_pdf_pages(path, cleanup=True), pdf_name=url, pipeline=pipe)
+        source_filter = {"pdf_name": url}
     else:
         from services.rag.ingest_web import ingest_web
-        ingest_web(url)
+        ingest_web(url, html=html, pipeline=pipe)
+        source_filter = {"url": url}
+
+    return _finish_changed(url, state, run_id, pipe, source_filter,
+                           etag=etag, last_modified=last_modified, content_hash=digest)
 
-def main():
-    print("\n=== Syncing Supabase Memory Store to Qdrant ===\n")
-    memory = MemoryManager()
-    vs = get_vectorstore()
 
-    all_sources = memory.data.get("sources", {})
-    print(f"Found {len(all_sources)} sources in memory.")
+def _finish_changed(url: str, state: SyncState, run_id: str, pipe: IngestPipeline, source_filter: Dict, **fingerprint) -> Dict:
+    keep_ids = sorted(set(pipe.ids))
+    if keep_ids:
+        # Never wipe a source because extraction came back empty
+        get_vectorstore().delete_stale(source_filter, keep_ids)
+    state.put(url, run_id, chunk_count=len(keep_ids), **fingerprint)
+    return {"url": url, "status": "changed", "chunks": pipe.chunks, "skipped": pipe.skipped}
 
-    for i, (url, meta) in enumerate(all_sources.items(), 1):
-        print(f"[{i}/{len(all_sources)}] Ingesting: {url}")
-        try:
-            ingest_source(url)
-        except Exception as e:
-            print(f"Failed to ingest {url}: {e}")
 
-    print("\n✅ Memory synced to Qdrant successfully!\n")
+def run_sync(urls: list, state: SyncState, concurrency: int = None, dry_run: bool = False, resume: bool = True) -> Dict:
+    """
+    Sync every url in one run and close it; returns counts per status.
+    """
+    run_id = "dry-run" if dry_run else state.start_run(resume=resume)
+    pending = [url for url in urls if state.get(url).get("run_id") != run_id]
+    print(f"Found {len(urls)} sources in memory, {len(pending)} left in run {run_id}.")
+
+    counts = {"unchanged": 0, "changed": 0, "failed": 0}
+    with ThreadPoolExecutor(max_workers=max(1, concurrency or SYNC_CONCURRENCY)) as pool:
+        futures = {pool.submit(sync_source, url, state, run_id, dry_run): url for url in pending}
+        for i, future in enumerate(as_completed(futures), 1):
+            url = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"url": url, "status": "failed", "reason": str(e)}
+                if not dry_run:
+                    state.fail(url, str(e))
+            counts[result["status"]] += 1
+            print(f"[{i}/{len(pending)}] {result['status']}: {url}")
+
+    if not dry_run:
+        state.finish_run(run_id)  # failures are kept per source; the next run re-checks everything
+    return counts
+
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(description="Incrementally sync Supabase memory sources into Qdrant")
+    parser.add_argument("--dry-run", action="store_true", help="report changed sources without ingesting")
+    parser.add_argument("--concurrency", type=int, default=SYNC_CONCURRENCY, help="sources processed in parallel")
+    parser.add_argument("--no-resume", action="store_true", help="start a fresh run instead of resuming a crashed one")
+    args = parser.parse_args(argv)
+
+    print("\n=== Syncing Supabase Memory Store to Qdrant ===\n")
+    memory = get_container().memory
+    counts = run_sync(list(memory.data.get("sources", {})), SyncState(), concurrency=args.concurrency,
+                      dry_run=args.dry_run, resume=not args.no_resume)
+    print(f"\n✅ Sync finished: {counts['changed']} changed, {counts['unchanged']} unchanged, {counts['failed']} failed\n")
+    return counts
+
 
 if __name__ == "__main__":
     main()
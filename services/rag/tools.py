@@ -3,20 +3,35 @@
 Tool wrappers for agentic RAG.
 - web_search(query): returns list of dicts {title, snippet, url}
 - youtube_search(query): list of possible youtube urls
+- fetch_pdf_pages(url): page texts streamed from a spooled download (best effort)
 - fetch_pdf_text(url): returns plain text (best effort)
 - choose_best_source(results): helper
+- rank_sources(results): usable results, best first
+Search results are cached per normalized query (services/rag/search_cache.py).
 """
 
 import os
-import requests
-from typing import List, Dict, Optional
+import logging
+from typing import List, Dict, Optional, Iterator
 from urllib.parse import urlparse
 from services.rag.utils import clean_text
+from services.rag.http_cache import cached_get
+from services.rag.search_cache import cached_search
+from services.rag.metrics import external_call
 
 # Optional: SerpAPI key or Google CSE
 SERPAPI_KEY = os.getenv("SERPAPI_KEY", None)
 SERPAPI_ENGINE = os.getenv("SERPAPI_ENGINE", "serpapi")  # name only for logic readability
 
+logger = logging.getLogger(__name__)
+
+
+def _placeholder(query: str, url: str) -> Dict:
+    # Stand-in link when no provider answered; flagged so the search cache does not keep it
+    return {"title": query, "snippet": "", "url": url, "placeholder": True}
+
+
+@cached_search("web")
 def web_search(query: str, limit: int = 5) -> List[Dict]:
     """
     Returns a list of search results: [{title, snippet, url}, ...]
@@ -35,7 +50,8 @@ def web_search(query: str, limit: int = 5) -> List[Dict]:
                 "api_key": SERPAPI_KEY,
             }
             search = GoogleSearch(params)
-            resp = search.get_dict()
+            with external_call("serpapi", "search"):
+                resp = search.get_dict()
             organic = resp.get("organic_results", []) or resp.get("organic", [])
             for item in organic[:limit]:
                 results.append({
@@ -46,13 +62,13 @@ def web_search(query: str, limit: int = 5) -> List[Dict]:
             return results
         except Exception as e:
             # fallback to simple search scraping below
-            print("SerpAPI error or not installed:", e)
+            logger.warning("SerpAPI error or not installed: %s", e)
 
     # Simple fallback: use DuckDuckGo HTML instant answer API
     try:
         ddg_url = "https://api.duckduckgo.com/"
         params = {"q": query, "format": "json", "no_html": 1, "skip_disambig": 1}
-        r = requests.get(ddg_url, params=params, timeout=10)
+        r = cached_get(ddg_url, params=params, timeout=10)
         r.raise_for_status()
         data = r.json()
         # DuckDuckGo instant answer provides AbstractURL, RelatedTopics etc.
@@ -60,14 +76,15 @@ def web_search(query: str, limit: int = 5) -> List[Dict]:
             results.append({"title": data.get("Heading") or query, "snippet": data.get("AbstractText", ""), "url": data.get("AbstractURL")})
         # fallback: return the query as single item if nothing found
         if not results:
-            results.append({"title": query, "snippet": "", "url": f"https://duckduckgo.com/?q={query}"})
+            results.append(_placeholder(query, f"https://duckduckgo.com/?q={query}"))
         return results[:limit]
     except Exception as e:
-        print("duckduckgo fallback search failed:", e)
+        logger.warning("duckduckgo fallback search failed: %s", e)
         # Last resort: return query as link to Google
-        return [{"title": query, "snippet": "", "url": f"https://www.google.com/search?q={query.replace(' ', '+')}"}]
+        return [_placeholder(query, f"https://www.google.com/search?q={query.replace(' ', '+')}")]
 
 
+@cached_search("youtube")
 def youtube_search(query: str, limit: int = 5) -> List[Dict]:
     """
     Lightweight search for Youtube links. For production, replace with YouTube Data API.
@@ -85,50 +102,60 @@ def youtube_search(query: str, limit: int = 5) -> List[Dict]:
         return []
 
 
+def fetch_pdf_pages(url: str, timeout: int = 15) -> Optional[Iterator[str]]:
+    """
+    Best-effort: download the PDF to disk and return an iterator over its page
+    texts (extracted in parallel), or None if it is not a PDF / the download failed.
+    The spooled file is deleted once the iterator is exhausted.
+    """
+    try:
+        from services.rag.pdf_extract import iter_remote_pdf_pages
+        return iter_remote_pdf_pages(url, timeout=timeout)
+    except Exception as e:
+        logger.warning("fetch_pdf_pages failed: %s", e)
+        return None
+
+
 def fetch_pdf_text(url: str, timeout: int = 15) -> Optional[str]:
     """
-    Best-effort fetch PDF and extract text using pdfminer.six if available,
-    otherwise return None. This is synchronous and intended for agentic ingestion.
+    Best-effort fetch PDF and return its plain text, otherwise None.
+    This is synchronous and intended for agentic ingestion.
     """
+    pages = fetch_pdf_pages(url, timeout=timeout)
+    if pages is None:
+        return None
     try:
-        resp = requests.get(url, timeout=timeout)
-        resp.raise_for_status()
-        content_type = resp.headers.get("Content-Type", "")
-        if "pdf" not in content_type and not url.lower().endswith(".pdf"):
-            return None
-        # write to temp file and extract with pdfminer if installed
-        import tempfile
-        from io import BytesIO
-        tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
-        tmp.write(resp.content)
-        tmp.close()
-        try:
-            # try pdfminer.six
-            from pdfminer.high_level import extract_text
-            txt = extract_text(tmp.name)
-            return clean_text(txt)
-        except Exception as e:
-            print("pdfminer not available or failed:", e)
-            return None
+        return clean_text("\n".join(pages))
     except Exception as e:
-        print("fetch_pdf_text failed:", e)
+        logger.warning("fetch_pdf_text failed: %s", e)
         return None
 
 
-def choose_best_source(search_results: List[Dict]) -> Optional[Dict]:
+def rank_sources(search_results: List[Dict]) -> List[Dict]:
     """
-    Simple heuristic to pick the best source from web_search/youtube_search results.
-    Currently picks the first result that looks like an article or YouTube.
+    Usable results in preference order: YouTube first, then article-like pages.
+    Search-engine result pages are dropped.
     """
+    youtube, articles = [], []
     for r in search_results:
-        u = r.get("url", "")
+        u = r.get("url") or ""
         if "youtube.com" in u or "youtu.be" in u:
-            return r
-    # prefer urls with common article domains or not search pages
-    for r in search_results:
-        u = r.get("url", "")
+            youtube.append(r)
+            continue
+        # prefer urls with common article domains or not search pages
         parsed = urlparse(u)
         if parsed.netloc and not parsed.netloc.endswith("google.com") and not parsed.netloc.endswith("duckduckgo.com"):
-            return r
+            articles.append(r)
+    return youtube + articles
+
+
+def choose_best_source(search_results: List[Dict]) -> Optional[Dict]:
+    """
+    Simple heuristic to pick the best source from web_search/youtube_search results.
+    Currently picks the first result that looks like an article or YouTube.
+    """
+    ranked = rank_sources(search_results)
+    if ranked:
+        return ranked[0]
     # fallback
     return search_results[0] if search_results else None
@@ -1,6 +1,9 @@
 def build_prompt(query: str, retrieved_docs: list[dict]) -> str:
+    from services.rag.context_packing import pack_context, budget_for
+
+    packed, _ = pack_context(retrieved_docs, budget_for("answer"))
     context = "\n\n".join(
-        [f"Source: {d.get('source_type','unknown')}\n{d.get('text','')}" for d in retrieved_docs]
+        [f"Source: {d.get('source_type','unknown')}\n{d.get('text','')}" for d in packed]
     )
 
     return f"""
@@ -20,6 +23,7 @@ If the answer is not fully found in the context, say:
 # services/rag/utils.py
 
 import re
+from urllib.parse import urlparse
 
 def clean_text(t: str) -> str:
     """
@@ -33,3 +37,29 @@ def clean_text(t: str) -> str:
     t = t.strip()
     return t
 
+
+
+def source_keys(payload: dict, include_type: bool = True) -> set:
+    """
+    Identity keys of the source a chunk came from, e.g. {"type:web", "url:https://..."}.
+    Used to invalidate anything derived from a source when it is re-ingested or deleted.
+    include_type=False leaves out the "type:" key, which every source of that type shares.
+    """
+    payload = payload or {}
+    keys = set()
+    if include_type and payload.get("source_type"):
+        keys.add(f"type:{payload['source_type']}")
+    for field in ("url", "pdf_name", "video_id"):
+        if payload.get(field):
+            keys.add(f"{field}:{payload[field]}")
+    return keys
+
+
+def youtube_video_id(url: str) -> str:
+    """
+    Video id from a youtube.com/watch?v=... or youtu.be/... url (bare ids pass through).
+    """
+    parsed = urlparse(url)
+    if "youtu.be" in parsed.netloc:
+        return parsed.path.lstrip("/").split("/")[0]
+    return url.split("v=")[-1].split("&")[0]  # crude extraction
@@ -12,11 +12,14 @@ LOW_CONFIDENCE_THRESHOLD = 0.35  # tune later
 def is_low_context(retrieved_chunks: List[Dict]) -> bool:
     """
     Determines if retrieved context is too weak to answer.
+    Averages the dense similarity of the chunks that have one; keyword-only
+    hybrid hits carry no similarity and are left out of the average.
     """
-    if not retrieved_chunks:
+    scores = [c["score"] for c in retrieved_chunks if c.get("score") is not None]
+    if not scores:
         return True
 
-    avg_score = sum(c.get("score", 0) for c in retrieved_chunks) / len(retrieved_chunks)
+    avg_score = sum(scores) / len(scores)
     return avg_score < LOW_CONFIDENCE_THRESHOLD
 
 
@@ -0,0 +1,587 @@
+# services/rag/vector_backends.py
+"""
+Vector index backends behind VectorStore.
+- QdrantBackend: remote Qdrant server (default, VECTOR_BACKEND=qdrant)
+  - the collection is declared by QDRANT_* settings: keyword payload indexes, HNSW m /
+    ef_construct, int8 scalar quantization (searched with rescoring), on-disk vectors
+  - an existing collection is migrated in place to match, never recreated
+- FaissBackend: embedded index, no server (VECTOR_BACKEND=faiss)
+  - HNSW over normalized vectors, inner product = cosine, like the Qdrant collection
+  - index file is memory-mapped on load and saved atomically every FAISS_SAVE_INTERVAL seconds
+    by a background maintenance thread, never on the writer's request path
+  - payloads and vectors live in a SQLite sidecar, which is the source of truth:
+    a missing or stale index file is rebuilt from it
+  - metadata filters are resolved in SQLite; small matching sets are scored exactly,
+    larger ones are searched in the graph with an id selector
+  - HNSW cannot remove points: deleted labels are masked and the index is compacted
+    in the background once they exceed FAISS_COMPACT_RATIO
+Every backend returns hits as payload dicts carrying "id" and "score".
+"""
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from dotenv import load_dotenv
+from qdrant_client import QdrantClient, AsyncQdrantClient
+from qdrant_client.http.models import (
+    PointStruct, Filter, FieldCondition, MatchValue, HasIdCondition, VectorParams, VectorParamsDiff, Distance,
+    HnswConfigDiff, ScalarQuantization, ScalarQuantizationConfig, ScalarType, Disabled, PayloadSchemaType,
+    SearchParams, QuantizationSearchParams, QueryRequest,
+)
+from services.rag.embeddings import embedding_dimension
+from services.rag.concurrency import run_blocking
+
+load_dotenv()
+
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "qdrant").lower()
+VECTOR_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", "data/vector_index")
+
+QDRANT_URL = os.getenv("QDRANT_URL")
+QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
+QDRANT_PAYLOAD_INDEXES = [f.strip() for f in os.getenv("QDRANT_PAYLOAD_INDEXES", "source_type,url,pdf_name,video_id").split(",") if f.strip()]
+QDRANT_HNSW_M = int(os.getenv("QDRANT_HNSW_M", "16"))
+QDRANT_HNSW_EF_CONSTRUCT = int(os.getenv("QDRANT_HNSW_EF_CONSTRUCT", "100"))
+QDRANT_SEARCH_EF = int(os.getenv("QDRANT_SEARCH_EF", "128"))                   # hnsw_ef at query time
+QDRANT_QUANTIZATION = os.getenv("QDRANT_QUANTIZATION", "int8").lower()         # int8 | none
+QDRANT_QUANTILE = float(os.getenv("QDRANT_QUANTILE", "0.99"))
+QDRANT_OVERSAMPLING = float(os.getenv("QDRANT_OVERSAMPLING", "2.0"))           # candidates rescored with full vectors
+QDRANT_ON_DISK_VECTORS = os.getenv("QDRANT_ON_DISK_VECTORS", "false").lower() in ("1", "true", "yes")
+
+FAISS_HNSW_M = int(os.getenv("FAISS_HNSW_M", "32"))                          # graph degree
+FAISS_EF_CONSTRUCTION = int(os.getenv("FAISS_EF_CONSTRUCTION", "200"))
+FAISS_EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "128"))
+FAISS_EXACT_FILTER_LIMIT = int(os.getenv("FAISS_EXACT_FILTER_LIMIT", "4096"))  # filtered sets up to this are scored exactly
+FAISS_COMPACT_RATIO = float(os.getenv("FAISS_COMPACT_RATIO", "0.25"))        # deleted / total before a rebuild
+FAISS_SAVE_INTERVAL = float(os.getenv("FAISS_SAVE_INTERVAL", "30"))          # seconds between index file saves
+
+logger = logging.getLogger(__name__)
+
+
+# ---------- Qdrant ----------
+class QdrantBackend:
+    name = "qdrant"
+
+    def __init__(self, collection_name: str, client=None, aclient=None):
+        if client is None:
+            if not QDRANT_URL or not collection_name:
+                raise ValueError("Missing Qdrant configuration")
+            client = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
+            aclient = aclient or AsyncQdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
+        self.client = client
+        self.aclient = aclient
+        self.collection_name = collection_name
+
+    # ----- collection bootstrap -----
+    @staticmethod
+    def _quantization():
+        if QDRANT_QUANTIZATION == "none":
+            return None
+        if QDRANT_QUANTIZATION != "int8":
+            raise ValueError(f"Unknown QDRANT_QUANTIZATION '{QDRANT_QUANTIZATION}'")
+        # Quantized vectors stay in RAM even when the originals are on disk; those are only read to rescore
+        return ScalarQuantization(scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=QDRANT_QUANTILE, always_ram=True))
+
+    def ensure_collection(self, embedder):
+        """
+        Create the collection as configured, or bring an existing one in line
+        with the configuration without touching its points.
+        """
+        try:
+            info = self.client.get_collection(collection_name=self.collection_name)
+        except Exception:
+            info = None
+
+        if info is None:
+            self.client.create_collection(
+                collection_name=self.collection_name,
+                vectors_config=VectorParams(size=embedding_dimension(embedder), distance=Distance.COSINE, on_disk=QDRANT_ON_DISK_VECTORS),
+                hnsw_config=HnswConfigDiff(m=QDRANT_HNSW_M, ef_construct=QDRANT_HNSW_EF_CONSTRUCT),
+                quantization_config=self._quantization(),
+            )
+            logger.info("Created Qdrant collection %s", self.collection_name)
+            indexed = set()
+        else:
+            self._migrate(info, embedder)
+            indexed = set(info.payload_schema or {})
+
+        for field in QDRANT_PAYLOAD_INDEXES:
+            if field not in indexed:
+                self.client.create_payload_index(
+                    collection_name=self.collection_name,
+                    field_name=field,
+                    field_schema=PayloadSchemaType.KEYWORD,
+                    wait=True,
+                )
+
+    def _migrate(self, info, embedder):
+        vectors = info.config.params.vectors
+        if not isinstance(vectors, VectorParams):
+            raise ValueError(f"Qdrant collection {self.collection_name} uses named vectors, which VectorStore does not support")
+        dimension = getattr(embedder, "dimension", None)  # only checked when known without an embedding call
+        if vectors.distance != Distance.COSINE or (dimension and vectors.size != dimension):
+            raise ValueError(
+                f"Qdrant collection {self.collection_name} holds {vectors.size}-d {vectors.distance} vectors; "
+                f"re-index into a new QDRANT_COLLECTION to change the embedding model"
+            )
+
+        changes = {}
+        hnsw = info.config.hnsw_config
+        if (hnsw.m, hnsw.ef_construct) != (QDRANT_HNSW_M, QDRANT_HNSW_EF_CONSTRUCT):
+            changes["hnsw_config"] = HnswConfigDiff(m=QDRANT_HNSW_M, ef_construct=QDRANT_HNSW_EF_CONSTRUCT)
+        if bool(vectors.on_disk) != QDRANT_ON_DISK_VECTORS:
+            changes["vectors_config"] = {"": VectorParamsDiff(on_disk=QDRANT_ON_DISK_VECTORS)}
+        quantization = self._quantization()
+        if info.config.quantization_config != quantization:
+            changes["quantization_config"] = quantization or Disabled.DISABLED
+
+        if changes:
+            # In-place: Qdrant rebuilds segments in the background and keeps serving
+            self.client.update_collection(collection_name=self.collection_name, **changes)
+            logger.info("Migrated Qdrant collection %s: %s", self.collection_name, ", ".join(changes))
+
+    @staticmethod
+    def _search_params():
+        return SearchParams(
+            hnsw_ef=QDRANT_SEARCH_EF,
+            quantization=QuantizationSearchParams(rescore=True, oversampling=QDRANT_OVERSAMPLING)
+            if QDRANT_QUANTIZATION != "none" else None,
+        )
+
+    @staticmethod
+    def _build_filter(metadata_filter: dict = None, keep_ids: list = None):
+        if not metadata_filter:
+            return None
+        q_filter = Filter(must=[FieldCondition(key=key, match=MatchValue(value=value)) for key, value in metadata_filter.items()])
+        if keep_ids:
+            q_filter.must_not = [HasIdCondition(has_id=list(keep_ids))]
+        return q_filter
+
+    @staticmethod
+    def _hits(result) -> List[Dict]:
+        # Only include results that have actual payload; keep the point id for cache bookkeeping
+        return [{**hit.payload, "id": str(hit.id), "score": hit.score} for hit in result if hit.payload is not None]
+
+    def search(self, vector: list, limit: int, metadata_filter: dict = None) -> List[Dict]:
+        return self._hits(self.client.search(
+            collection_name=self.collection_name,
+            query_vector=vector,
+            limit=limit,
+            query_filter=self._build_filter(metadata_filter),
+            search_params=self._search_params()
+        ))
+
+    async def asearch(self, vector: list, limit: int, metadata_filter: dict = None) -> List[Dict]:
+        if self.aclient is None:
+            return await run_blocking(self.search, vector, limit, metadata_filter)
+        return self._hits(await self.aclient.search(
+            collection_name=self.collection_name,
+            query_vector=vector,
+            limit=limit,
+            query_filter=self._build_filter(metadata_filter),
+            search_params=self._search_params()
+        ))
+
+    def search_batch(self, vectors: list, limit: int, metadata_filter: dict = None) -> List[List[Dict]]:
+        """
+        One request for many query vectors (query_batch_points).
+        """
+        q_filter, params = self._build_filter(metadata_filter), self._search_params()
+        responses = self.client.query_batch_points(
+            collection_name=self.collection_name,
+            requests=[QueryRequest(query=list(v), limit=limit, filter=q_filter, params=params, with_payload=True) for v in vectors]
+        )
+        return [self._hits(r.points) for r in responses]
+
+    def existing_ids(self, ids: list) -> set:
+        points = self.client.retrieve(
+            collection_name=self.collection_name,
+            ids=list(ids),
+            with_payload=False,
+            with_vectors=False
+        )
+        return {str(p.id) for p in points}
+
+    def payloads(self, ids: list) -> Dict[str, dict]:
+        points = self.client.retrieve(
+            collection_name=self.collection_name,
+            ids=list(ids),
+            with_payload=True,
+            with_vectors=False
+        )
+        return {str(p.id): p.payload for p in points if p.payload is not None}
+
+    def upsert(self, ids: list, vectors: list, payloads: List[dict], wait: bool = True):
+        points = [PointStruct(id=ids[i], vector=vectors[i], payload=payloads[i]) for i in range(len(ids))]
+        self.client.upsert(collection_name=self.collection_name, points=points, wait=wait)
+
+    def scroll(self, page_size: int = 512) -> Iterator[List[Tuple[str, dict]]]:
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                limit=page_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=False
+            )
+            yield [(p.id, p.payload) for p in points if p.payload]
+            if offset is None:
+                return
+
+    def delete(self, metadata_filter: dict, keep_ids: list = None):
+        self.client.delete(collection_name=self.collection_name, points_selector=self._build_filter(metadata_filter, keep_ids))
+
+    def close(self):
+        self.client.close()
+
+    async def aclose(self):
+        self.close()
+        if self.aclient is not None:
+            await self.aclient.close()
+
+
+# ---------- FAISS (embedded) ----------
+class FaissBackend:
+    name = "faiss"
+
+    def __init__(self, collection_name: str, directory: str = None):
+        import faiss  # optional dependency, only needed for VECTOR_BACKEND=faiss
+
+        self._faiss = faiss
+        self.directory = directory or VECTOR_INDEX_DIR
+        self.collection_name = collection_name or "rag"
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(os.path.join(self.directory, f"{self.collection_name}.sqlite3"), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS points (
+                id TEXT PRIMARY KEY,
+                label INTEGER NOT NULL UNIQUE,
+                payload TEXT NOT NULL,
+                vector BLOB NOT NULL
+            )
+        """)
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._db.commit()
+
+        self.index = None
+        self.dimension: Optional[int] = None
+        self._generation = int(self._meta("generation", "0"))
+        self._dead: set = set()       # labels still in the graph but no longer in the sidecar
+        self._dead_selector = None
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        self._maintenance = ThreadPoolExecutor(max_workers=1, thread_name_prefix="faiss-maintenance")
+        self._maintenance_pending = False
+        self._load()
+
+    def ensure_collection(self, embedder):
+        pass  # the index is created at the first upsert, sized from the vectors
+
+    # ----- persistence -----
+    def _meta(self, key: str, default: str = None) -> Optional[str]:
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _index_path(self, generation: int) -> str:
+        # The generation changes on every rebuild, so an index file never pairs with relabeled rows
+        return os.path.join(self.directory, f"{self.collection_name}.{generation}.faiss")
+
+    def _load(self):
+        row = self._db.execute("SELECT MAX(label), COUNT(*), (SELECT vector FROM points LIMIT 1) FROM points").fetchone()
+        max_label, count, sample = row
+        if count == 0:
+            return
+        self.dimension = len(sample) // 4
+
+        path = self._index_path(self._generation)
+        if os.path.exists(path):
+            index = self._faiss.read_index(path, self._faiss.IO_FLAG_MMAP)
+            if index.ntotal > max_label and index.d == self.dimension:
+                self.index = index
+                live = np.array([r[0] for r in self._db.execute("SELECT label FROM points")], dtype="int64")
+                self._dead = set(range(index.ntotal)) - set(live.tolist())
+                self._dead_selector = None
+                return
+        logger.info("FAISS index for %s is missing or stale; rebuilding from %d stored points", self.collection_name, count)
+        self.compact()
+
+    def _new_index(self, dimension: int):
+        index = self._faiss.IndexHNSWFlat(dimension, FAISS_HNSW_M, self._faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = FAISS_EF_CONSTRUCTION
+        index.hnsw.efSearch = FAISS_EF_SEARCH
+        return index
+
+    def _matrix(self, rows: list):
+        return np.frombuffer(b"".join(r[1] for r in rows), dtype="float32").reshape(len(rows), self.dimension)
+
+    def compact(self):
+        """
+        Re-add every live point with compact labels under a new generation.
+        The new graph is built without holding the lock; points written
+        meanwhile are replayed into it before it replaces the old one.
+        """
+        with self._lock:
+            if self.dimension is None:
+                return
+            rows = self._db.execute("SELECT label, vector FROM points ORDER BY label").fetchall()
+        mark = rows[-1][0] + 1 if rows else 0  # new writes always get labels past the snapshot
+        index = self._new_index(self.dimension)
+        if rows:
+            index.add(self._matrix(rows))
+
+        with self._lock:
+            late = self._db.execute("SELECT label, vector FROM points WHERE label >= ? ORDER BY label", (mark,)).fetchall()
+            if late:
+                index.add(self._matrix(late))
+            relabel = {old: new for new, (old, _) in enumerate(rows + late)}
+            live = {r[0] for r in self._db.execute("SELECT label FROM points")}
+
+            generation = self._generation + 1
+            with self._db:
+                self._db.execute("UPDATE points SET label = -label - 1")  # dodge the UNIQUE constraint while relabeling
+                self._db.executemany("UPDATE points SET label = ? WHERE label = ?", [(relabel[old], -old - 1) for old in live])
+                self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('generation', ?)", (str(generation),))
+            # A crash before the save below leaves no file for this generation, so the next load rebuilds
+            old_path = self._index_path(self._generation)
+            self.index, self._generation = index, generation
+            self._dead = {new for old, new in relabel.items() if old not in live}  # deleted while building
+            self._dead_selector = None
+            self._dirty = True
+            self.save()
+            self._remove_file(old_path)
+
+    def _write_index(self, index, path: str):
+        tmp = f"{path}.tmp"
+        self._faiss.write_index(index, tmp)
+        os.replace(tmp, path)
+
+    @staticmethod
+    def _remove_file(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def save(self):
+        with self._lock:
+            if self.index is not None and self._dirty:
+                self._write_index(self.index, self._index_path(self._generation))
+            self._dirty, self._saved_at = False, time.monotonic()
+
+    def _needs_compaction(self) -> bool:
+        return self.index is not None and len(self._dead) > FAISS_COMPACT_RATIO * self.index.ntotal
+
+    def _after_write(self):
+        # Called with the lock held: hand saving and compaction to the maintenance thread
+        self._dirty = True
+        if self._maintenance_pending:
+            return
+        if self._needs_compaction() or time.monotonic() - self._saved_at >= FAISS_SAVE_INTERVAL:
+            self._maintenance_pending = True
+            self._maintenance.submit(self._maintain)
+
+    def _maintain(self):
+        try:
+            if self._needs_compaction():
+                self.compact()
+            else:
+                self.save()
+        except Exception as e:
+            logger.warning("FAISS maintenance for %s failed: %s", self.collection_name, e)
+        finally:
+            with self._lock:
+                self._maintenance_pending = False
+
+    def _normalize(self, vectors: list):
+        vectors = np.asarray(vectors, dtype="float32").reshape(len(vectors), -1).copy()
+        self._faiss.normalize_L2(vectors)
+        return vectors
+
+    # ----- filters -----
+    @staticmethod
+    def _where(metadata_filter: dict = None) -> Tuple[str, list]:
+        if not metadata_filter:
+            return "", []
+        clauses, params = [], []
+        for key, value in metadata_filter.items():
+            clauses.append("json_extract(payload, ?) = ?")
+            params += [f'$."{key}"', value]
+        return " WHERE " + " AND ".join(clauses), params
+
+    # ----- reads -----
+    def search(self, vector: list, limit: int, metadata_filter: dict = None) -> List[Dict]:
+        query = self._normalize([vector])
+        with self._lock:
+            if self.index is None or limit <= 0:
+                return []
+            if metadata_filter:
+                where, params = self._where(metadata_filter)
+                labels = np.array([r[0] for r in self._db.execute(f"SELECT label FROM points{where}", params)], dtype="int64")
+                if not len(labels):
+                    return []
+                if len(labels) <= FAISS_EXACT_FILTER_LIMIT:
+                    scores = self.index.reconstruct_batch(labels) @ query[0]
+                    top = np.argsort(-scores)[:limit]
+                    return self._payloads(labels[top].tolist(), scores[top].tolist())
+                selector = self._faiss.IDSelectorBatch(labels)
+            else:
+                selector = self._live_selector()
+
+            params = self._faiss.SearchParametersHNSW(sel=selector, efSearch=max(FAISS_EF_SEARCH, limit)) if selector is not None else None
+            scores, found = self.index.search(query, limit, params=params)
+            hits = [(int(label), float(score)) for label, score in zip(found[0], scores[0]) if label >= 0]
+            return self._payloads([h[0] for h in hits], [h[1] for h in hits])
+
+    async def asearch(self, vector: list, limit: int, metadata_filter: dict = None) -> List[Dict]:
+        # Off the event loop: the lock can be held by a writer or an index save
+        return await run_blocking(self.search, vector, limit, metadata_filter)
+
+    def search_batch(self, vectors: list, limit: int, metadata_filter: dict = None) -> List[List[Dict]]:
+        if metadata_filter or not len(vectors):
+            return [self.search(v, limit, metadata_filter) for v in vectors]  # the label set is resolved per query anyway
+        queries = self._normalize(vectors)
+        with self._lock:
+            if self.index is None or limit <= 0:
+                return [[] for _ in vectors]
+            selector = self._live_selector()
+            params = self._faiss.SearchParametersHNSW(sel=selector, efSearch=max(FAISS_EF_SEARCH, limit)) if selector is not None else None
+            scores, found = self.index.search(queries, limit, params=params)
+            results = []
+            for labels, row in zip(found, scores):
+                hits = [(int(label), float(score)) for label, score in zip(labels, row) if label >= 0]
+                results.append(self._payloads([h[0] for h in hits], [h[1] for h in hits]))
+            return results
+
+    def _live_selector(self):
+        if not self._dead:
+            return None
+        if self._dead_selector is None:
+            self._dead_selector = self._faiss.IDSelectorNot(
+                self._faiss.IDSelectorBatch(np.array(sorted(self._dead), dtype="int64"))
+            )
+        return self._dead_selector
+
+    def _payloads(self, labels: List[int], scores: List[float]) -> List[Dict]:
+        if not labels:
+            return []
+        marks = ",".join("?" * len(labels))
+        rows = {label: (point_id, payload) for label, point_id, payload in
+                self._db.execute(f"SELECT label, id, payload FROM points WHERE label IN ({marks})", labels)}
+        hits = []
+        for label, score in zip(labels, scores):
+            if label in rows:
+                point_id, payload = rows[label]
+                hits.append({**json.loads(payload), "id": point_id, "score": score})
+        return hits
+
+    def existing_ids(self, ids: list) -> set:
+        ids = [str(i) for i in ids]
+        found = set()
+        with self._lock:
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                marks = ",".join("?" * len(batch))
+                found.update(r[0] for r in self._db.execute(f"SELECT id FROM points WHERE id IN ({marks})", batch))
+        return found
+
+    def payloads(self, ids: list) -> Dict[str, dict]:
+        ids = [str(i) for i in ids]
+        found = {}
+        with self._lock:
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                marks = ",".join("?" * len(batch))
+                found.update((point_id, json.loads(payload)) for point_id, payload in
+                             self._db.execute(f"SELECT id, payload FROM points WHERE id IN ({marks})", batch))
+        return found
+
+    def scroll(self, page_size: int = 512) -> Iterator[List[Tuple[str, dict]]]:
+        last = ""
+        while True:
+            with self._lock:
+                rows = self._db.execute(
+                    "SELECT id, payload FROM points WHERE id > ? ORDER BY id LIMIT ?", (last, page_size)
+                ).fetchall()
+            if not rows:
+                return
+            last = rows[-1][0]
+            yield [(point_id, json.loads(payload)) for point_id, payload in rows]
+
+    # ----- writes -----
+    def upsert(self, ids: list, vectors: list, payloads: List[dict], wait: bool = True):
+        if not ids:
+            return
+        latest = {str(point_id): i for i, point_id in enumerate(ids)}  # a repeated id keeps its last version
+        if len(latest) < len(ids):
+            ids, vectors, payloads = list(latest), [vectors[i] for i in latest.values()], [payloads[i] for i in latest.values()]
+        else:
+            ids = list(latest)
+        vectors = self._normalize(vectors)
+        with self._lock:
+            if self.index is None:
+                self.dimension = vectors.shape[1]
+                self.index = self._new_index(self.dimension)
+            elif vectors.shape[1] != self.dimension:
+                raise ValueError(f"Vector size {vectors.shape[1]} does not match index dimension {self.dimension}")
+
+            replaced = self._labels_of(ids)
+            first = self.index.ntotal
+            self.index.add(vectors)
+            with self._db:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO points (id, label, payload, vector) VALUES (?, ?, ?, ?)",
+                    [(ids[i], first + i, json.dumps(payloads[i]), vectors[i].tobytes()) for i in range(len(ids))]
+                )
+            self._mark_dead(replaced)
+            self._after_write()
+
+    def _labels_of(self, ids: List[str]) -> List[int]:
+        labels = []
+        for start in range(0, len(ids), 500):
+            batch = ids[start:start + 500]
+            marks = ",".join("?" * len(batch))
+            labels += [r[0] for r in self._db.execute(f"SELECT label FROM points WHERE id IN ({marks})", batch)]
+        return labels
+
+    def _mark_dead(self, labels: List[int]):
+        if labels:
+            self._dead.update(labels)
+            self._dead_selector = None
+
+    def delete(self, metadata_filter: dict, keep_ids: list = None):
+        where, params = self._where(metadata_filter)
+        keep = {str(i) for i in keep_ids or ()}
+        with self._lock:
+            rows = [r for r in self._db.execute(f"SELECT id, label FROM points{where}", params) if r[0] not in keep]
+            if not rows:
+                return
+            with self._db:
+                self._db.executemany("DELETE FROM points WHERE id = ?", [(r[0],) for r in rows])
+            self._mark_dead([r[1] for r in rows])
+            self._after_write()
+
+    async def aclose(self):
+        self.close()
+
+    def close(self):
+        self._maintenance.shutdown(wait=True)
+        with self._lock:
+            self.save()
+            self._db.close()
+
+
+def get_vector_backend(collection_name: str):
+    if VECTOR_BACKEND == "faiss":
+        return FaissBackend(collection_name)
+    if VECTOR_BACKEND == "qdrant":
+        return QdrantBackend(collection_name)
+    raise ValueError(f"Unknown VECTOR_BACKEND '{VECTOR_BACKEND}'")
@@ -1,80 +1,252 @@
 # services/rag/vectorstore.py
 import os
 import uuid
+import logging
+import threading
 from dotenv import load_dotenv
-from qdrant_client import QdrantClient
-from qdrant_client.http.models import PointStruct, Filter, FieldCondition, MatchValue
 from services.rag.embeddings import get_embeddings
+from services.rag.embedding_cache import EmbeddingCache, EMBED_CACHE_PATH
+from services.rag.concurrency import run_blocking
+from services.rag.sparse_index import SparseIndex, reciprocal_rank_fusion
+from services.rag.utils import source_keys
+from services.rag.container import get_container
+from services.rag.metrics import external_call
+from services.rag.vector_backends import QdrantBackend, get_vector_backend
+
+logger = logging.getLogger(__name__)
 
 load_dotenv()
 
-QDRANT_URL = os.getenv("QDRANT_URL")
-QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
 QDRANT_COLLECTION = os.getenv("QDRANT_COLLECTION")
 
-_vectorstore_instance = None
-
+RAG_HYBRID = os.getenv("RAG_HYBRID", "true").lower() in ("1", "true", "yes")  # BM25 + vector fusion
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "4"))                # fetch k * N from each ranking
 
-def get_vectorstore():
-    global _vectorstore_instance
-    if _vectorstore_instance is None:
-        _vectorstore_instance = VectorStore()
-    return _vectorstore_instance
+_change_listeners = []
 
 
-class VectorStore:
-    def __init__(self):
-        if not QDRANT_URL or not QDRANT_COLLECTION:
-            raise ValueError("Missing Qdrant configuration")
+def add_change_listener(fn):
+    """
+    fn(chunk_ids: list[str], sources: set[str]) is called after points are
+    upserted or deleted, so caches derived from them can be invalidated.
+    """
+    _change_listeners.append(fn)
 
-        self.client = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
-        self.collection_name = QDRANT_COLLECTION
-        self.embedder = get_embeddings()
 
-        # Ensure collection exists
+def _notify_change(chunk_ids: list, sources: set):
+    for fn in _change_listeners:
         try:
-            self.client.get_collection(collection_name=self.collection_name)
-        except Exception:
-            self.client.recreate_collection(
-                collection_name=self.collection_name,
-                vector_size=self.embedder.dimension,
-                distance="Cosine"
-            )
-
-    def add_documents(self, docs: list[str], ids: list = None, payloads: list[dict] = None):
+            fn(chunk_ids, sources)
+        except Exception as e:
+            logger.warning("Vector store change listener failed: %s", e)
+
+
+def get_vectorstore():
+    return get_container().vectorstore
+
+
+class VectorStore:
+    def __init__(self, client=None, aclient=None, embedder=None, collection_name: str = None, backend=None):
+        """
+        The index backend follows VECTOR_BACKEND (remote Qdrant or embedded FAISS);
+        pass a Qdrant client (e.g. QdrantClient(":memory:")) or a backend to override it.
+        The embedder defaults to the EMBEDDINGS_* configuration.
+        """
+        self.collection_name = collection_name or QDRANT_COLLECTION
+        if backend is None:
+            backend = QdrantBackend(self.collection_name, client, aclient) if client is not None \
+                else get_vector_backend(self.collection_name)
+        self.backend = backend
+        self.embedder = embedder or get_embeddings()
+        self.embed_model = getattr(self.embedder, "model", None) or type(self.embedder).__name__
+        self.query_cache = EmbeddingCache(path=EMBED_CACHE_PATH)
+        self.sparse = SparseIndex()
+        self._sparse_loading = threading.Lock()
+
+        self.backend.ensure_collection(self.embedder)
+
+    async def aclose(self):
+        self.query_cache.save()
+        await self.backend.aclose()
+
+    def embed_query(self, text: str) -> list[float]:
+        vector = self.query_cache.get(self.embed_model, text)
+        if vector is None:
+            with external_call("embedding", "query", len(text.encode("utf-8"))):
+                vector = self.embedder.embed_query(text)
+            self.query_cache.put(self.embed_model, text, vector)
+        return vector
+
+    async def aembed_query(self, text: str) -> list[float]:
+        vector = self.query_cache.get(self.embed_model, text)
+        if vector is None:
+            with external_call("embedding", "query", len(text.encode("utf-8"))):
+                if hasattr(self.embedder, "aembed_query"):
+                    vector = await self.embedder.aembed_query(text)
+                else:
+                    vector = await run_blocking(self.embedder.embed_query, text)
+            self.query_cache.put(self.embed_model, text, vector)
+        return vector
+
+    def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        """
+        Query vectors for many texts: cache misses are embedded together in a
+        single embed_documents call and cached like embed_query results.
+        """
+        vectors = {}
+        for text in texts:
+            if text not in vectors:
+                vectors[text] = self.query_cache.get(self.embed_model, text)
+        missing = [text for text, vector in vectors.items() if vector is None]
+        if missing:
+            for text, vector in zip(missing, self.embed_documents(missing)):
+                vectors[text] = vector
+                self.query_cache.put(self.embed_model, text, vector)
+        return [vectors[text] for text in texts]
+
+    def embed_documents(self, docs: list[str]) -> list[list[float]]:
+        with external_call("embedding", "documents", sum(len(d.encode("utf-8")) for d in docs)):
+            return self.embedder.embed_documents(docs)
+
+    def existing_ids(self, ids: list) -> set:
+        """
+        Subset of ids already stored in the collection (no payloads/vectors transferred).
+        """
+        if not ids:
+            return set()
+        with external_call(self.backend.name, "retrieve"):
+            return self.backend.existing_ids(ids)
+
+    def upsert_vectors(self, ids: list, vectors: list, payloads: list[dict], wait: bool = True):
+        with external_call(self.backend.name, "upsert", sum(len(str(p)) for p in payloads)):
+            self.backend.upsert(ids, vectors, payloads, wait=wait)
+        self.sparse.add(ids, payloads)  # idempotent, so writes racing the initial load are kept
+        # Only this source's own keys: a "type:" key would drop every answer built from that source type
+        _notify_change([str(i) for i in ids], set().union(*(source_keys(p, include_type=False) for p in payloads)))
+
+    def add_documents(self, docs: list[str], ids: list = None, payloads: list[dict] = None, wait: bool = True):
         if not isinstance(docs, list):
             docs = [docs]
-        vectors = self.embedder.embed_documents(docs)
+        vectors = self.embed_documents(docs)
         if ids is None:
             ids = [str(uuid.uuid4()) for _ in docs]
         if payloads is None:
             payloads = [{"text": d} for d in docs]
 
-        points = [PointStruct(id=ids[i], vector=vectors[i], payload=payloads[i]) for i in range(len(docs))]
-        self.client.upsert(collection_name=self.collection_name, points=points)
-
-    def query(self, text: str, k: int = 5, metadata_filter: dict = None):
-        vector = self.embedder.embed_query(text)
-        q_filter = None
-        if metadata_filter:
-            conditions = [FieldCondition(key=key, match=MatchValue(value=value)) for key, value in metadata_filter.items()]
-            q_filter = Filter(must=conditions)
-
-        # Run the search
-        result = self.client.search(
-            collection_name=self.collection_name,
-            query_vector=vector,
-            limit=k,
-            query_filter=q_filter
-        )
-
-        # Only include results that have actual payload
-        chunks = [hit.payload for hit in result if hit.payload is not None]
-        return chunks
-
+        self.upsert_vectors(ids, vectors, payloads, wait=wait)
+
+    def query(self, text: str, k: int = 5, metadata_filter: dict = None, hybrid: bool = None):
+        """
+        Top-k chunks as payload dicts with "id" and the cosine "score".
+        With hybrid retrieval, BM25 hits are fused in by reciprocal rank and
+        chunks also carry "bm25" and "rrf"; "score" stays the dense similarity.
+        """
+        hybrid = RAG_HYBRID if hybrid is None else hybrid
+        vector = self.embed_query(text)
+
+        with external_call(self.backend.name, "search"):
+            dense = self.backend.search(vector, k * HYBRID_CANDIDATES if hybrid else k, metadata_filter)
+
+        if not hybrid:
+            return dense
+        return self._hybrid(text, dense, k, metadata_filter)
+
+    async def aquery(self, text: str, k: int = 5, metadata_filter: dict = None, hybrid: bool = None):
+        hybrid = RAG_HYBRID if hybrid is None else hybrid
+        vector = await self.aembed_query(text)
+
+        with external_call(self.backend.name, "search"):
+            dense = await self.backend.asearch(vector, k * HYBRID_CANDIDATES if hybrid else k, metadata_filter)
+
+        if not hybrid:
+            return dense
+        return await run_blocking(self._hybrid, text, dense, k, metadata_filter)
+
+    def query_batch(self, texts: list[str], k: int = 5, metadata_filter: dict = None, hybrid: bool = None) -> list[list[dict]]:
+        """
+        query() for many texts with one embedding call and one index round trip.
+        """
+        if not texts:
+            return []
+        hybrid = RAG_HYBRID if hybrid is None else hybrid
+        vectors = self.embed_queries(texts)
+
+        with external_call(self.backend.name, "search_batch"):
+            dense = self.backend.search_batch(vectors, k * HYBRID_CANDIDATES if hybrid else k, metadata_filter)
+
+        if not hybrid:
+            return dense
+        return [self._hybrid(text, hits, k, metadata_filter) for text, hits in zip(texts, dense)]
+
+    # ---------- Sparse / hybrid ----------
+    def warm_sparse(self):
+        """
+        Build the BM25 index now (startup) instead of on the first hybrid query.
+        """
+        with self._sparse_loading:
+            if not self.sparse.loaded:
+                self.sparse.load(self._scroll_payloads())
+
+    def _sparse_ready(self) -> bool:
+        if self.sparse.loaded:
+            return True
+        if not self._sparse_loading.acquire(blocking=False):
+            return False  # warming up elsewhere: serve dense-only instead of waiting on the scroll
+        try:
+            if not self.sparse.loaded:
+                self.sparse.load(self._scroll_payloads())
+        finally:
+            self._sparse_loading.release()
+        return True
+
+    def _scroll_payloads(self, page_size: int = 512):
+        pages = self.backend.scroll(page_size)
+        while True:
+            with external_call(self.backend.name, "scroll"):
+                page = next(pages, None)
+            if page is None:
+                return
+            yield page
+
+    def sparse_query(self, text: str, k: int = 5, metadata_filter: dict = None) -> list[dict]:
+        """
+        BM25 ranking as {"id", "bm25"} dicts (no payloads); empty while the index is still warming up.
+        """
+        if not self._sparse_ready():
+            return []
+        return [{"id": doc_id, "bm25": score} for doc_id, score in self.sparse.search(text, k, metadata_filter)]
+
+    def _hybrid(self, text: str, dense: list[dict], k: int, metadata_filter: dict = None) -> list[dict]:
+        return self._fuse(dense, self.sparse_query(text, k * HYBRID_CANDIDATES, metadata_filter), k)
+
+    def _fuse(self, dense: list[dict], sparse: list[dict], k: int) -> list[dict]:
+        fused = reciprocal_rank_fusion([[c["id"] for c in dense], [c["id"] for c in sparse]])
+        chunks = {}
+        for c in sparse + dense:  # dense last so its payload and score win
+            chunks.setdefault(c["id"], {}).update(c)
+        top = sorted(fused, key=fused.get, reverse=True)[:k]
+
+        # Sparse-only hits carry no payload: fetch just the ones that made the cut, in one round trip
+        missing = [i for i in top if "score" not in chunks[i]]
+        payloads = {}
+        if missing:
+            with external_call(self.backend.name, "retrieve"):
+                payloads = self.backend.payloads(missing)
+        return [{**payloads.get(i, {}), **chunks[i], "rrf": fused[i]} for i in top
+                if "score" in chunks[i] or i in payloads]  # skip points deleted since the BM25 pass
 
     def delete_by_source(self, source_type: str):
-        self.client.delete(
-            collection_name=self.collection_name,
-            filter=Filter(must=[FieldCondition(key="source_type", match=MatchValue(value=source_type))])
-        )
+        with external_call(self.backend.name, "delete"):
+            self.backend.delete({"source_type": source_type})
+        self.sparse.delete_where({"source_type": source_type})
+        _notify_change([], {f"type:{source_type}"})
+
+    def delete_stale(self, metadata_filter: dict, keep_ids: list):
+        """
+        Delete points matching metadata_filter whose id is not in keep_ids,
+        i.e. chunks a re-ingested source no longer produces.
+        """
+        with external_call(self.backend.name, "delete"):
+            self.backend.delete(metadata_filter, keep_ids)
+        self.sparse.delete_where(metadata_filter, keep_ids)
+        _notify_change([], {f"{k}:{v}" for k, v in metadata_filter.items()})
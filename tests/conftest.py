@@ -0,0 +1,15 @@
+import pytest
+import services.rag.vectorstore as vectorstore
+from services.rag.benchmark import FakeEmbeddings
+from services.rag.vector_backends import FaissBackend
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """
+    VectorStore over an embedded FAISS index in tmp_path, with no global change listeners.
+    """
+    monkeypatch.setattr(vectorstore, "_change_listeners", [])
+    vs = vectorstore.VectorStore(backend=FaissBackend("test", directory=str(tmp_path)), embedder=FakeEmbeddings(dimension=32))
+    yield vs
+    vs.backend.close()
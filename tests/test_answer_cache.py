@@ -0,0 +1,52 @@
+import pytest
+import services.rag.vectorstore as vectorstore
+from services.rag.answer_cache import AnswerCache
+from services.rag.embedding_cache import EmbeddingCache
+
+
+@pytest.fixture
+def cached(store):
+    store.query_cache = EmbeddingCache()
+    cache = AnswerCache()
+    vectorstore.add_change_listener(cache.invalidate)
+    return store, cache
+
+
+def _chunk(url: str) -> dict:
+    return {"text": f"energy cell protein from {url}", "source_type": "web", "url": url}
+
+
+def _cache_answer(vs, cache, chunk: dict, chunk_id: str):
+    vs.add_documents([chunk["text"]], ids=[chunk_id], payloads=[chunk])
+    vector = vs.embed_query("what is energy")
+    cache.store(vector, "answer", [{**chunk, "id": chunk_id}], "cached answer")
+    return vector
+
+
+def test_unrelated_upsert_keeps_cached_answer(cached):
+    vs, cache = cached
+    vector = _cache_answer(vs, cache, _chunk("http://a"), "a1")
+
+    other = _chunk("http://b")
+    vs.add_documents([other["text"]], ids=["b1"], payloads=[other])
+
+    assert cache.lookup(vector, "answer", ["a1"]) == "cached answer"
+
+
+def test_reingesting_contributing_source_drops_answer(cached):
+    vs, cache = cached
+    chunk = _chunk("http://a")
+    vector = _cache_answer(vs, cache, chunk, "a1")
+
+    vs.add_documents([chunk["text"] + " updated"], ids=["a2"], payloads=[{**chunk, "text": chunk["text"] + " updated"}])
+
+    assert cache.lookup(vector, "answer", ["a1"]) is None
+
+
+def test_delete_by_source_type_drops_answer(cached):
+    vs, cache = cached
+    vector = _cache_answer(vs, cache, _chunk("http://a"), "a1")
+
+    vs.delete_by_source("web")
+
+    assert cache.lookup(vector, "answer", ["a1"]) is None
@@ -0,0 +1,31 @@
+from services.rag.chunker import iter_chunks
+
+
+def _text(n: int) -> str:
+    return " ".join(f"Sentence number {i} is here." for i in range(n))
+
+
+def test_chunks_respect_size_and_keep_segment_metadata():
+    chunks = list(iter_chunks([(_text(20), {"page": 1}), (_text(20), {"page": 2})], size=200, overlap=40))
+
+    assert all(len(text) <= 200 for text, _ in chunks)
+    assert chunks[0][1] == {"page": 1}
+    assert chunks[-1][1] == {"page": 2}
+
+
+def _carried(previous: str, current: str) -> int:
+    return max((n for n in range(1, len(current) + 1) if previous.endswith(current[:n])), default=0)
+
+
+def test_default_overlap_is_clamped_to_small_size():
+    chunks = [text for text, _ in iter_chunks([_text(30)], size=120)]
+
+    # The default CHUNK_OVERLAP (100) would repeat most of every chunk; at most half carries over
+    assert all(_carried(a, b) <= 60 for a, b in zip(chunks, chunks[1:]))
+
+
+def test_heading_starts_a_fresh_chunk_without_overlap():
+    chunks = [text for text, _ in iter_chunks([_text(3) + "\n# Next part\n" + _text(3)], size=500)]
+
+    assert len(chunks) == 2
+    assert chunks[1].startswith("# Next part")
@@ -0,0 +1,88 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import services.rag.http_cache as http_cache
+
+BODY = b"<html>" + b"cached body " * 500 + b"</html>"
+
+
+class _Origin(BaseHTTPRequestHandler):
+    requests = []
+    cache_control = "max-age=60"
+
+    def do_GET(self):
+        _Origin.requests.append(self.path)
+        if self.headers.get("If-None-Match") == '"v1"':
+            self.send_response(304)
+            self.send_header("Cache-Control", self.cache_control)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(BODY)))
+        self.send_header("ETag", '"v1"')
+        self.send_header("Cache-Control", self.cache_control)
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def origin():
+    _Origin.requests = []
+    _Origin.cache_control = "max-age=60"
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Origin)
+    threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def cache(tmp_path):
+    c = http_cache.HTTPCache(directory=str(tmp_path / "http"))
+    yield c
+    c.close()
+
+
+def test_fresh_entry_is_served_from_cache(origin, cache):
+    first = cache.get(f"{origin}/page")
+    second = cache.get(f"{origin}/page")
+
+    assert (first.from_cache, second.from_cache) == (False, True)
+    assert second.content == BODY
+    assert _Origin.requests == ["/page"]
+
+
+def test_stale_entry_is_revalidated(origin, cache):
+    _Origin.cache_control = "no-cache"
+    cache.get(f"{origin}/page")
+
+    again = cache.get(f"{origin}/page")
+
+    assert again.from_cache and again.content == BODY
+    assert cache.stats()["revalidated"] == 1
+
+
+def test_streamed_body_is_cached_only_when_read_to_the_end(origin, cache):
+    partial = cache.get(f"{origin}/doc", stream=True)
+    partial.raw.read(100)
+    partial.close()
+    assert cache.stats()["entries"] == 0
+
+    full = cache.get(f"{origin}/doc", stream=True)
+    assert b"".join(full.iter_content(1024)) == BODY
+    assert cache.get(f"{origin}/doc", stream=True).from_cache
+    assert len(_Origin.requests) == 2
+
+
+def test_oversized_body_passes_through_in_one_download(origin, cache, monkeypatch):
+    monkeypatch.setattr(http_cache, "HTTP_CACHE_MAX_ENTRY_BYTES", 100)
+
+    resp = cache.get(f"{origin}/big", stream=True)
+
+    assert b"".join(resp.iter_content(1024)) == BODY
+    assert cache.stats()["entries"] == 0
+    assert _Origin.requests == ["/big"]
@@ -0,0 +1,13 @@
+def test_sparse_index_keeps_only_filter_fields(store):
+    store.add_documents(["alpha beta"], ids=["a1"], payloads=[{"text": "alpha beta", "url": "http://a", "source_type": "web", "title": "A"}])
+
+    assert store.sparse._fields == {"a1": {"url": "http://a", "source_type": "web"}}
+
+
+def test_sparse_only_hit_gets_payload_from_backend(store):
+    store.add_documents(["alpha beta", "gamma delta"], ids=["a1", "g1"],
+                        payloads=[{"text": "alpha beta", "source_type": "web"}, {"text": "gamma delta", "source_type": "pdf"}])
+
+    hits = store._fuse([], store.sparse_query("gamma", 4), 2)
+
+    assert [(h["id"], h["text"], h["source_type"]) for h in hits] == [("g1", "gamma delta", "pdf")]
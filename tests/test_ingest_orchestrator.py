@@ -0,0 +1,20 @@
+import time
+import services.rag.ingest_orchestrator as orchestrator
+
+
+class _Memory:
+    def has_source(self, url):
+        return False
+
+
+def test_slow_candidate_times_out_on_its_own(monkeypatch):
+    monkeypatch.setattr(orchestrator, "INGEST_TASK_TIMEOUT_SECONDS", 0.3)
+    ingestor = orchestrator.IngestOrchestrator(memory=_Memory())
+    ingestor._ingest_url = lambda c: (time.sleep(c["delay"]), {"url": c["url"], "type": "web"})[1]
+    candidates = [{"url": "fast", "delay": 0.05}, {"url": "slow", "delay": 1.5}, {"url": "medium", "delay": 0.15}]
+
+    started = time.monotonic()
+    ingested = ingestor.ingest_candidates(candidates, budget=5)
+
+    assert [i["url"] for i in ingested] == ["fast", "medium"]
+    assert time.monotonic() - started < 1
@@ -0,0 +1,71 @@
+import threading
+import time
+from services.rag.jobs import JobQueue
+
+
+def _wait_for(queue, job_id, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.get(job_id)
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} still {job['status']}")
+
+
+def test_job_records_progress_result_and_failure(tmp_path):
+    queue = JobQueue(db_path=str(tmp_path / "jobs.sqlite3"), workers=2)
+
+    def handler(params, progress):
+        progress(3, 100)
+        progress(2, 50)
+        if params.get("fail"):
+            raise RuntimeError("boom")
+        return {"status": "success", "url": params["url"]}
+
+    queue.register_handler("web", handler)
+    ok = _wait_for(queue, queue.submit("web", {"url": "http://a"}))
+    failed = _wait_for(queue, queue.submit("web", {"url": "http://b", "fail": True}))
+    queue.shutdown(wait=True)
+
+    assert (ok["status"], ok["chunks_embedded"], ok["bytes_processed"]) == ("done", 5, 150)
+    assert ok["result"] == {"status": "success", "url": "http://a"}
+    assert (failed["status"], failed["error"]) == ("failed", "boom")
+
+
+def test_per_type_limit_runs_jobs_one_at_a_time(tmp_path):
+    queue = JobQueue(db_path=str(tmp_path / "jobs.sqlite3"), workers=4, limits={"pdf": 1})
+    running, peak, lock = [0], [0], threading.Lock()
+
+    def handler(params, progress):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+        return {}
+
+    queue.register_handler("pdf", handler)
+    jobs = [queue.submit("pdf", {"n": i}) for i in range(3)]
+    for job_id in jobs:
+        _wait_for(queue, job_id)
+    queue.shutdown(wait=True)
+
+    assert peak[0] == 1
+
+
+def test_queued_jobs_resume_after_restart(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    first = JobQueue(db_path=path)
+    first.register_handler("web", lambda params, progress: {})
+    job_id = first.submit("web", {"url": "http://a"})
+    first.shutdown(wait=True)
+    first._update(job_id, status="running")  # as if the process died mid-job
+
+    second = JobQueue(db_path=path)
+    second.register_handler("web", lambda params, progress: {"status": "success"})
+    second.start()
+
+    assert _wait_for(second, job_id)["status"] == "done"
+    second.shutdown(wait=True)
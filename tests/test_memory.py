@@ -0,0 +1,42 @@
+import pytest
+from services.rag.memory import MemoryManager, SQLiteMemoryStore, KIND_SOURCE, KIND_SUMMARY, KIND_TOPIC
+
+
+@pytest.fixture
+def store():
+    return SQLiteMemoryStore(":memory:")
+
+
+def test_concurrent_topic_writers_merge(store):
+    a = MemoryManager(store=store, flush_interval=0)
+    b = MemoryManager(store=store, flush_interval=0)  # loaded before a's write: its insert conflicts
+
+    a.add_topic_source("energy", "http://1")
+    b.add_topic_source("energy", "http://2")
+    a.add_topic_source("energy", "http://3")          # a's version is stale by now
+
+    value, version = store.get(KIND_TOPIC, "energy")
+    assert value == ["http://1", "http://2", "http://3"]
+    assert version == 3
+
+
+def test_writes_are_buffered_until_flush(store):
+    memory = MemoryManager(store=store, flush_interval=60)
+
+    memory.register_source("http://a", "web", "A")
+    memory.register_source("http://a", "web", "A again")
+
+    assert memory.has_source("http://a")
+    assert store.get(KIND_SOURCE, "http://a") is None
+    memory.flush()
+    assert store.get(KIND_SOURCE, "http://a") == ({"type": "web", "title": "A"}, 1)
+    memory.close()
+
+
+def test_writes_after_close_are_flushed(store):
+    memory = MemoryManager(store=store, flush_interval=60)
+    memory.close()
+
+    memory.save_summary("http://a", "summary")
+
+    assert store.get(KIND_SUMMARY, "http://a") == ("summary", 1)
@@ -0,0 +1,62 @@
+import pytest
+import services.rag.sync_memory_to_qdrant as sync
+
+
+@pytest.fixture
+def state(tmp_path):
+    return sync.SyncState(str(tmp_path / "sync.sqlite3"))
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    seen = []
+
+    def fake_sync_source(url, state, run_id, dry_run=False):
+        seen.append(url)
+        if url == "http://broken":
+            raise RuntimeError("404")
+        state.put(url, run_id, content_hash="h")
+        return {"url": url, "status": "unchanged"}
+
+    monkeypatch.setattr(sync, "sync_source", fake_sync_source)
+    return seen
+
+
+def test_failing_source_does_not_pin_later_runs(state, calls):
+    urls = ["http://a", "http://broken", "http://b"]
+
+    first = sync.run_sync(urls, state)
+    calls.clear()
+    second = sync.run_sync(urls, state)
+
+    assert first == second == {"unchanged": 2, "changed": 0, "failed": 1}
+    assert sorted(calls) == sorted(urls)
+    assert state.get("http://broken")["failures"] == 2
+    assert state.get("http://broken")["last_error"] == "404"
+
+
+def test_crashed_run_resumes_only_unfinished_sources(state, calls):
+    run_id = state.start_run()
+    state.put("http://a", run_id, content_hash="h")  # finished before the crash
+
+    sync.run_sync(["http://a", "http://b"], state)
+
+    assert calls == ["http://b"]
+
+
+def test_stale_crashed_run_is_not_resumed(state, calls, monkeypatch):
+    run_id = state.start_run()
+    state.put("http://a", run_id, content_hash="h")
+    monkeypatch.setattr(sync, "SYNC_RESUME_MAX_AGE_HOURS", 0)
+
+    sync.run_sync(["http://a", "http://b"], state)
+
+    assert sorted(calls) == ["http://a", "http://b"]
+
+
+def test_resume_attempts_are_capped(state, monkeypatch):
+    monkeypatch.setattr(sync, "SYNC_RESUME_MAX_ATTEMPTS", 2)
+    run_id = state.start_run()
+
+    assert state.start_run() == run_id
+    assert state.start_run() != run_id